@@ -1,6 +1,25 @@
 __all__ = [
     "main",
+    "BatchResult",
+    "NoDateError",
+    "WatermarkSettings",
+    "watermark_bytes",
+    "watermark_many",
+    "watermark_stream",
 ]
 
 
+def __getattr__(name):
+	# Resolved on first use so importing the package stays cheap
+	if name == "main":
+		from .cli import main
+
+		return main
+	if name in __all__:
+		from . import api
+
+		return getattr(api, name)
+	raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 
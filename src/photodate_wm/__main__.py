@@ -1,7 +1,7 @@
-from .cli import main
 import argparse
 import sys
 
+
 def _entry():
 	parser = argparse.ArgumentParser(add_help=False)
 	parser.add_argument("--gui", action="store_true")
@@ -12,10 +12,11 @@ def _entry():
 		return
 	# fallback to CLI
 	from .cli import main as cli_main
-	cli_main(sys.argv[1:])
+	return cli_main(sys.argv[1:])
 
 
 if __name__ == "__main__":
-	_entry()
+	# main()'s return value is the process exit status (None, from the GUI, is 0)
+	sys.exit(_entry())
 
 
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import collections
+import io
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import BinaryIO, Iterable, Iterator, NamedTuple, Optional, Tuple, Union
+
+from PIL import Image
+
+from .exif_utils import EXIF_SCAN_BYTES, _app1_offset, find_exif_segment, read_exif_date
+from .render import COMPOSITE_BACKENDS, draw_text_watermark
+
+# Anything watermark_bytes accepts as an image
+Buffer = Union[bytes, bytearray, memoryview, BinaryIO]
+
+# Input formats Pillow reads but should be written as another format
+_WRITE_AS = {"MPO": "JPEG"}
+
+
+class NoDateError(ValueError):
+	"""The image has no EXIF shooting date and no date was passed in."""
+
+
+@dataclass(frozen=True)
+class WatermarkSettings:
+	"""How the date stamp is drawn and the result encoded.
+
+	Immutable and safe to share between threads. Fonts and stamps are cached
+	per style in the renderer, so reusing one settings object (after an
+	optional prepare()) keeps them warm across calls.
+	"""
+
+	font_size: int = 32
+	color: str = "#FFFFFF"
+	opacity: float = 1.0
+	position: str = "br"
+	margin_x: int = 24
+	margin_y: int = 24
+	font_path: Optional[str] = None
+	glyph_atlas: bool = False
+	keep_mode: bool = False
+	backend: str = "pillow"
+	# Output format (a Pillow format name such as "JPEG" or "PNG"); None keeps the input's
+	format: Optional[str] = None
+	quality: int = 95
+
+	def __post_init__(self):
+		if self.backend not in COMPOSITE_BACKENDS:
+			raise ValueError(f"backend must be one of {', '.join(COMPOSITE_BACKENDS)}")
+
+	@classmethod
+	def from_args(cls, args) -> "WatermarkSettings":
+		"""Settings matching parsed CLI options."""
+		return cls(
+			font_size=args.font_size,
+			color=args.color,
+			opacity=args.opacity,
+			position=args.position,
+			margin_x=args.margin_x,
+			margin_y=args.margin_y,
+			font_path=args.font_path,
+			glyph_atlas=args.glyph_atlas,
+			keep_mode=args.keep_mode,
+		)
+
+	def style(self) -> dict:
+		return dict(
+			font_size=self.font_size,
+			color=self.color,
+			opacity=self.opacity,
+			position=self.position,
+			margin_x=self.margin_x,
+			margin_y=self.margin_y,
+			font_path=self.font_path,
+			glyph_atlas=self.glyph_atlas,
+		)
+
+	def prepare(self) -> "WatermarkSettings":
+		"""Load the font (and glyph atlas) now instead of on the first image."""
+		draw_text_watermark(Image.new("RGB", (64, 64)), "2000-01-01", backend=self.backend, keep_mode=self.keep_mode, **self.style())
+		return self
+
+
+class BatchResult(NamedTuple):
+	"""One watermark_many output: the encoded image, or the error that stopped it."""
+
+	data: Optional[bytes]
+	error: Optional[Exception]
+
+
+class _ExifSplicer:
+	"""Write-only sink that inserts a raw Exif APP1 after the SOI and JFIF APP0 the JPEG encoder writes first.
+
+	Everything else is passed through as soon as the encoder hands it over.
+	"""
+
+	def __init__(self, out: BinaryIO, segment: bytes):
+		self._out = out
+		self._segment: Optional[bytes] = segment
+		self._head = b""
+
+	def write(self, data) -> int:
+		if self._segment is None:
+			self._out.write(data)
+			return len(data)
+		self._head += bytes(data)
+		pos = _app1_offset(self._head)
+		if pos is not None:
+			# Same layout as splice_exif_segment: the encoder writes no APP1 of its own here
+			self._out.write(self._head[:pos] + self._segment + self._head[pos:])
+			self._segment = None
+		return len(data)
+
+	def flush(self) -> None:
+		self._out.flush()
+
+
+def write_image(image, out: BinaryIO, fmt: str, exif_segment: Optional[bytes] = None, quality: int = 95) -> None:
+	"""Encode a Pillow image into out; a JPEG gets exif_segment (a raw APP1) copied in verbatim."""
+	if fmt != "JPEG":
+		image.save(out, format=fmt)
+		return
+	# Copy the original APP1 verbatim instead of re-parsing and re-serializing it
+	image.save(_ExifSplicer(out, exif_segment) if exif_segment else out, format=fmt, quality=quality)
+
+
+def encode_image(image, fmt: str, exif_segment: Optional[bytes] = None, quality: int = 95) -> bytes:
+	buf = io.BytesIO()
+	write_image(image, buf, fmt, exif_segment, quality)
+	return buf.getvalue()
+
+
+def _as_bytes(data: Buffer) -> bytes:
+	if isinstance(data, (bytes, bytearray, memoryview)):
+		return bytes(data)
+	return data.read()
+
+
+def _render(data: Buffer, settings: WatermarkSettings, date: Optional[str]):
+	"""(watermarked image, output format, Exif APP1 to keep or None)."""
+	raw = _as_bytes(data)
+	buf = io.BytesIO(raw)
+	if not date:
+		date, _ = read_exif_date(buf)
+		if not date:
+			raise NoDateError("no EXIF shooting date in the image; pass date")
+		buf.seek(0)
+	with Image.open(buf) as im:
+		source_fmt = im.format
+		out_im = draw_text_watermark(im, date, backend=settings.backend, keep_mode=settings.keep_mode, **settings.style())
+	# Multi-picture JPEGs (many phone cameras) are written back as plain JPEG
+	fmt = settings.format or _WRITE_AS.get(source_fmt, source_fmt) or "PNG"
+	exif_segment = find_exif_segment(raw[:EXIF_SCAN_BYTES]) if fmt == "JPEG" else None
+	return out_im, fmt, exif_segment
+
+
+def _watermark(data: Buffer, settings: WatermarkSettings, date: Optional[str]) -> Tuple[bytes, str]:
+	"""(encoded output, its Pillow format name)."""
+	out_im, fmt, exif_segment = _render(data, settings, date)
+	return encode_image(out_im, fmt, exif_segment, settings.quality), fmt
+
+
+def watermark_bytes(data: Buffer, settings: Optional[WatermarkSettings] = None, date: Optional[str] = None) -> bytes:
+	"""Watermark an encoded image held in memory and return the encoded result.
+
+	data is bytes-like or a binary file object (read to the end). The date is
+	read from the image's EXIF unless given as YYYY-MM-DD; NoDateError is
+	raised when there is none. JPEG outputs keep the input's EXIF block.
+	Nothing is read from or written to the filesystem.
+	"""
+	return _watermark(data, settings or WatermarkSettings(), date)[0]
+
+
+def watermark_stream(data: Buffer, out: BinaryIO, settings: Optional[WatermarkSettings] = None, date: Optional[str] = None) -> str:
+	"""Like watermark_bytes, but writes the output into out as the encoder produces it.
+
+	Nothing is written before the image is decoded and watermarked, so a
+	missing date or an unreadable input leaves out untouched. Returns the
+	Pillow format name that was written.
+	"""
+	settings = settings or WatermarkSettings()
+	out_im, fmt, exif_segment = _render(data, settings, date)
+	write_image(out_im, out, fmt, exif_segment, settings.quality)
+	return fmt
+
+
+def watermark_many(
+	items: Iterable[Buffer],
+	settings: Optional[WatermarkSettings] = None,
+	threads: int = 1,
+) -> Iterator[BatchResult]:
+	"""watermark_bytes over many images, yielding a BatchResult per item in input order.
+
+	A failing item yields its error instead of stopping the batch. With
+	threads > 1 images are processed on a thread pool (Pillow releases the
+	GIL while decoding, compositing and encoding) with a bounded number in
+	flight, so memory stays flat however long the input is.
+	"""
+	settings = (settings or WatermarkSettings()).prepare()
+
+	def _one(data: Buffer) -> BatchResult:
+		try:
+			return BatchResult(watermark_bytes(data, settings), None)
+		except Exception as exc:
+			return BatchResult(None, exc)
+
+	if threads <= 1:
+		for data in items:
+			yield _one(data)
+		return
+
+	window = threads * 2
+	with ThreadPoolExecutor(max_workers=threads) as pool:
+		pending: collections.deque = collections.deque()
+		for data in items:
+			pending.append(pool.submit(_one, data))
+			if len(pending) >= window:
+				yield pending.popleft().result()
+		while pending:
+			yield pending.popleft().result()
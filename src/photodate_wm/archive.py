@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import io
+import os
+import time
+from typing import BinaryIO, Callable, Iterator, NamedTuple, Optional, Set
+
+# Archive name suffix -> tarfile stream compression
+_TAR_SUFFIXES = {
+	".tar": "",
+	".tar.gz": "gz",
+	".tgz": "gz",
+	".tar.bz2": "bz2",
+	".tbz2": "bz2",
+	".tar.xz": "xz",
+	".txz": "xz",
+}
+ARCHIVE_SUFFIXES = tuple(_TAR_SUFFIXES) + (".zip",)
+
+# Already compressed: deflating them again in a zip costs time and saves nothing
+_STORED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".heic", ".heif"}
+
+# Earliest timestamp a zip entry can hold
+_ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+
+class ArchiveError(Exception):
+	"""The archive is corrupt, truncated or not in the format its name says."""
+
+
+class ArchiveMember(NamedTuple):
+	name: str
+	data: bytes
+	mtime: float
+
+
+def is_archive(path: str) -> bool:
+	return os.path.isfile(path) and path.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _is_zip(path: str) -> bool:
+	return path.lower().endswith(".zip")
+
+
+def _tar_compression(path: str) -> str:
+	lower = path.lower()
+	for suffix, compression in _TAR_SUFFIXES.items():
+		if lower.endswith(suffix):
+			return compression
+	return ""
+
+
+def _wanted(name: str, include_ext: Set[str]) -> bool:
+	base = name.rsplit("/", 1)[-1]
+	# macOS resource forks ("__MACOSX/", "._IMG.jpg") look like images but are not
+	if base.startswith("._") or name.startswith("__MACOSX/"):
+		return False
+	return os.path.splitext(base)[1].lower() in include_ext
+
+
+def iter_members(path: str, include_ext: Set[str], passed_over: Optional[Callable[[str], None]] = None) -> Iterator[ArchiveMember]:
+	"""Regular-file members with a wanted extension, in archive order.
+
+	Each member is read into memory only when it is reached; nothing is
+	extracted to disk. Other regular files are not read, only their names
+	are handed to passed_over. Tar archives (compressed or not) are read as a
+	forward-only stream. A damaged archive raises ArchiveError, possibly
+	after some members were already yielded.
+	"""
+	import tarfile
+	import zipfile
+	import zlib
+
+	try:
+		if _is_zip(path):
+			yield from _iter_zip(path, include_ext, passed_over)
+		else:
+			yield from _iter_tar(path, include_ext, passed_over)
+	except (zipfile.BadZipFile, tarfile.TarError, EOFError, zlib.error) as exc:
+		raise ArchiveError(str(exc) or type(exc).__name__) from exc
+
+
+def _iter_zip(path: str, include_ext: Set[str], passed_over: Optional[Callable[[str], None]]) -> Iterator[ArchiveMember]:
+	import zipfile
+
+	with zipfile.ZipFile(path) as zf:
+		for info in zf.infolist():
+			if info.is_dir():
+				continue
+			if not _wanted(info.filename, include_ext):
+				if passed_over is not None:
+					passed_over(info.filename)
+				continue
+			yield ArchiveMember(info.filename, zf.read(info), time.mktime(info.date_time + (0, 0, -1)))
+
+
+def _iter_tar(path: str, include_ext: Set[str], passed_over: Optional[Callable[[str], None]]) -> Iterator[ArchiveMember]:
+	import tarfile
+
+	with tarfile.open(path, mode="r|*") as tf:
+		for info in tf:
+			if not info.isfile():
+				continue
+			if not _wanted(info.name, include_ext):
+				if passed_over is not None:
+					passed_over(info.name)
+				continue
+			# A stream can only move forward, so the member is read before moving on
+			yield ArchiveMember(info.name, tf.extractfile(info).read(), float(info.mtime))
+
+
+class ArchiveWriter:
+	"""Writes members into a new archive of the same kind (and compression) as `like`."""
+
+	def __init__(self, fileobj: BinaryIO, like: str):
+		import tarfile
+		import zipfile
+
+		self._zip = None
+		self._tar = None
+		if _is_zip(like):
+			self._zip = zipfile.ZipFile(fileobj, "w")
+		else:
+			self._tar = tarfile.open(fileobj=fileobj, mode="w|" + _tar_compression(like))
+
+	def __enter__(self) -> "ArchiveWriter":
+		return self
+
+	def __exit__(self, *exc) -> None:
+		self.close()
+
+	def add(self, name: str, data: bytes, mtime: float) -> None:
+		if self._zip is not None:
+			import zipfile
+
+			info = zipfile.ZipInfo(name, max(time.localtime(mtime)[:6], _ZIP_EPOCH))
+			stored = os.path.splitext(name)[1].lower() in _STORED_EXTENSIONS
+			info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+			self._zip.writestr(info, data)
+			return
+		import tarfile
+
+		info = tarfile.TarInfo(name)
+		info.size = len(data)
+		info.mtime = int(mtime)
+		info.mode = 0o644
+		self._tar.addfile(info, io.BytesIO(data))
+
+	def close(self) -> None:
+		if self._zip is not None:
+			self._zip.close()
+		else:
+			self._tar.close()
@@ -1,44 +1,127 @@
+from __future__ import annotations
+
 import argparse
+import collections
+import contextlib
+import io
+import mmap
 import os
+import shutil
+import signal
 import sys
-from typing import Iterable, List, Set
+import threading
+import time
+from typing import TYPE_CHECKING, BinaryIO, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
 
-from .exif_utils import extract_photo_date_string
-from .render import draw_text_watermark
+from .archive import is_archive
+from .date_cache import DEFAULT_CACHE_PATH, DateCache, open_date_cache
+from .exif_utils import EXIF_SCAN_BYTES, extract_photo_date_string, find_exif_segment, read_exif_date
+from .extensions import SUPPORTED_EXTENSIONS, TIFF_EXTENSIONS
+from .journal import FAILED, Journal, JournalMismatch
+from .inventory import DEFAULT_SCAN_THREADS, INVENTORY_FORMATS, format_histogram, iter_inventory, write_inventory
+from .pipeline import DEFAULT_QUEUE_SIZE, Finished, Stage, run_pipeline
+from .scheduler import MemoryBudget, estimate_decoded_bytes
 
+if TYPE_CHECKING:
+	from concurrent.futures import ProcessPoolExecutor
 
-SUPPORTED_EXTENSIONS: Set[str] = {
-	".jpg",
-	".jpeg",
-	".png",
-	".bmp",
-	".tif",
-	".tiff",
-	".heic",
-	".heif",
-}
+	from .archive import ArchiveMember
+	from .dedupe import Deduper
+	from .manifest import Manifest
 
+# Pillow, the renderer, the process pool and the watchers are imported where
+# they are used, so -h, --dry-run and --scan start without loading them.
 
-def enumerate_candidate_files(root_path: str, recursive: bool, include_ext: Iterable[str]) -> List[str]:
-	valid_ext = {ext.lower() if ext.startswith(".") else f".{ext.lower()}" for ext in include_ext}
-	result: List[str] = []
+
+class CandidateFile:
+	"""A matching file found by the scan, with its stat data fetched on first use.
+
+	Inputs that are settled without it (journaled by an earlier --resume run)
+	never cost a stat call. stat is None when the file can no longer be
+	stat'ed; processing it then reports the error.
+	"""
+
+	__slots__ = ("path", "_entry", "_stat")
+
+	def __init__(self, path: str, stat: os.stat_result | None = None, entry: os.DirEntry | None = None):
+		self.path = path
+		self._entry = entry
+		self._stat = stat
+
+	@property
+	def stat(self) -> Optional[os.stat_result]:
+		if self._stat is None:
+			try:
+				# DirEntry.stat is free on Windows, where scandir already has the data
+				self._stat = self._entry.stat() if self._entry is not None else os.stat(self.path)
+			except OSError:
+				return None
+		return self._stat
+
+
+def _normalize_ext(include_ext: Iterable[str]) -> Set[str]:
+	return {ext.lower() if ext.startswith(".") else f".{ext.lower()}" for ext in include_ext}
+
+
+def iter_candidate_files(
+	root_path: str,
+	recursive: bool,
+	include_ext: Iterable[str],
+	sort: bool = False,
+	exclude_dirs: Iterable[str] = (),
+) -> Iterator[CandidateFile]:
+	"""Yield matching files as they are found; their stat data is fetched only when used.
+
+	Directories are read one at a time with os.scandir, so processing can start
+	on the first file and no full path list is held. With sort=True every
+	directory is visited in name order, making the sequence reproducible.
+	Directories in exclude_dirs (e.g. the output root) are not descended into.
+	A missing root raises FileNotFoundError right away, not on first iteration.
+	"""
+	valid_ext = _normalize_ext(include_ext)
 	if os.path.isfile(root_path):
 		ext = os.path.splitext(root_path)[1].lower()
-		if not valid_ext or ext in valid_ext:
-			result.append(os.path.abspath(root_path))
-		return result
+		if valid_ext and ext not in valid_ext:
+			return iter(())
+		return iter((CandidateFile(os.path.abspath(root_path), os.stat(root_path)),))
 
 	if not os.path.isdir(root_path):
 		raise FileNotFoundError(f"Path does not exist or not accessible: {root_path}")
 
-	for dirpath, dirnames, filenames in os.walk(root_path):
-		for filename in filenames:
-			ext = os.path.splitext(filename)[1].lower()
-			if not valid_ext or ext in valid_ext:
-				result.append(os.path.abspath(os.path.join(dirpath, filename)))
-		if not recursive:
-			break
-	return result
+	excluded = {os.path.normcase(os.path.abspath(d)) for d in exclude_dirs}
+	return _scan_tree(os.path.abspath(root_path), recursive, valid_ext, sort, excluded)
+
+
+def _scan_tree(root: str, recursive: bool, valid_ext: Set[str], sort: bool, excluded: Set[str]) -> Iterator[CandidateFile]:
+	# Explicit stack instead of recursion; subdirectories follow their parent's files like os.walk
+	stack = [root]
+	while stack:
+		top = stack.pop()
+		subdirs: List[str] = []
+		try:
+			with os.scandir(top) as it:
+				entries = sorted(it, key=lambda e: e.name) if sort else it
+				for entry in entries:
+					try:
+						is_dir = entry.is_dir()
+					except OSError:
+						continue
+					if is_dir:
+						# Like os.walk, symlinked directories are not followed
+						if recursive and not entry.is_symlink() and os.path.normcase(entry.path) not in excluded:
+							subdirs.append(entry.path)
+						continue
+					ext = os.path.splitext(entry.name)[1].lower()
+					if valid_ext and ext not in valid_ext:
+						continue
+					yield CandidateFile(entry.path, entry=entry)
+		except OSError:
+			continue
+		stack.extend(reversed(subdirs))
+
+
+def enumerate_candidate_files(root_path: str, recursive: bool, include_ext: Iterable[str]) -> List[str]:
+	return [c.path for c in iter_candidate_files(root_path, recursive, include_ext)]
 
 
 def build_arg_parser() -> argparse.ArgumentParser:
@@ -46,10 +129,17 @@ def build_arg_parser() -> argparse.ArgumentParser:
 		prog="photodate-wm",
 		description="Batch add shooting-date watermark to photos.",
 	)
-	parser.add_argument("--path", required=True, help="File or directory path to process")
+	parser.add_argument("--path", help="File or directory path to process (required unless a --cache-* command, --serve or --stdin is given)")
+	parser.add_argument("--stdin", action="store_true", help="Read one image from standard input (use with --stdout)")
+	parser.add_argument("--stdout", action="store_true", help="Write the watermarked image to standard output in the input's format (use with --stdin)")
 	parser.add_argument("--dry-run", action="store_true", help="List files that would be processed without writing outputs")
 	parser.add_argument("--verbose", action="store_true", help="Enable verbose logs")
+	parser.add_argument("--scan", action="store_true", help="Write a machine-readable inventory (path, date, source, dimensions, size) instead of processing")
+	parser.add_argument("--scan-format", choices=INVENTORY_FORMATS, default="jsonl", help="Inventory format for --scan")
+	parser.add_argument("--scan-threads", type=int, default=DEFAULT_SCAN_THREADS, help="Threads reading file headers during --scan")
+	parser.add_argument("--scan-output", type=str, default=None, help="Write the --scan inventory to this file instead of stdout")
 	parser.add_argument("--recursive", action="store_true", help="Recurse into subdirectories when a directory is provided")
+	parser.add_argument("--sort", action="store_true", help="Visit directory entries in name order so runs are reproducible")
 	parser.add_argument(
 		"--include-ext",
 		help="Comma-separated list of extensions to include (e.g., .jpg,.jpeg,.png)",
@@ -66,7 +156,46 @@ def build_arg_parser() -> argparse.ArgumentParser:
 	parser.add_argument("--margin-x", type=int, default=24, help="Horizontal margin in pixels from anchor")
 	parser.add_argument("--margin-y", type=int, default=24, help="Vertical margin in pixels from anchor")
 	parser.add_argument("--font-path", type=str, default=None, help="Path to .ttf/.otf font file")
+	parser.add_argument("--keep-mode", action="store_true", help="Keep grayscale/CMYK/palette inputs in their own mode instead of converting to RGB")
+	parser.add_argument("--glyph-atlas", action="store_true", help="Build date stamps from pre-rasterized digit glyphs instead of shaping each date")
+	parser.add_argument("--tiled-threshold-mp", type=float, default=100.0, help="Patch TIFFs of at least this many megapixels strip/tile-wise instead of decoding them fully (0 disables)")
+	parser.add_argument("--tiled-memory-mb", type=int, default=256, help="Memory ceiling in MB for strip/tile-wise TIFF processing")
+	# Date cache options
+	parser.add_argument("--no-date-cache", dest="date_cache", action="store_false", default=True, help="Do not read or update the persistent EXIF date cache")
+	parser.add_argument("--date-cache-path", type=str, default=DEFAULT_CACHE_PATH, help="Location of the SQLite date cache")
+	parser.add_argument("--cache-stats", action="store_true", help="Print date cache statistics and exit")
+	parser.add_argument("--cache-prune", action="store_true", help="Remove cache entries for missing or modified files and exit")
+	parser.add_argument("--cache-clear", action="store_true", help="Remove all date cache entries and exit")
+	# Execution options
+	parser.add_argument("--jobs", type=int, default=None, help="Worker processes for decode/watermark/encode (default: CPU count; 1 runs in-process)")
+	parser.add_argument("--pipeline", action="store_true", help="Overlap reading, compositing and encoding/writing in threaded stages (instead of --jobs processes)")
+	parser.add_argument("--read-threads", type=int, default=4, help="With --pipeline: threads reading inputs and resolving dates")
+	parser.add_argument("--render-threads", type=int, default=None, help="With --pipeline: threads decoding and compositing (default: CPU count)")
+	parser.add_argument("--write-threads", type=int, default=2, help="With --pipeline: threads encoding and writing outputs")
+	parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="With --pipeline: capacity of each queue between stages")
+	parser.add_argument("--max-memory", type=int, default=0, help="With --jobs/--pipeline: cap the estimated decoded size (MB) of files in flight; larger files wait, oversized ones run alone (0: no cap)")
+	parser.add_argument("--watch", action="store_true", help="Keep running: process existing files, then watermark new arrivals as they appear")
+	parser.add_argument("--watch-latency", type=float, default=2.0, help="With --watch: target seconds from a file settling to its output being written")
+	parser.add_argument("--watch-settle", type=float, default=1.0, help="With --watch: seconds a new file's size and mtime must stay unchanged before it is processed")
+	parser.add_argument("--watch-poll", action="store_true", help="With --watch: rescan with os.scandir instead of using inotify")
+	parser.add_argument("--watch-stats", type=float, default=60.0, help="With --watch: seconds between throughput reports (0 disables)")
+	parser.add_argument("--serve", action="store_true", help="Run a local HTTP job server (POST /watermark, GET /status) backed by a warm --jobs worker pool")
+	parser.add_argument("--serve-port", type=int, default=8765, help="With --serve: TCP port on 127.0.0.1 (0 picks a free one)")
+	parser.add_argument("--serve-socket", type=str, default=None, help="With --serve: listen on this Unix socket instead of TCP")
+	parser.add_argument("--serve-timeout", type=float, default=60.0, help="With --serve: seconds a job may wait and run before the request fails with 504")
+	parser.add_argument("--serve-queue", type=int, default=64, help="With --serve: jobs allowed to wait for a worker before requests are refused with 503")
+	parser.add_argument("--resume", action="store_true", help="Journal finished inputs in the output root; rerunning with --resume after an interruption does not check or decode them again")
 	# Output options
+	parser.add_argument("--incremental", action="store_true", help="Track outputs in a manifest in the output root and skip inputs whose file and render settings are unchanged")
+	parser.add_argument("--manifest-hash", action="store_true", help="With --incremental, also fingerprint inputs by SHA-256 so touched but identical files stay up to date")
+	parser.add_argument(
+		"--dedupe",
+		nargs="?",
+		const="link",
+		choices=("link", "copy"),
+		default=None,
+		help="Render byte-identical inputs of a batch once; the other outputs become hardlinks to that result (or copies with --dedupe copy)",
+	)
 	parser.add_argument("--output-dir-name", type=str, default=None, help="Override output subdirectory name; default <dirname>_watermark")
 	parser.add_argument("--suffix", type=str, default=None, help="Optional filename suffix (without dot)")
 	parser.add_argument("--overwrite", action="store_true", help="Overwrite existing output files")
@@ -90,12 +219,161 @@ def _map_output_path(file_path: str, root_input: str, root_output: str, suffix:
 		rel = os.path.basename(file_path)
 	else:
 		rel = os.path.relpath(file_path, start=root_input)
-	out_path = os.path.join(root_output, rel)
-	if suffix:
-		stem, ext = os.path.splitext(out_path)
-		out_path = f"{stem}_{suffix}{ext}"
-	os.makedirs(os.path.dirname(out_path), exist_ok=True)
-	return out_path
+	return _with_suffix(os.path.join(root_output, rel), suffix)
+
+
+def _with_suffix(path: str, suffix: str | None) -> str:
+	if not suffix:
+		return path
+	stem, ext = os.path.splitext(path)
+	return f"{stem}_{suffix}{ext}"
+
+
+def _wants_tiled(file_path: str, threshold_mp: float) -> bool:
+	if threshold_mp <= 0 or os.path.splitext(file_path)[1].lower() not in TIFF_EXTENSIONS:
+		return False
+	from .tiled_tiff import tiff_pixel_count
+
+	pixels = tiff_pixel_count(file_path)
+	return pixels is not None and pixels >= threshold_mp * 1_000_000
+
+
+@contextlib.contextmanager
+def _mapped_input(path: str) -> Iterator[BinaryIO]:
+	"""Map the input once; date parsing, decoding and EXIF copy all read from it."""
+	with open(path, "rb") as fh:
+		try:
+			mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+		except ValueError:
+			# empty files cannot be mapped
+			mm = None
+		if mm is None:
+			yield io.BytesIO(fh.read())
+			return
+		with mm:
+			yield mm
+
+
+@contextlib.contextmanager
+def _atomic_path(out_path: str) -> Iterator[str]:
+	"""Yield a temporary sibling of out_path that replaces it only once fully written.
+
+	The temporary name keeps the extension so Pillow still infers the format.
+	The parent directory is created here, so inputs that end up skipped leave
+	no empty output directories behind.
+	"""
+	os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+	stem, ext = os.path.splitext(os.path.basename(out_path))
+	tmp = os.path.join(os.path.dirname(out_path), f".{stem}.{os.urandom(6).hex()}.part{ext}")
+	try:
+		yield tmp
+		# Durable before it takes the final name, so a journaled output survives a power loss
+		fd = os.open(tmp, os.O_RDONLY)
+		try:
+			os.fsync(fd)
+		finally:
+			os.close(fd)
+		os.replace(tmp, out_path)
+	except BaseException:
+		with contextlib.suppress(OSError):
+			os.unlink(tmp)
+		raise
+
+
+def _save_output(out_im, out_path: str, fmt: str | None, exif_segment: bytes | None) -> None:
+	from .api import encode_image
+
+	with _atomic_path(out_path) as tmp:
+		if fmt != "JPEG":
+			out_im.save(tmp, format=fmt)
+			return
+		with open(tmp, "wb") as fh:
+			fh.write(encode_image(out_im, fmt, exif_segment))
+
+
+def _check_input(
+	f: str,
+	buf: BinaryIO | None,
+	args: argparse.Namespace,
+	root_output: str,
+	cache: DateCache | None,
+	overwrite: bool,
+	st: os.stat_result | None,
+	echo: Callable[[str], None] = print,
+) -> Tuple[Optional[str], str, Optional[str]]:
+	"""Resolve the date and output path: (final status, or None if it must be rendered; out_path; date)."""
+	out_path = _map_output_path(f, os.path.abspath(args.path), root_output, args.suffix)
+	date_str = extract_photo_date_string(f, fallback_mtime=args.fallback_mtime, exif_only=args.exif_only, stream=buf, cache=cache, st=st)
+	if not date_str:
+		if args.verbose:
+			echo(f"Skip {f}: no date")
+		return "skipped", out_path, None
+	# Checked before decoding so existing outputs cost nothing to skip
+	if os.path.exists(out_path) and not overwrite:
+		if args.verbose:
+			echo(f"Exists, skip write: {out_path}")
+		return "exists", out_path, date_str
+	return None, out_path, date_str
+
+
+def _write_tiled(f: str, out_path: str, date_str: str, args: argparse.Namespace, style: dict, echo: Callable[[str], None] = print) -> bool:
+	"""Patch a large TIFF strip/tile-wise; False when it needs the full-decode path."""
+	from .tiled_tiff import TiledUnsupported, draw_text_watermark_tiled
+
+	try:
+		with _atomic_path(out_path) as tmp:
+			draw_text_watermark_tiled(f, tmp, date_str, memory_limit=args.tiled_memory_mb * 1024 * 1024, keep_mode=args.keep_mode, **style)
+		return True
+	except TiledUnsupported as exc:
+		if args.verbose:
+			echo(f"Tiled mode unavailable for {f} ({exc}); decoding fully")
+		return False
+
+
+def _render_output(f: str, buf: BinaryIO, date_str: str, args: argparse.Namespace, style: dict):
+	"""Decode and watermark; returns (image, save format, original Exif APP1 or None)."""
+	from PIL import Image, UnidentifiedImageError
+
+	from .render import draw_text_watermark
+
+	buf.seek(0)
+	try:
+		im = Image.open(buf)
+	except Exception as exc:
+		# Same message whether the input came from a mapping or a prefetched buffer
+		raise UnidentifiedImageError(f"cannot identify image file {f!r}") from exc
+	with im:
+		out_im = draw_text_watermark(im, date_str, keep_mode=args.keep_mode, **style)
+	# Choose format from original extension and keep the original EXIF for JPEG
+	_, ext = os.path.splitext(f)
+	fmt = "JPEG" if ext.lower() in {".jpg", ".jpeg"} else None
+	exif_segment = None
+	if fmt == "JPEG":
+		buf.seek(0)
+		exif_segment = find_exif_segment(buf.read(EXIF_SCAN_BYTES))
+	return out_im, fmt, exif_segment
+
+
+def _process_file(
+	f: str,
+	args: argparse.Namespace,
+	root_output: str,
+	style: dict,
+	cache: DateCache | None = None,
+	overwrite: bool | None = None,
+	st: os.stat_result | None = None,
+) -> str:
+	"""Watermark one input; returns "written", "exists" or "skipped" and raises on errors."""
+	overwrite = args.overwrite if overwrite is None else overwrite
+	with _mapped_input(f) as buf:
+		status, out_path, date_str = _check_input(f, buf, args, root_output, cache, overwrite, st)
+		if status is not None:
+			return status
+		if _wants_tiled(f, args.tiled_threshold_mp) and _write_tiled(f, out_path, date_str, args, style):
+			return "written"
+		out_im, fmt, exif_segment = _render_output(f, buf, date_str, args, style)
+		_save_output(out_im, out_path, fmt, exif_segment)
+	return "written"
 
 
 def main(argv: List[str] | None = None) -> int:
@@ -103,76 +381,797 @@ def main(argv: List[str] | None = None) -> int:
 	parser = build_arg_parser()
 	args = parser.parse_args(argv)
 
+	if args.cache_stats or args.cache_prune or args.cache_clear:
+		return _run_cache_command(args)
+	if args.serve:
+		# asyncio and the HTTP front end are only loaded for server runs
+		from .server import serve
+		return serve(args)
+	if args.stdin or args.stdout:
+		if not (args.stdin and args.stdout):
+			parser.error("--stdin and --stdout must be used together")
+		if args.path:
+			parser.error("--path cannot be combined with --stdin")
+		return _run_stdio(args)
+	if not args.path:
+		parser.error("--path is required")
+	if args.watch and not os.path.isdir(args.path):
+		parser.error("--watch needs a directory for --path")
+
 	include_ext = [e.strip() for e in args.include_ext.split(",") if e.strip()]
+	root_output = _derive_output_root(args.path, args.output_dir_name)
+
+	if is_archive(args.path):
+		batch_only = (
+			("--scan", args.scan),
+			("--resume", args.resume),
+			("--incremental", args.incremental),
+			("--pipeline", args.pipeline),
+			("--dedupe", args.dedupe),
+			("--max-memory", args.max_memory),
+		)
+		unsupported = [flag for flag, given in batch_only if given]
+		if unsupported:
+			parser.error(f"{', '.join(unsupported)}: not supported with an archive --path")
+		return _run_archive(args, _normalize_ext(include_ext), root_output)
 
 	try:
-		files = enumerate_candidate_files(args.path, args.recursive, include_ext)
+		files = iter_candidate_files(args.path, args.recursive, include_ext, sort=args.sort, exclude_dirs=[root_output])
 	except FileNotFoundError as exc:
 		print(str(exc), file=sys.stderr)
 		return 2
 
+	cache = open_date_cache(args.date_cache_path) if args.date_cache else None
+	if args.date_cache and cache is None and args.verbose:
+		print(f"Date cache unavailable at {args.date_cache_path}; continuing without it")
+	try:
+		return _run(args, files, root_output, cache)
+	finally:
+		if cache is not None:
+			if args.verbose:
+				print(f"Date cache: {cache.hits} hit(s), {cache.misses} miss(es)")
+			cache.close()
+
+
+def _run_stdio(args: argparse.Namespace) -> int:
+	"""Filter one image from stdin to stdout; the date comes from its EXIF only (a pipe has no mtime)."""
+	from .api import NoDateError, WatermarkSettings, watermark_stream
+
+	data = sys.stdin.buffer.read()
+	try:
+		watermark_stream(data, sys.stdout.buffer, WatermarkSettings.from_args(args))
+		sys.stdout.buffer.flush()
+	except NoDateError:
+		print("Skip <stdin>: no EXIF shooting date", file=sys.stderr)
+		return 1
+	except BrokenPipeError:
+		# The reader went away; keep the interpreter from failing again while flushing at exit
+		os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+		return 1
+	except Exception as e:
+		print(f"Error processing <stdin>: {e}", file=sys.stderr)
+		return 1
+	return 0
+
+
+def _member_date(m: ArchiveMember, args: argparse.Namespace) -> Optional[str]:
+	date_str, _ = read_exif_date(io.BytesIO(m.data))
+	if date_str is None and args.fallback_mtime and not args.exif_only:
+		# The member's own timestamp stands in for a file mtime
+		date_str = time.strftime("%Y-%m-%d", time.localtime(m.mtime))
+	return date_str
+
+
+def _member_job(m: ArchiveMember, args: argparse.Namespace | None = None) -> Tuple[Optional[str], Optional[bytes], Optional[str]]:
+	"""Watermark one archive member: (status, encoded output, error)."""
+	from .api import WatermarkSettings, watermark_bytes
+
+	args = args if args is not None else _job_state["args"]
+	try:
+		date_str = _member_date(m, args)
+		if not date_str:
+			return "skipped", None, None
+		return "written", watermark_bytes(m.data, WatermarkSettings.from_args(args), date_str), None
+	except Exception as e:
+		return None, None, str(e)
+
+
+def _iter_member_jobs(
+	members: Iterable[ArchiveMember],
+	args: argparse.Namespace,
+	root_output: str,
+) -> Iterator[Tuple[ArchiveMember, Optional[str], Optional[bytes], Optional[str]]]:
+	"""Run _member_job over the members in archive order, on a process pool for --jobs > 1."""
+	jobs = args.jobs or os.cpu_count() or 1
+	if jobs <= 1:
+		for m in members:
+			yield (m, *_member_job(m, args))
+		return
+	pool = _job_pool(jobs, args, root_output, _style_from_args(args))
+	pending: collections.deque = collections.deque()
+	try:
+		for m in members:
+			pending.append((m, pool.submit(_member_job, m)))
+			# Only a few members per worker are held in memory at once
+			if len(pending) >= jobs * 2:
+				done, future = pending.popleft()
+				yield (done, *future.result())
+		while pending:
+			done, future = pending.popleft()
+			yield (done, *future.result())
+	finally:
+		pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _run_archive(args: argparse.Namespace, include_ext: Set[str], root_output: str) -> int:
+	"""Stream the images of a tar/zip archive into a watermarked archive of the same kind.
+
+	Members keep their relative paths (plus --suffix) and nothing is
+	extracted to disk; the output is written next to where a directory
+	run would put its files.
+	"""
+	from .archive import ArchiveError, ArchiveWriter, iter_members
+
+	def _passed_over(name: str) -> None:
+		if args.verbose:
+			print(f"Skip {args.path}:{name}: not an included image, left out of the output")
+
+	members = iter_members(args.path, include_ext, _passed_over)
 	if args.dry_run:
-		print(f"DRY RUN: {len(files)} file(s) would be processed")
-		for f in files:
-			date_str = extract_photo_date_string(f, fallback_mtime=args.fallback_mtime, exif_only=args.exif_only)
-			status = date_str if date_str else ("SKIP: no date" if args.exif_only else "no date")
-			print(f"{f} -> {status}")
+		lines = []
+		try:
+			for m in members:
+				date_str = _member_date(m, args)
+				status = date_str if date_str else ("SKIP: no date" if args.exif_only else "no date")
+				lines.append(f"{args.path}:{m.name} -> {status}")
+		except (ArchiveError, OSError) as exc:
+			print(f"Error processing {args.path}: {exc}", file=sys.stderr)
+			return 1
+		print(f"DRY RUN: {len(lines)} file(s) would be processed")
+		for line in lines:
+			print(line)
 		return 0
 
+	out_path = os.path.join(root_output, os.path.basename(args.path))
+	if os.path.exists(out_path) and not args.overwrite:
+		if args.verbose:
+			print(f"Exists, skip write: {out_path}")
+		return 0
+	ok = skipped = errors = 0
+	written = False
+	try:
+		with _atomic_path(out_path) as tmp, open(tmp, "wb") as fh, ArchiveWriter(fh, args.path) as writer:
+			for m, status, data, error in _iter_member_jobs(members, args, root_output):
+				name = f"{args.path}:{m.name}"
+				if error is not None:
+					errors += 1
+					print(f"Error processing {name}: {error}", file=sys.stderr)
+				elif status == "skipped":
+					skipped += 1
+					if args.verbose:
+						print(f"Skip {name}: no date")
+				else:
+					ok += 1
+					writer.add(_with_suffix(m.name, args.suffix), data, m.mtime)
+		written = True
+	except KeyboardInterrupt:
+		print(f"Interrupted after {ok + skipped + errors} file(s)", file=sys.stderr)
+		return 130
+	except (ArchiveError, OSError) as exc:
+		# The partial output archive was already removed by _atomic_path
+		errors += 1
+		print(f"Error processing {args.path}: {exc}", file=sys.stderr)
 	if args.verbose:
-		print(f"Processing {len(files)} file(s)...")
+		print(f"Processed {ok + skipped + errors} file(s): {ok} ok, {skipped} skipped, {errors} failed")
+		if written:
+			print(f"Wrote {out_path}")
+	return 1 if errors or skipped else 0
 
-	root_output = _derive_output_root(args.path, args.output_dir_name)
-	ok = 0
-	skipped = 0
-	errors = 0
-	for f in files:
-		try:
-			date_str = extract_photo_date_string(f, fallback_mtime=args.fallback_mtime, exif_only=args.exif_only)
-			if not date_str:
-				skipped += 1
-				if args.verbose:
-					print(f"Skip {f}: no date")
+
+def _run_cache_command(args: argparse.Namespace) -> int:
+	cache = open_date_cache(args.date_cache_path)
+	if cache is None:
+		print(f"Cannot open date cache: {args.date_cache_path}", file=sys.stderr)
+		return 2
+	with cache:
+		if args.cache_clear:
+			print(f"Cleared {cache.clear()} cache entr(ies)")
+		if args.cache_prune:
+			print(f"Pruned {cache.prune()} stale cache entr(ies)")
+		if args.cache_stats:
+			stats = cache.stats()
+			print(f"Cache: {stats['path']} ({stats['file_bytes']} bytes)")
+			print(f"Entries: {stats['entries']}")
+			for source, count in sorted(stats["by_source"].items()):
+				print(f"  {source}: {count}")
+	return 0
+
+
+def _run_scan(args: argparse.Namespace, files: Iterable[CandidateFile], cache: DateCache | None) -> int:
+	records = iter_inventory(files, args.scan_threads, fallback_mtime=args.fallback_mtime, exif_only=args.exif_only, cache=cache)
+	if args.scan_output:
+		with open(args.scan_output, "w", encoding="utf-8", newline="") as out:
+			histogram = write_inventory(records, out, args.scan_format)
+	else:
+		histogram = write_inventory(records, sys.stdout, args.scan_format)
+	# The summary goes to stderr so stdout stays a clean JSONL/CSV stream
+	for line in format_histogram(histogram):
+		print(line, file=sys.stderr)
+	return 0
+
+
+_JobResult = Tuple[str, Optional[str], str, Optional[str]]
+
+
+class _Task(NamedTuple):
+	path: str
+	stat: Optional[os.stat_result]
+	overwrite: Optional[bool] = None
+	# (status, verbose message) for files that need no work: up to date or already journaled
+	done: Optional[Tuple[str, str]] = None
+	# Earlier input of the batch with the same bytes; its output is reused
+	dup_of: Optional[str] = None
+
+
+# Per-process state of a --jobs worker, set once by _init_job_worker
+_job_state: dict = {}
+
+
+def _plan_tasks(
+	files: Iterable[CandidateFile],
+	args: argparse.Namespace,
+	root_output: str,
+	manifest: Manifest | None,
+	settings: str,
+	completed: Dict[str, str] | None = None,
+	dedupe: Deduper | None = None,
+) -> Iterator[_Task]:
+	root_input = os.path.abspath(args.path)
+	for c in files:
+		if completed and c.path in completed:
+			# Finished by an earlier run of this batch: no stat, manifest or output check
+			yield _Task(c.path, None, done=(completed[c.path], f"Already done: {c.path}"))
+			continue
+		st = c.stat
+		overwrite = None
+		if manifest is not None and st is not None:
+			out_path = _map_output_path(c.path, root_input, root_output, args.suffix)
+			if manifest.is_current(c.path, out_path, settings, st):
+				yield _Task(c.path, st, done=("current", f"Up to date: {out_path}"))
 				continue
-			from PIL import Image
-			with Image.open(f) as im:
-				out_im = draw_text_watermark(
-					im,
-					date_str,
-					font_size=args.font_size,
-					color=args.color,
-					opacity=args.opacity,
-					position=args.position,
-					margin_x=args.margin_x,
-					margin_y=args.margin_y,
-					font_path=args.font_path,
-				)
-				out_path = _map_output_path(f, os.path.abspath(args.path), root_output, args.suffix)
-				if os.path.exists(out_path) and not args.overwrite:
-					if args.verbose:
-						print(f"Exists, skip write: {out_path}")
-					ok += 1
-					continue
-				# Choose format from original extension and attempt to keep EXIF for JPEG
-				_, ext = os.path.splitext(f)
-				fmt = "JPEG" if ext.lower() in {".jpg", ".jpeg"} else None
-				if fmt == "JPEG":
-					try:
-						import piexif
-						exif_bytes = piexif.dump(piexif.load(f))
-						out_im.save(out_path, format=fmt, exif=exif_bytes, quality=95)
-					except Exception:
-						out_im.save(out_path, format=fmt, quality=95)
-				else:
-					out_im.save(out_path, format=fmt)
-				ok += 1
+			if manifest.is_recorded(out_path):
+				# Rendered by this tool with other settings or from an older input: replace even without --overwrite
+				overwrite = True
+		original = dedupe.original(c.path, st.st_size) if dedupe is not None and st is not None else None
+		if original is not None:
+			# Resolved by the runner once the original's result is in; no worker is involved
+			yield _Task(c.path, st, overwrite, done=("duplicate", ""), dup_of=original)
+		else:
+			yield _Task(c.path, st, overwrite)
+
+
+def _already_done(task: _Task, args: argparse.Namespace) -> _JobResult:
+	status, message = task.done
+	return task.path, status, f"{message}\n" if args.verbose and message else "", None
+
+
+def _link_output(src: str, out_path: str, copy: bool = False) -> None:
+	"""Make out_path a hardlink to src (a copy when asked or when linking is not possible)."""
+	with _atomic_path(out_path) as tmp:
+		if not copy:
+			try:
+				os.link(src, tmp)
+				return
+			except OSError:
+				# Other filesystem, or one without hardlinks
+				pass
+		shutil.copyfile(src, tmp)
+
+
+def _iter_serial(
+	tasks: Iterable[_Task],
+	args: argparse.Namespace,
+	root_output: str,
+	style: dict,
+	cache: DateCache | None,
+) -> Iterator[_JobResult]:
+	for t in tasks:
+		if t.done:
+			yield _already_done(t, args)
+			continue
+		try:
+			yield t.path, _process_file(t.path, args, root_output, style, cache, t.overwrite, t.stat), "", None
 		except Exception as e:
-			errors += 1
-			print(f"Error processing {f}: {e}", file=sys.stderr)
+			yield t.path, None, "", str(e)
 
-	if errors > 0 or skipped > 0:
-		return 1
-	return 0
+
+def _init_job_worker(args: argparse.Namespace, root_output: str, style: dict) -> None:
+	# Ctrl-C is handled by the parent, which cancels the queued files
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+	# Commit every entry (cheap with synchronous=NORMAL): workers may be torn down without a chance to flush
+	cache = open_date_cache(args.date_cache_path, commit_every=1) if args.date_cache else None
+	_job_state.update(args=args, root_output=root_output, style=style, cache=cache)
+
+
+def _run_job(f: str, st: os.stat_result | None = None, overwrite: bool | None = None) -> Tuple[Optional[str], str, Optional[str], int, int]:
+	"""Process one file in a worker: (status, captured stdout, error, cache hits, cache misses)."""
+	cache = _job_state["cache"]
+	hits, misses = (cache.hits, cache.misses) if cache is not None else (0, 0)
+	log = io.StringIO()
+	status = error = None
+	with contextlib.redirect_stdout(log):
+		try:
+			status = _process_file(f, _job_state["args"], _job_state["root_output"], _job_state["style"], cache, overwrite, st)
+		except Exception as e:
+			error = str(e)
+	if cache is not None:
+		hits, misses = cache.hits - hits, cache.misses - misses
+	return status, log.getvalue(), error, hits, misses
+
+
+def _job_pool(jobs: int, args: argparse.Namespace, root_output: str, style: dict) -> ProcessPoolExecutor:
+	from concurrent.futures import ProcessPoolExecutor
+
+	return ProcessPoolExecutor(max_workers=jobs, initializer=_init_job_worker, initargs=(args, root_output, style))
+
+
+def _reserve(t: _Task, args: argparse.Namespace, budget: MemoryBudget | None) -> int:
+	"""Block until the file's estimated decode footprint fits the budget; returns the bytes held."""
+	if budget is None:
+		return 0
+	cap = args.tiled_memory_mb * 1024 * 1024 if _wants_tiled(t.path, args.tiled_threshold_mp) else None
+	return budget.acquire(estimate_decoded_bytes(t.path, t.stat, cap))
+
+
+def _iter_parallel(
+	tasks: Iterable[_Task],
+	jobs: int,
+	args: argparse.Namespace,
+	root_output: str,
+	style: dict,
+	cache: DateCache | None,
+	budget: MemoryBudget | None = None,
+	pool: ProcessPoolExecutor | None = None,
+) -> Iterator[_JobResult]:
+	"""Run _process_file on a process pool, yielding results in input order.
+
+	A pool passed in (kept warm across batches by --watch) is left running.
+	"""
+	own_pool = pool is None
+	if own_pool:
+		pool = _job_pool(jobs, args, root_output, style)
+	pending: collections.deque = collections.deque()
+	tasks_iter = iter(tasks)
+
+	def _submit(t: _Task) -> None:
+		future = None
+		if not t.done:
+			reserved = _reserve(t, args, budget)
+			future = pool.submit(_run_job, t.path, t.stat, t.overwrite)
+			if reserved:
+				# Released when the worker is done, not when the result is consumed in order
+				future.add_done_callback(lambda _f, n=reserved: budget.release(n))
+		pending.append((t, future))
+
+	try:
+		# Keep a few files queued per worker; the enumerator is only pulled as slots free up
+		for t in tasks_iter:
+			_submit(t)
+			if len(pending) >= jobs * 2:
+				break
+		while pending:
+			t, future = pending.popleft()
+			if future is None:
+				result = _already_done(t, args)
+			else:
+				status, log, error, hits, misses = future.result()
+				if cache is not None:
+					cache.hits += hits
+					cache.misses += misses
+				result = (t.path, status, log, error)
+			for nxt in tasks_iter:
+				_submit(nxt)
+				break
+			yield result
+	finally:
+		# On Ctrl-C (or an abandoned iterator) queued files are dropped; running ones finish
+		if own_pool:
+			pool.shutdown(wait=True, cancel_futures=True)
+		else:
+			for _, future in pending:
+				if future is not None:
+					future.cancel()
+
+
+class _PipelineJob:
+	__slots__ = ("task", "log", "out_path", "date_str", "buf", "tiled", "image", "fmt", "exif_segment", "reserved")
+
+	def __init__(self, task: _Task):
+		self.task = task
+		self.log: List[str] = []
+		self.out_path = ""
+		self.date_str: Optional[str] = None
+		self.buf: Optional[BinaryIO] = None
+		self.tiled = False
+		self.image: object = None
+		self.fmt: Optional[str] = None
+		self.exif_segment: Optional[bytes] = None
+		self.reserved = 0
+
+	def echo(self, message: str) -> None:
+		self.log.append(message + "\n")
+
+
+def _read_input(path: str) -> BinaryIO:
+	with open(path, "rb") as fh:
+		return io.BytesIO(fh.read())
+
+
+def _iter_pipeline(
+	tasks: Iterable[_Task],
+	args: argparse.Namespace,
+	root_output: str,
+	style: dict,
+	cache: DateCache | None,
+	budget: MemoryBudget | None = None,
+) -> Iterator[_JobResult]:
+	"""Run files through read -> render -> write thread stages, yielding results in input order."""
+
+	def _release(job: _PipelineJob) -> None:
+		if job.reserved:
+			budget.release(job.reserved)
+			job.reserved = 0
+
+	def _holding_memory(fn):
+		# The reservation taken before prefetching is returned once the file leaves the pipeline
+		def run(job: _PipelineJob):
+			try:
+				result = fn(job)
+			except BaseException:
+				_release(job)
+				raise
+			if isinstance(result, Finished) or fn is _write:
+				_release(job)
+			return result
+		return run
+
+	def _read(job: _PipelineJob):
+		t = job.task
+		if t.done:
+			if args.verbose:
+				job.echo(t.done[1])
+			return Finished(t.done[0])
+		job.reserved = _reserve(t, args, budget)
+		# Large TIFFs are patched in place from disk; everything else is prefetched whole
+		job.tiled = _wants_tiled(t.path, args.tiled_threshold_mp)
+		if not job.tiled:
+			job.buf = _read_input(t.path)
+		overwrite = args.overwrite if t.overwrite is None else t.overwrite
+		status, job.out_path, job.date_str = _check_input(t.path, job.buf, args, root_output, cache, overwrite, t.stat, job.echo)
+		if status is not None:
+			job.buf = None
+			return Finished(status)
+		return job
+
+	def _render(job: _PipelineJob):
+		path = job.task.path
+		if job.tiled:
+			if _write_tiled(path, job.out_path, job.date_str, args, style, job.echo):
+				return Finished("written")
+			job.buf = _read_input(path)
+		job.image, job.fmt, job.exif_segment = _render_output(path, job.buf, job.date_str, args, style)
+		job.buf = None
+		return job
+
+	def _write(job: _PipelineJob):
+		_save_output(job.image, job.out_path, job.fmt, job.exif_segment)
+		job.image = None
+		return "written"
+
+	stages = [
+		Stage("read", _holding_memory(_read), args.read_threads),
+		Stage("render", _holding_memory(_render), args.render_threads or os.cpu_count() or 1),
+		Stage("write", _holding_memory(_write), args.write_threads),
+	]
+	results = run_pipeline((_PipelineJob(t) for t in tasks), stages, args.queue_size)
+	try:
+		for job, status, error in results:
+			yield job.task.path, None if error else status, "".join(job.log), None if error is None else str(error)
+	finally:
+		# Cancelled items never release their reservation: stop gating so readers can drain
+		if budget is not None:
+			budget.close()
+		results.close()
+
+
+def _run(args: argparse.Namespace, files: Iterable[CandidateFile], root_output: str, cache: DateCache | None) -> int:
+	if args.scan:
+		return _run_scan(args, files, cache)
+	if args.dry_run:
+		lines = []
+		for c in files:
+			date_str = extract_photo_date_string(c.path, fallback_mtime=args.fallback_mtime, exif_only=args.exif_only, cache=cache, st=c.stat)
+			status = date_str if date_str else ("SKIP: no date" if args.exif_only else "no date")
+			lines.append(f"{c.path} -> {status}")
+		# The total stays the first line, so the listing is collected before printing
+		print(f"DRY RUN: {len(lines)} file(s) would be processed")
+		for line in lines:
+			print(line)
+		return 0
+
+	from .manifest import Manifest
+
+	style = _style_from_args(args)
+	manifest = Manifest(root_output, args.manifest_hash) if args.incremental else None
+	try:
+		return _run_batch(args, files, root_output, style, cache, manifest)
+	finally:
+		if manifest is not None:
+			manifest.close()
+
+
+def _style_from_args(args: argparse.Namespace) -> dict:
+	return dict(
+		font_size=args.font_size,
+		color=args.color,
+		opacity=args.opacity,
+		position=args.position,
+		margin_x=args.margin_x,
+		margin_y=args.margin_y,
+		font_path=args.font_path,
+		glyph_atlas=args.glyph_atlas,
+	)
+
+
+def _render_settings(args: argparse.Namespace, style: dict) -> dict:
+	"""Options that change the pixels, encoding or date of an output (not its location)."""
+	return dict(
+		style,
+		keep_mode=args.keep_mode,
+		fallback_mtime=args.fallback_mtime,
+		exif_only=args.exif_only,
+		# Decide between in-place strip/tile patching and a full re-encode of TIFFs
+		tiled_threshold_mp=args.tiled_threshold_mp,
+		tiled_memory_mb=args.tiled_memory_mb,
+	)
+
+
+def _run_batch(
+	args: argparse.Namespace,
+	files: Iterable[CandidateFile],
+	root_output: str,
+	style: dict,
+	cache: DateCache | None,
+	manifest: Manifest | None,
+) -> int:
+	from .manifest import settings_hash
+
+	settings = settings_hash(_render_settings(args, style))
+	if not args.resume:
+		return _run_journaled(args, files, root_output, style, cache, manifest, None, settings)
+	try:
+		journal = Journal(root_output, settings, resume=True)
+	except JournalMismatch as exc:
+		print(f"Cannot resume: {exc}; delete it to start over", file=sys.stderr)
+		return 2
+	with journal:
+		return _run_journaled(args, files, root_output, style, cache, manifest, journal, settings)
+
+
+class _BatchRunner:
+	"""Feeds files to the selected executor and books results in the journal, manifest and counts.
+
+	One runner serves a whole invocation, so --watch reuses its warm process
+	pool and journal for every batch of new arrivals.
+	"""
+
+	def __init__(
+		self,
+		args: argparse.Namespace,
+		root_output: str,
+		style: dict,
+		cache: DateCache | None,
+		manifest: Manifest | None,
+		journal: Journal | None,
+		settings: str,
+	):
+		self.args = args
+		self.root_input = os.path.abspath(args.path)
+		self.root_output = root_output
+		self.style = style
+		self.cache = cache
+		self.manifest = manifest
+		self.journal = journal
+		self.settings = settings
+		# Snapshot: entries appended during this run must not be mistaken for resumed ones
+		self.resumed = dict(journal.completed) if journal is not None else {}
+		self.jobs = args.jobs or os.cpu_count() or 1
+		self.pool: ProcessPoolExecutor | None = None
+		self.ok = 0
+		self.skipped = 0
+		self.errors = 0
+		# Renders avoided by --dedupe
+		self.saved = 0
+
+	@property
+	def total(self) -> int:
+		return self.ok + self.skipped + self.errors
+
+	def _results(self, tasks: Iterable[_Task], keep_pool: bool) -> Iterator[_JobResult]:
+		args = self.args
+		# One budget per batch: the pipeline closes its budget when the batch ends
+		budget = MemoryBudget(args.max_memory * 1024 * 1024) if args.max_memory > 0 else None
+		if args.pipeline:
+			return _iter_pipeline(tasks, args, self.root_output, self.style, self.cache, budget)
+		if self.jobs > 1 and not os.path.isfile(args.path):
+			if keep_pool and self.pool is None:
+				self.pool = _job_pool(self.jobs, args, self.root_output, self.style)
+			return _iter_parallel(tasks, self.jobs, args, self.root_output, self.style, self.cache, budget, self.pool)
+		return _iter_serial(tasks, args, self.root_output, self.style, self.cache)
+
+	def _same_date(self, a: str, b: _Task) -> bool:
+		args = self.args
+		if not args.fallback_mtime or args.exif_only:
+			# Equal bytes carry an equal EXIF date
+			return True
+		return extract_photo_date_string(a, cache=self.cache) == extract_photo_date_string(b.path, cache=self.cache, st=b.stat)
+
+	def _duplicate(self, t: _Task, original_status: Optional[str]) -> Tuple[str, str]:
+		"""Give a duplicate input a link to its original's fresh output, or process it like any other file."""
+		args = self.args
+		src = _map_output_path(t.dup_of, self.root_input, self.root_output, args.suffix)
+		# Only an output rendered in this batch is known to match the settings
+		if original_status != "written" or not os.path.exists(src) or not self._same_date(t.dup_of, t):
+			log = io.StringIO()
+			with contextlib.redirect_stdout(log):
+				status = _process_file(t.path, args, self.root_output, self.style, self.cache, t.overwrite, t.stat)
+			return status, log.getvalue()
+		out_path = _map_output_path(t.path, self.root_input, self.root_output, args.suffix)
+		overwrite = args.overwrite if t.overwrite is None else t.overwrite
+		if os.path.exists(out_path) and not overwrite:
+			return "exists", f"Exists, skip write: {out_path}\n" if args.verbose else ""
+		_link_output(src, out_path, copy=args.dedupe == "copy")
+		self.saved += 1
+		return "written", f"Duplicate of {t.dup_of}: {out_path}\n" if args.verbose else ""
+
+	def run(self, files: Iterable[CandidateFile], keep_pool: bool = False) -> None:
+		args = self.args
+		dedupe = None
+		if args.dedupe:
+			from .dedupe import Deduper
+
+			# Per batch: under --watch an original may be re-rendered from new bytes later on
+			dedupe = Deduper()
+		duplicates: Dict[str, _Task] = {}
+		statuses: Dict[str, Optional[str]] = {}
+
+		def _track(tasks: Iterable[_Task]) -> Iterator[_Task]:
+			for t in tasks:
+				if t.dup_of is not None:
+					duplicates[t.path] = t
+				yield t
+
+		tasks = _plan_tasks(files, args, self.root_output, self.manifest, self.settings, self.resumed, dedupe)
+		for f, status, log, error in self._results(_track(tasks), keep_pool):
+			if f in duplicates:
+				# In input order, so the original's result is already in
+				t = duplicates.pop(f)
+				try:
+					status, log = self._duplicate(t, statuses.get(t.dup_of))
+				except Exception as e:
+					error = str(e)
+			if dedupe is not None:
+				statuses[f] = None if error is not None else status
+			# Worker output is replayed in input order, so logs match the serial run
+			if log:
+				sys.stdout.write(log)
+			if self.journal is not None and f not in self.resumed:
+				self.journal.record(f, FAILED if error is not None else status, error)
+			if error is not None:
+				self.errors += 1
+				print(f"Error processing {f}: {error}", file=sys.stderr)
+				continue
+			if status == "skipped":
+				self.skipped += 1
+				continue
+			self.ok += 1
+			if status == "written" and self.manifest is not None:
+				self.manifest.record(f, _map_output_path(f, self.root_input, self.root_output, args.suffix), self.settings)
+		# A file re-dropped into a watched folder is processed again, not resumed
+		self.resumed.clear()
+
+	def close(self) -> None:
+		if self.pool is not None:
+			self.pool.shutdown(wait=True, cancel_futures=True)
+			self.pool = None
+
+	def exit_code(self) -> int:
+		if self.args.verbose:
+			saved = f"; {self.saved} render(s) saved by --dedupe" if self.args.dedupe else ""
+			print(f"Processed {self.total} file(s): {self.ok} ok, {self.skipped} skipped, {self.errors} failed{saved}")
+		if self.errors > 0 or self.skipped > 0:
+			return 1
+		return 0
+
+
+def _run_journaled(
+	args: argparse.Namespace,
+	files: Iterable[CandidateFile],
+	root_output: str,
+	style: dict,
+	cache: DateCache | None,
+	manifest: Manifest | None,
+	journal: Journal | None,
+	settings: str,
+) -> int:
+	runner = _BatchRunner(args, root_output, style, cache, manifest, journal, settings)
+	if args.watch:
+		return _run_watch(runner, files)
+	try:
+		runner.run(files)
+	except KeyboardInterrupt:
+		print(f"Interrupted after {runner.total} file(s)", file=sys.stderr)
+		return 130
+	return runner.exit_code()
+
+
+def _run_watch(runner: _BatchRunner, files: Iterable[CandidateFile]) -> int:
+	"""Process what is already there, then watermark new arrivals until SIGINT/SIGTERM."""
+	from .watch import Debouncer, open_watcher
+
+	args = runner.args
+	include_ext = _normalize_ext(e.strip() for e in args.include_ext.split(",") if e.strip())
+	root = os.path.abspath(args.path)
+
+	def _scan(top: str) -> Iterator[Tuple[str, os.stat_result]]:
+		for c in iter_candidate_files(top, args.recursive, include_ext, exclude_dirs=[runner.root_output]):
+			st = c.stat
+			if st is not None:
+				yield c.path, st
+
+	stop = threading.Event()
+
+	def _on_signal(signum, _frame):
+		if stop.is_set():
+			raise KeyboardInterrupt
+		stop.set()
+		print("Stopping after the current batch (press Ctrl-C again to abort)", file=sys.stderr)
+
+	previous = {sig: signal.signal(sig, _on_signal) for sig in (signal.SIGINT, signal.SIGTERM)}
+	# Watch first so nothing dropped during the initial pass is missed
+	watcher = open_watcher(root, args.recursive, include_ext, _scan, [runner.root_output], polling=args.watch_poll)
+	debouncer = Debouncer(args.watch_settle)
+	# Wake often enough that a file is written within the latency target once it has settled
+	tick = max(0.05, min(args.watch_latency / 4, args.watch_settle / 2 or args.watch_latency / 4))
+	stats_at = time.monotonic()
+	stats_done = 0
+	try:
+		runner.run(files, keep_pool=True)
+		print(f"Watching {root} ({watcher.backend}); press Ctrl-C to stop", flush=True)
+		while not stop.is_set():
+			debouncer.touch(watcher.changes(tick))
+			ready = [CandidateFile(path, st) for path, st in debouncer.ready()]
+			if ready:
+				runner.run(ready, keep_pool=True)
+				sys.stdout.flush()
+			now = time.monotonic()
+			if args.watch_stats > 0 and now - stats_at >= args.watch_stats:
+				done = runner.total - stats_done
+				print(
+					f"Watch: {done} file(s) in {now - stats_at:.0f}s ({done / (now - stats_at):.2f}/s); "
+					f"total {runner.ok} ok, {runner.skipped} skipped, {runner.errors} failed; {len(debouncer)} pending",
+					flush=True,
+				)
+				stats_at, stats_done = now, runner.total
+	except KeyboardInterrupt:
+		print(f"Interrupted after {runner.total} file(s)", file=sys.stderr)
+		return 130
+	finally:
+		watcher.close()
+		runner.close()
+		for sig, handler in previous.items():
+			signal.signal(sig, handler)
+	return runner.exit_code()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from typing import BinaryIO, Dict, Optional, Tuple
+
+from .exif_utils import resolve_photo_date
+
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".photodate_wm", "date_cache.sqlite3")
+
+# Pending writes are committed in batches instead of once per file
+_COMMIT_EVERY = 256
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dates (
+	path TEXT PRIMARY KEY,
+	size INTEGER NOT NULL,
+	mtime_ns INTEGER NOT NULL,
+	date TEXT,
+	source TEXT
+)
+"""
+
+
+class DateCache:
+	"""Resolved photo dates keyed by (absolute path, size, mtime_ns).
+
+	The policy-independent result of resolve_photo_date is stored, so the same
+	entry answers --exif-only and --fallback-mtime runs alike. Safe to share
+	between threads.
+	"""
+
+	def __init__(self, path: str = DEFAULT_CACHE_PATH, commit_every: int = _COMMIT_EVERY):
+		self.path = path
+		self.commit_every = max(1, commit_every)
+		parent = os.path.dirname(os.path.abspath(path))
+		os.makedirs(parent, exist_ok=True)
+		self._conn = sqlite3.connect(path, check_same_thread=False)
+		# WAL lets --jobs worker processes read while another one writes
+		self._conn.execute("PRAGMA journal_mode=WAL")
+		# A lost tail of entries only costs re-reading those dates; skip the fsync per commit
+		self._conn.execute("PRAGMA synchronous=NORMAL")
+		self._conn.execute(_SCHEMA)
+		self._conn.commit()
+		self._lock = threading.Lock()
+		self._pending = 0
+		self.hits = 0
+		self.misses = 0
+
+	def __enter__(self) -> "DateCache":
+		return self
+
+	def __exit__(self, *exc) -> None:
+		self.close()
+
+	@staticmethod
+	def _key(image_path: str, st: Optional[os.stat_result] = None) -> Optional[Tuple[str, int, int]]:
+		if st is None:
+			try:
+				st = os.stat(image_path)
+			except OSError:
+				return None
+		return os.path.abspath(image_path), st.st_size, st.st_mtime_ns
+
+	def lookup(self, image_path: str, st: Optional[os.stat_result] = None) -> Optional[Tuple[Optional[str], Optional[str]]]:
+		"""Return the cached (date, source) if the file is unchanged, else None."""
+		key = self._key(image_path, st)
+		if key is None:
+			return None
+		with self._lock:
+			row = self._conn.execute(
+				"SELECT date, source FROM dates WHERE path = ? AND size = ? AND mtime_ns = ?", key
+			).fetchone()
+		return (row[0], row[1]) if row is not None else None
+
+	def store(self, image_path: str, date_str: Optional[str], source: Optional[str], st: Optional[os.stat_result] = None) -> None:
+		key = self._key(image_path, st)
+		if key is None:
+			return
+		with self._lock:
+			try:
+				self._conn.execute("INSERT OR REPLACE INTO dates VALUES (?, ?, ?, ?, ?)", key + (date_str, source))
+				self._pending += 1
+				if self._pending >= self.commit_every:
+					self._conn.commit()
+					self._pending = 0
+			except sqlite3.OperationalError:
+				# Busy/locked by another process: the cache is best-effort, drop the write
+				self._conn.rollback()
+				self._pending = 0
+
+	def resolve(
+		self,
+		image_path: str,
+		stream: Optional[BinaryIO] = None,
+		st: Optional[os.stat_result] = None,
+	) -> Tuple[Optional[str], Optional[str]]:
+		"""Cached resolve_photo_date: unchanged files are answered without being opened."""
+		cached = self.lookup(image_path, st)
+		with self._lock:
+			if cached is not None:
+				self.hits += 1
+			else:
+				self.misses += 1
+		if cached is not None:
+			return cached
+		date_str, source = resolve_photo_date(image_path, stream, st)
+		self.store(image_path, date_str, source, st)
+		return date_str, source
+
+	def flush(self) -> None:
+		with self._lock:
+			self._conn.commit()
+			self._pending = 0
+
+	def stats(self) -> Dict[str, object]:
+		self.flush()
+		with self._lock:
+			entries = self._conn.execute("SELECT COUNT(*) FROM dates").fetchone()[0]
+			by_source = dict(self._conn.execute("SELECT COALESCE(source, 'none'), COUNT(*) FROM dates GROUP BY 1").fetchall())
+		try:
+			file_bytes = os.path.getsize(self.path)
+		except OSError:
+			file_bytes = 0
+		return {
+			"path": self.path,
+			"entries": entries,
+			"by_source": by_source,
+			"file_bytes": file_bytes,
+			"hits": self.hits,
+			"misses": self.misses,
+		}
+
+	def prune(self) -> int:
+		"""Drop entries whose file is gone or has changed; returns how many were removed."""
+		self.flush()
+		with self._lock:
+			rows = self._conn.execute("SELECT path, size, mtime_ns FROM dates").fetchall()
+		stale = [(row[0],) for row in rows if self._key(row[0]) != tuple(row)]
+		with self._lock:
+			self._conn.executemany("DELETE FROM dates WHERE path = ?", stale)
+			self._conn.commit()
+			self._conn.execute("VACUUM")
+		return len(stale)
+
+	def clear(self) -> int:
+		with self._lock:
+			removed = self._conn.execute("DELETE FROM dates").rowcount
+			self._conn.commit()
+			self._conn.execute("VACUUM")
+			self._pending = 0
+		return removed
+
+	def close(self) -> None:
+		with self._lock:
+			self._conn.commit()
+			self._conn.close()
+
+
+def open_date_cache(path: str = DEFAULT_CACHE_PATH, commit_every: int = _COMMIT_EVERY) -> Optional[DateCache]:
+	"""Open the cache, or return None when it cannot be used (read-only home, corrupt file...)."""
+	try:
+		return DateCache(path, commit_every)
+	except (OSError, sqlite3.Error):
+		return None
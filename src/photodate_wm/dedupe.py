@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+# Bytes hashed first; files of the same size are only read in full when these match
+PREFIX_BYTES = 64 * 1024
+
+_HASH_CHUNK = 1024 * 1024
+
+
+def _blake2b(path: str, limit: Optional[int] = None) -> str:
+	h = hashlib.blake2b(digest_size=32)
+	with open(path, "rb") as f:
+		if limit is not None:
+			h.update(f.read(limit))
+		else:
+			for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+				h.update(chunk)
+	return h.hexdigest()
+
+
+class Deduper:
+	"""Finds inputs whose bytes repeat an earlier input of the same batch.
+
+	Files are grouped by size first, then by a BLAKE2b hash of their first
+	PREFIX_BYTES; only files that still collide are hashed in full. A tree
+	without duplicates costs no reads at all, and same-size photos usually
+	part ways within the prefix.
+	"""
+
+	def __init__(self):
+		# Inputs not hashed further yet, per group (the first one seen, until a second arrives)
+		self._by_size: Dict[int, List[str]] = {}
+		self._by_prefix: Dict[Tuple[int, str], List[str]] = {}
+		self._first: Dict[Tuple[int, str], str] = {}
+		self.hashed = 0
+
+	def _digest(self, path: str, limit: Optional[int] = None) -> str:
+		self.hashed += 1
+		return _blake2b(path, limit)
+
+	def _match(self, key: Tuple[int, str], path: str) -> Optional[str]:
+		first = self._first.setdefault(key, path)
+		return None if first == path else first
+
+	def _by_content(self, path: str, size: int) -> Optional[str]:
+		try:
+			prefix = (size, self._digest(path, PREFIX_BYTES))
+		except OSError:
+			return None
+		if size <= PREFIX_BYTES:
+			# The prefix is the whole file
+			return self._match(prefix, path)
+		if prefix not in self._by_prefix:
+			self._by_prefix[prefix] = [path]
+			return None
+		for earlier in self._by_prefix[prefix]:
+			try:
+				self._first.setdefault((size, self._digest(earlier)), earlier)
+			except OSError:
+				continue
+		self._by_prefix[prefix] = []
+		try:
+			return self._match((size, self._digest(path)), path)
+		except OSError:
+			return None
+
+	def original(self, path: str, size: int) -> Optional[str]:
+		"""The earlier input with the same content as path, or None (path becomes an original).
+
+		An input that cannot be read now is never called a duplicate; the
+		normal processing reports it.
+		"""
+		if size not in self._by_size:
+			self._by_size[size] = [path]
+			return None
+		for earlier in self._by_size[size]:
+			self._by_content(earlier, size)
+		self._by_size[size] = []
+		return self._by_content(path, size)
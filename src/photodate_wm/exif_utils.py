@@ -1,10 +1,12 @@
 from __future__ import annotations
 
 import os
+import struct
 from datetime import datetime
-from typing import Optional
+from typing import BinaryIO, Dict, Optional, Tuple
 
-import piexif
+# An Exif APP1 segment is at most 64 KB and sits before the image data
+EXIF_SCAN_BYTES = 256 * 1024
 
 
 def _parse_exif_datetime_string(dt_str: str) -> Optional[datetime]:
@@ -15,58 +17,280 @@ def _parse_exif_datetime_string(dt_str: str) -> Optional[datetime]:
 		return None
 
 
-def _read_exif_datetime_bytes(image_path: str) -> Optional[str]:
+# Header-only reader: never read more than this many bytes before giving up
+_HEADER_READ_BUDGET = 8192
+_MAX_JPEG_SEGMENTS = 32
+
+_TAG_DATETIME = 0x0132
+_TAG_EXIF_IFD = 0x8769
+_TAG_DATETIME_ORIGINAL = 0x9003
+_TAG_DATETIME_DIGITIZED = 0x9004
+
+# Where a resolved date came from
+SOURCE_DATETIME_ORIGINAL = "DateTimeOriginal"
+SOURCE_DATETIME_DIGITIZED = "DateTimeDigitized"
+SOURCE_DATETIME = "DateTime"
+SOURCE_MTIME = "mtime"
+
+
+class _HeaderFallback(Exception):
+	"""Raised when the bounded reader meets something it does not handle."""
+
+
+class _BoundedReader:
+	def __init__(self, f: BinaryIO, budget: int = _HEADER_READ_BUDGET):
+		self.f = f
+		self.budget = budget
+
+	def read_at(self, pos: int, size: int) -> bytes:
+		if size > self.budget:
+			raise _HeaderFallback("header read budget exhausted")
+		self.budget -= size
+		self.f.seek(pos)
+		data = self.f.read(size)
+		if len(data) != size:
+			raise _HeaderFallback("truncated header")
+		return data
+
+
+def _read_ifd_ascii(reader: _BoundedReader, base: int, order: str, ifd_offset: int, tags: Tuple[int, ...]) -> Dict[int, bytes | int]:
+	"""Return the requested ASCII (or LONG pointer) tag values from one IFD."""
+	(count,) = struct.unpack(order + "H", reader.read_at(base + ifd_offset, 2))
+	if count > 512:
+		raise _HeaderFallback("implausible IFD entry count")
+	raw = reader.read_at(base + ifd_offset + 2, 12 * count)
+	found: Dict[int, bytes | int] = {}
+	for i in range(count):
+		tag, typ, n = struct.unpack(order + "HHI", raw[12 * i:12 * i + 8])
+		if tag not in tags:
+			continue
+		value = raw[12 * i + 8:12 * i + 12]
+		if typ == 2:
+			if n <= 4:
+				data = value[:n]
+			else:
+				(offset,) = struct.unpack(order + "I", value)
+				data = reader.read_at(base + offset, min(n, 64))
+			found[tag] = data.rstrip(b"\x00")
+		elif typ in (4, 13):
+			(found[tag],) = struct.unpack(order + "I", value)
+	return found
+
+
+def _read_tiff_datetime(reader: _BoundedReader, base: int) -> Optional[Tuple[str, str]]:
+	header = reader.read_at(base, 8)
+	if header[:4] == b"II*\x00":
+		order = "<"
+	elif header[:4] == b"MM\x00*":
+		order = ">"
+	else:
+		raise _HeaderFallback("not a classic TIFF header")
+	(ifd0,) = struct.unpack(order + "I", header[4:8])
+	zeroth = _read_ifd_ascii(reader, base, order, ifd0, (_TAG_DATETIME, _TAG_EXIF_IFD))
+	exif: Dict[int, bytes | int] = {}
+	exif_ifd = zeroth.get(_TAG_EXIF_IFD)
+	if isinstance(exif_ifd, int):
+		exif = _read_ifd_ascii(reader, base, order, exif_ifd, (_TAG_DATETIME_ORIGINAL, _TAG_DATETIME_DIGITIZED))
+
+	# Priority: DateTimeOriginal -> DateTimeDigitized (CreateDate) -> DateTime
+	candidates = (
+		(exif.get(_TAG_DATETIME_ORIGINAL), SOURCE_DATETIME_ORIGINAL),
+		(exif.get(_TAG_DATETIME_DIGITIZED), SOURCE_DATETIME_DIGITIZED),
+		(zeroth.get(_TAG_DATETIME), SOURCE_DATETIME),
+	)
+	for val, source in candidates:
+		if isinstance(val, bytes):
+			return val.decode("utf-8", errors="ignore"), source
+	return None
+
+
+def _read_jpeg_datetime(reader: _BoundedReader) -> Optional[Tuple[str, str]]:
+	pos = 2
+	for _ in range(_MAX_JPEG_SEGMENTS):
+		prefix, marker, length = struct.unpack(">BBH", reader.read_at(pos, 4))
+		if prefix != 0xFF:
+			raise _HeaderFallback("unexpected JPEG marker layout")
+		if marker in (0xDA, 0xD9):
+			# Start of scan / end of image: no EXIF segment before the image data
+			return None
+		if marker == 0xE1 and reader.read_at(pos + 4, 6) == b"Exif\x00\x00":
+			return _read_tiff_datetime(reader, pos + 10)
+		pos += 2 + length
+	raise _HeaderFallback("EXIF segment not found within the first JPEG markers")
+
+
+def _read_exif_datetime_header(f: BinaryIO) -> Optional[Tuple[str, str]]:
+	"""Read the raw EXIF date string and its tag name from a JPEG or TIFF stream header.
+
+	Seeks through JPEG markers to APP1 (or the TIFF IFD chain) and reads only
+	DateTimeOriginal, DateTimeDigitized and DateTime, stopping after a few KB.
+	Raises _HeaderFallback for layouts it does not understand.
+	"""
+	reader = _BoundedReader(f)
+	magic = reader.read_at(0, 4)
+	if magic[:2] == b"\xff\xd8":
+		return _read_jpeg_datetime(reader)
+	if magic in (b"II*\x00", b"MM\x00*"):
+		return _read_tiff_datetime(reader, 0)
+	raise _HeaderFallback("not a JPEG or TIFF stream")
+
+
+def _read_exif_datetime_piexif(source: str | bytes) -> Optional[Tuple[str, str]]:
+	# Only needed when the header reader gives up, so it is not paid for at import
+	import piexif
+
 	try:
-		exif_dict = piexif.load(image_path)
+		exif_dict = piexif.load(source)
 	except Exception:
 		return None
 
 	# Priority: DateTimeOriginal -> DateTimeDigitized (CreateDate) -> DateTime
 	try_order = [
-		(lambda d: d.get("Exif", {}).get(piexif.ExifIFD.DateTimeOriginal)),
-		(lambda d: d.get("Exif", {}).get(piexif.ExifIFD.DateTimeDigitized)),
-		(lambda d: d.get("0th", {}).get(piexif.ImageIFD.DateTime)),
+		(lambda d: d.get("Exif", {}).get(piexif.ExifIFD.DateTimeOriginal), SOURCE_DATETIME_ORIGINAL),
+		(lambda d: d.get("Exif", {}).get(piexif.ExifIFD.DateTimeDigitized), SOURCE_DATETIME_DIGITIZED),
+		(lambda d: d.get("0th", {}).get(piexif.ImageIFD.DateTime), SOURCE_DATETIME),
 	]
-	for getter in try_order:
+	for getter, source_name in try_order:
 		val = getter(exif_dict)
 		if isinstance(val, bytes):
 			try:
-				return val.decode("utf-8", errors="ignore")
+				return val.decode("utf-8", errors="ignore"), source_name
 			except Exception:
 				continue
 		elif isinstance(val, str):
-			return val
+			return val, source_name
 	return None
 
 
-def extract_photo_date_string(image_path: str, fallback_mtime: bool = True, exif_only: bool = False) -> Optional[str]:
-	"""Extract shooting date as YYYY-MM-DD string.
+def _read_exif_datetime_bytes(image_path: str, stream: Optional[BinaryIO] = None) -> Optional[Tuple[str, str]]:
+	try:
+		if stream is not None:
+			return _read_exif_datetime_header(stream)
+		with open(image_path, "rb", buffering=0) as f:
+			return _read_exif_datetime_header(f)
+	except (_HeaderFallback, struct.error):
+		pass
+	except OSError:
+		return None
+	# Anything unusual (WebP, odd marker layouts, huge IFDs) goes through piexif
+	if stream is not None:
+		stream.seek(0)
+		return _read_exif_datetime_piexif(stream.read())
+	return _read_exif_datetime_piexif(image_path)
 
-	Returns None when no date can be determined AND exif_only is True.
-	When exif_only is False, falls back to file mtime if fallback_mtime is True.
-	"""
-	# 1) Try EXIF
-	exif_dt_raw = _read_exif_datetime_bytes(image_path)
-	if exif_dt_raw:
-		dt = _parse_exif_datetime_string(exif_dt_raw)
-		if dt is not None:
-			return dt.strftime("%Y-%m-%d")
 
-	# 2) If only EXIF requested, stop here
-	if exif_only:
+def find_exif_segment(data: bytes) -> Optional[bytes]:
+	"""Return the raw Exif APP1 segment (marker and length included) of a JPEG buffer."""
+	if data[:2] != b"\xff\xd8":
 		return None
-
-	# 3) Fallback to mtime
-	if fallback_mtime:
-		try:
-			mtime = os.path.getmtime(image_path)
-			local_dt = datetime.fromtimestamp(mtime)
-			return local_dt.strftime("%Y-%m-%d")
-		except Exception:
+	pos = 2
+	while pos + 4 <= len(data):
+		if data[pos] != 0xFF:
 			return None
-
+		marker = data[pos + 1]
+		if marker in (0xDA, 0xD9):
+			return None
+		(length,) = struct.unpack(">H", data[pos + 2:pos + 4])
+		if marker == 0xE1 and data[pos + 4:pos + 10] == b"Exif\x00\x00":
+			return bytes(data[pos:pos + 2 + length])
+		pos += 2 + length
 	return None
 
 
+def _app1_offset(head: bytes) -> Optional[int]:
+	"""Where an Exif APP1 goes in a JPEG starting with head: after SOI and a JFIF APP0 if there
+	is one. None while head is too short to tell."""
+	if len(head) < 4:
+		return None
+	if head[2:4] != b"\xff\xe0":
+		return 2
+	if len(head) < 6:
+		return None
+	end = 4 + struct.unpack(">H", head[4:6])[0]
+	return end if len(head) >= end else None
+
+
+def splice_exif_segment(jpeg: bytes, segment: bytes) -> bytes:
+	"""Insert a raw Exif APP1 segment after SOI (and JFIF APP0), replacing an existing one."""
+	existing = find_exif_segment(jpeg)
+	if existing is not None:
+		start = jpeg.index(existing)
+		jpeg = jpeg[:start] + jpeg[start + len(existing):]
+	pos = _app1_offset(jpeg) or 2
+	return jpeg[:pos] + segment + jpeg[pos:]
+
+
+def _exif_date(image_path: str, stream: Optional[BinaryIO]) -> Tuple[Optional[str], Optional[str]]:
+	found = _read_exif_datetime_bytes(image_path, stream)
+	if found and found[0]:
+		dt = _parse_exif_datetime_string(found[0])
+		if dt is not None:
+			return dt.strftime("%Y-%m-%d"), found[1]
+	return None, None
+
+
+def read_exif_date(stream: BinaryIO) -> Tuple[Optional[str], Optional[str]]:
+	"""(YYYY-MM-DD, EXIF tag name) from an open or in-memory image; (None, None) without an EXIF date.
+
+	Unlike resolve_photo_date this never falls back to a file's mtime, so it
+	works on buffers that have no file behind them.
+	"""
+	return _exif_date("", stream)
+
+
+def resolve_photo_date(
+	image_path: str,
+	stream: Optional[BinaryIO] = None,
+	st: Optional[os.stat_result] = None,
+) -> Tuple[Optional[str], Optional[str]]:
+	"""Resolve (YYYY-MM-DD, source) regardless of policy.
+
+	source is the EXIF tag name the date came from, SOURCE_MTIME when only the
+	file modification time is available, or None when neither can be read.
+	st, when the caller already holds it, spares the stat for the mtime fallback.
+	"""
+	# 1) Try EXIF
+	date_str, source = _exif_date(image_path, stream)
+	if date_str is not None:
+		return date_str, source
+
+	# 2) Fallback to mtime
+	try:
+		mtime = st.st_mtime if st is not None else os.path.getmtime(image_path)
+		local_dt = datetime.fromtimestamp(mtime)
+		return local_dt.strftime("%Y-%m-%d"), SOURCE_MTIME
+	except Exception:
+		return None, None
+
+
+def apply_date_policy(date_str: Optional[str], source: Optional[str], fallback_mtime: bool = True, exif_only: bool = False) -> Optional[str]:
+	"""Drop an mtime-derived date when the caller only accepts EXIF dates."""
+	if date_str is None:
+		return None
+	if source == SOURCE_MTIME and (exif_only or not fallback_mtime):
+		return None
+	return date_str
+
 
+def extract_photo_date_string(
+	image_path: str,
+	fallback_mtime: bool = True,
+	exif_only: bool = False,
+	stream: Optional[BinaryIO] = None,
+	cache=None,
+	st: Optional[os.stat_result] = None,
+) -> Optional[str]:
+	"""Extract shooting date as YYYY-MM-DD string.
 
+	Returns None when no date can be determined AND exif_only is True.
+	When exif_only is False, falls back to file mtime if fallback_mtime is True.
+	When stream is given (an already opened/mapped copy of image_path), EXIF is
+	read from it instead of reopening the file. A DateCache may be passed to
+	answer unchanged files without opening them; st is the file's stat result
+	if the caller already has it (e.g. from a directory scan).
+	"""
+	if cache is not None:
+		date_str, source = cache.resolve(image_path, stream, st)
+	else:
+		date_str, source = resolve_photo_date(image_path, stream, st)
+	return apply_date_policy(date_str, source, fallback_mtime, exif_only)
@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+from typing import Set
+
+# Kept free of imports so the GUI and the CLI parser can share it cheaply
+
+SUPPORTED_EXTENSIONS: Set[str] = {
+	".jpg",
+	".jpeg",
+	".png",
+	".bmp",
+	".tif",
+	".tiff",
+	".heic",
+	".heif",
+}
+
+TIFF_EXTENSIONS: Set[str] = {".tif", ".tiff"}
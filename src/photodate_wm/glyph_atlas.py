@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import functools
+from typing import Dict, List, Tuple
+
+from PIL import Image, ImageChops, ImageDraw, ImageFont
+
+
+DATE_CHARS = "0123456789-"
+
+_Mask = Tuple[Image.Image, Tuple[int, int]]
+
+
+class GlyphAtlas:
+	"""Date glyphs rasterized once for one font and stroke width.
+
+	Stamps are assembled by placing the cached glyph masks at the pen positions
+	FreeType would use (advance plus pair kerning) and merging overlaps the way
+	Pillow's text renderer does, so the result matches ImageDraw.text.
+	"""
+
+	def __init__(self, font: ImageFont.FreeTypeFont, stroke_width: int = 0, chars: str = DATE_CHARS):
+		self.font = font
+		self.stroke_width = stroke_width
+		self.chars = chars
+		self.advances: Dict[str, float] = {c: font.getlength(c) for c in chars}
+		self.kerning: Dict[Tuple[str, str], float] = {
+			(a, b): font.getlength(a + b) - self.advances[a] - self.advances[b]
+			for a in chars
+			for b in chars
+		}
+		# Sub-pixel metrics would need per-position rasterization; leave those to FreeType
+		self.integral = all(float(v).is_integer() for v in list(self.advances.values()) + list(self.kerning.values()))
+		self._bboxes: Dict[str, Tuple[int, int, int, int]] = {}
+		self._fill: Dict[str, _Mask] = {}
+		self._stroke: Dict[str, _Mask] = {}
+		for c in chars:
+			self._bboxes[c] = self._measure(c, stroke_width)
+			self._fill[c] = self._rasterize(c, 0)
+			if stroke_width > 0:
+				self._stroke[c] = self._rasterize(c, stroke_width)
+
+	def _measure(self, c: str, stroke_width: int) -> Tuple[int, int, int, int]:
+		draw = ImageDraw.Draw(Image.new("L", (1, 1)))
+		return tuple(int(v) for v in draw.textbbox((0, 0), c, font=self.font, stroke_width=stroke_width))
+
+	def _rasterize(self, c: str, stroke_width: int) -> _Mask:
+		# Drawing with ink 255 on black yields the coverage mask itself
+		x0, y0, x1, y1 = self._measure(c, stroke_width)
+		mask = Image.new("L", (max(1, x1 - x0), max(1, y1 - y0)), 0)
+		ImageDraw.Draw(mask).text((-x0, -y0), c, font=self.font, fill=255, stroke_width=stroke_width, stroke_fill=255)
+		return mask, (x0, y0)
+
+	def supports(self, text: str) -> bool:
+		return self.integral and bool(text) and all(c in self._fill for c in text)
+
+	def _pen_positions(self, text: str) -> List[int]:
+		positions = [0]
+		pen = 0.0
+		for prev, cur in zip(text, text[1:]):
+			pen += self.advances[prev] + self.kerning[(prev, cur)]
+			positions.append(int(pen))
+		return positions
+
+	def textbbox(self, text: str) -> Tuple[int, int, int, int]:
+		boxes = [
+			(x + b[0], b[1], x + b[2], b[3])
+			for x, b in zip(self._pen_positions(text), (self._bboxes[c] for c in text))
+		]
+		return (
+			min(b[0] for b in boxes),
+			min(b[1] for b in boxes),
+			max(b[2] for b in boxes),
+			max(b[3] for b in boxes),
+		)
+
+	def mask(self, text: str, stroked: bool = False) -> _Mask:
+		glyphs = self._stroke if stroked else self._fill
+		placed = [(glyphs[c][0], (x + glyphs[c][1][0], glyphs[c][1][1])) for x, c in zip(self._pen_positions(text), text)]
+		x0 = min(off[0] for _, off in placed)
+		y0 = min(off[1] for _, off in placed)
+		x1 = max(off[0] + m.width for m, off in placed)
+		y1 = max(off[1] + m.height for m, off in placed)
+		out = Image.new("L", (x1 - x0, y1 - y0), 0)
+		for m, off in placed:
+			box = (off[0] - x0, off[1] - y0, off[0] - x0 + m.width, off[1] - y0 + m.height)
+			# Overlapping coverage accumulates as 255 - (255 - a) * (255 - b) / 255
+			out.paste(ImageChops.screen(out.crop(box), m), box[:2])
+		return out, (x0, y0)
+
+	def draw(
+		self,
+		draw: ImageDraw.ImageDraw,
+		xy: Tuple[int, int],
+		text: str,
+		fill: Tuple[int, int, int, int],
+		stroke_fill: Tuple[int, int, int, int] | None = None,
+	) -> None:
+		"""Equivalent of draw.text(xy, text, fill, font, stroke_width, stroke_fill)."""
+		passes = []
+		if self.stroke_width > 0:
+			stroke_fill = fill if stroke_fill is None else stroke_fill
+			passes.append((True, stroke_fill))
+			if fill != stroke_fill:
+				passes.append((False, fill))
+		else:
+			passes.append((False, fill))
+		for stroked, ink in passes:
+			m, off = self.mask(text, stroked)
+			draw.bitmap((xy[0] + off[0], xy[1] + off[1]), m, fill=ink)
+
+
+@functools.lru_cache(maxsize=16)
+def get_glyph_atlas(font: ImageFont.FreeTypeFont, stroke_width: int = 0) -> GlyphAtlas:
+	return GlyphAtlas(font, stroke_width)
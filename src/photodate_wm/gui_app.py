@@ -6,24 +6,21 @@ import json
 import threading
 import json
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional
 
-from PIL import Image, ImageTk
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox, simpledialog
 
-try:
-	# optional drag & drop support
-	from tkinterdnd2 import DND_FILES, TkinterDnD
-	import tkinter as tk
-	from tkinter import ttk, filedialog, messagebox, simpledialog
-	except_import = None
-except Exception as e:
-	except_import = e
-	import tkinter as tk
-	from tkinter import ttk, filedialog, messagebox, simpledialog
+from .extensions import SUPPORTED_EXTENSIONS
 
-from .cli import SUPPORTED_EXTENSIONS
-from .exif_utils import extract_photo_date_string
-from .render import draw_text_watermark, draw_image_watermark
+if TYPE_CHECKING:
+	from PIL import Image, ImageTk
+
+	from .render import PreparedWatermark
+
+# Pillow and the renderer load with the first thumbnail, preview or export,
+# and the optional drag & drop package when the window is built, so importing
+# this module stays cheap.
 
 
 SUPPORTED_INPUT_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff"}
@@ -73,6 +70,8 @@ class App:
 		self.image_wm_scale_var = tk.IntVar(value=20)
 		self.exif_only_var = tk.BooleanVar(value=False)
 		self.fallback_mtime_var = tk.BooleanVar(value=True)
+		# (abs path, mtime) -> decoded image watermark shared by preview and export
+		self._prepared_wm: Optional[tuple] = None
 
 		self._build_ui()
 		self._setup_dnd()
@@ -319,9 +318,10 @@ class App:
 			v.trace_add("write", lambda *_: self.update_preview())
 
 	def _setup_dnd(self):
-		# optional drag & drop listbox
-		if 'TkinterDnD' in globals() and isinstance(self.root, TkinterDnD.Tk):
-			self.listbox.drop_target_register(DND_FILES)
+		# optional drag & drop listbox; run() loaded tkinterdnd2 if it is available
+		tkdnd = sys.modules.get("tkinterdnd2")
+		if tkdnd is not None and isinstance(self.root, tkdnd.TkinterDnD.Tk):
+			self.listbox.drop_target_register(tkdnd.DND_FILES)
 			self.listbox.dnd_bind('<<Drop>>', self._on_drop)
 
 	def _on_drop(self, event):
@@ -373,6 +373,8 @@ class App:
 			messagebox.showinfo("提示", "未添加任何受支持的图片文件。")
 
 	def _make_thumb(self, path: str) -> ImageTk.PhotoImage:
+		from PIL import Image, ImageTk
+
 		with Image.open(path) as im:
 			im.thumbnail((160, 160))
 			return ImageTk.PhotoImage(im.copy())
@@ -381,6 +383,8 @@ class App:
 		# Load the currently selected image or first item
 		if not self.items:
 			return None
+		from PIL import Image
+
 		idxs = self.listbox.curselection()
 		path = self.items[idxs[0]].path if idxs else self.items[0].path
 		try:
@@ -397,6 +401,10 @@ class App:
 		if im is None:
 			self.preview_canvas.delete("all")
 			return
+		from PIL import Image, ImageTk
+
+		from .render import draw_image_watermark, draw_text_watermark
+
 		# Fit preview to canvas width while keeping aspect ratio
 		cw = max(1, self.preview_canvas.winfo_width())
 		ch = max(1, self.preview_canvas.winfo_height())
@@ -460,23 +468,33 @@ class App:
 			img_path = (self.image_wm_path_var.get() or "").strip()
 			if os.path.isfile(img_path):
 				try:
-					with Image.open(img_path) as wm:
-						im_marked = draw_image_watermark(
-							im_preview,
-							wm,
-							scale_percent=int(self.image_wm_scale_var.get()),
-							opacity=float(self.opacity_var.get()),
-							position=position,
-							margin_x=margin_x,
-							margin_y=margin_y,
-							rotation_deg=rotation,
-							override_xy=manual_xy if position == "manual" else None,
-						)
-						self.preview_img_tk = ImageTk.PhotoImage(im_marked)
-						self.preview_canvas.create_image(xo, yo, anchor="nw", image=self.preview_img_tk)
+					im_marked = draw_image_watermark(
+						im_preview,
+						self._get_prepared_watermark(img_path),
+						scale_percent=int(self.image_wm_scale_var.get()),
+						opacity=float(self.opacity_var.get()),
+						position=position,
+						margin_x=margin_x,
+						margin_y=margin_y,
+						rotation_deg=rotation,
+						override_xy=manual_xy if position == "manual" else None,
+					)
+					self.preview_img_tk = ImageTk.PhotoImage(im_marked)
+					self.preview_canvas.create_image(xo, yo, anchor="nw", image=self.preview_img_tk)
 				except Exception:
 					pass
 
+	def _get_prepared_watermark(self, path: str) -> PreparedWatermark:
+		from .render import PreparedWatermark
+
+		# Preview redraws on every drag; keep the decoded logo until the file changes
+		key = (os.path.abspath(path), os.path.getmtime(path))
+		cached = self._prepared_wm
+		if cached is None or cached[0] != key:
+			cached = (key, PreparedWatermark.open(path))
+			self._prepared_wm = cached
+		return cached[1]
+
 	def _canvas_to_image_coords(self, x: int, y: int) -> tuple[int, int]:
 		xo, yo = self.preview_origin
 		return max(0, x - xo), max(0, y - yo)
@@ -792,6 +810,8 @@ class App:
 		self.root.destroy()
 
 	def _resize_image(self, im: Image.Image) -> Image.Image:
+		from PIL import Image
+
 		mode = self.resize_mode_var.get()
 		val = max(1, int(self.resize_value_var.get() or 1))
 		if mode == "none":
@@ -849,6 +869,12 @@ class App:
 		self._set_running_state(True, total=len(items_to_process))
 
 		def _worker():
+			from PIL import Image
+
+			from .date_cache import open_date_cache
+			from .exif_utils import extract_photo_date_string
+			from .render import PreparedWatermark, draw_image_watermark, draw_text_watermark
+
 			fmt = self.format_var.get()
 			prefix = self.prefix_var.get()
 			suffix = self.suffix_var.get()
@@ -856,6 +882,9 @@ class App:
 
 			os.makedirs(out_dir, exist_ok=True)
 			success, skipped, failed, cancelled = 0, 0, 0, 0
+			prepared_wm: Optional[PreparedWatermark] = None
+			# unchanged files reuse the date resolved by earlier exports / CLI runs
+			date_cache = open_date_cache() if self.wm_type_var.get() == "date" else None
 			for it in items_to_process:
 				if self._cancel:
 					cancelled += 1
@@ -865,7 +894,7 @@ class App:
 						im2 = self._resize_image(im)
 						wm_type = self.wm_type_var.get()
 						if wm_type == "date":
-							date_str = extract_photo_date_string(it.path, fallback_mtime=self.fallback_mtime_var.get(), exif_only=self.exif_only_var.get())
+							date_str = extract_photo_date_string(it.path, fallback_mtime=self.fallback_mtime_var.get(), exif_only=self.exif_only_var.get(), cache=date_cache)
 							if not date_str:
 								skipped += 1
 								self._inc_progress()
@@ -902,16 +931,18 @@ class App:
 								shadow_opacity=float(self.shadow_opacity_var.get()),
 							)
 						else:
-							with Image.open(img_path) as wm:
-								out_im = draw_image_watermark(
-									im2,
-									wm,
-									scale_percent=int(self.image_wm_scale_var.get()),
-									opacity=float(self.opacity_var.get()),
-									position=self.position_var.get(),
-									margin_x=int(self.margin_x_var.get()),
-									margin_y=int(self.margin_y_var.get()),
-								)
+							if prepared_wm is None:
+								# logo is decoded once per batch; scaled variants are cached on it
+								prepared_wm = PreparedWatermark.open(img_path)
+							out_im = draw_image_watermark(
+								im2,
+								prepared_wm,
+								scale_percent=int(self.image_wm_scale_var.get()),
+								opacity=float(self.opacity_var.get()),
+								position=self.position_var.get(),
+								margin_x=int(self.margin_x_var.get()),
+								margin_y=int(self.margin_y_var.get()),
+							)
 						stem = os.path.splitext(os.path.basename(it.path))[0]
 						out_name = f"{prefix}{stem}{suffix}"
 						ext = ".jpg" if fmt == "JPEG" else ".png"
@@ -927,6 +958,8 @@ class App:
 					print(f"Error: {it.path}: {e}", file=sys.stderr)
 				finally:
 					self._inc_progress()
+			if date_cache is not None:
+				date_cache.close()
 
 			def _done():
 				self._set_running_state(False)
@@ -938,9 +971,10 @@ class App:
 
 def run():
 	# Try to use TkinterDnD when available
-	if except_import is None and 'TkinterDnD' in globals():
+	try:
+		from tkinterdnd2 import TkinterDnD
 		root = TkinterDnD.Tk()
-	else:
+	except Exception:
 		root = tk.Tk()
 	App(root)
 	root.mainloop()
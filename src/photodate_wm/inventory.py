@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import collections
+import contextlib
+import csv
+import json
+import os
+from typing import Counter, Dict, Iterable, Iterator, List, Optional, TextIO
+
+from .exif_utils import apply_date_policy, resolve_photo_date
+
+
+INVENTORY_FORMATS = ("jsonl", "csv")
+INVENTORY_FIELDS = ("path", "date", "date_source", "width", "height", "size")
+
+DEFAULT_SCAN_THREADS = 16
+
+NO_DATE = "no date"
+
+
+def scan_file(
+	path: str,
+	fallback_mtime: bool = True,
+	exif_only: bool = False,
+	cache=None,
+	st: Optional[os.stat_result] = None,
+) -> Dict[str, object]:
+	"""Inventory record for one file; only headers are read, through a single open handle.
+
+	st, when the caller already holds it, supplies the size and mtime.
+	"""
+	from PIL import Image
+
+	width = height = None
+	with contextlib.ExitStack() as stack:
+		try:
+			fh = stack.enter_context(open(path, "rb"))
+		except OSError:
+			fh = None
+		if st is None and fh is not None:
+			st = os.fstat(fh.fileno())
+		if cache is not None:
+			date_str, source = cache.resolve(path, fh, st)
+		else:
+			date_str, source = resolve_photo_date(path, fh, st)
+		if fh is not None:
+			try:
+				fh.seek(0)
+				# Image.open parses the header only; pixel data is never decoded here
+				with Image.open(fh) as im:
+					width, height = im.size
+			except Exception:
+				pass
+	date_str = apply_date_policy(date_str, source, fallback_mtime, exif_only)
+	return {
+		"path": path,
+		"date": date_str,
+		"date_source": source if date_str else None,
+		"width": width,
+		"height": height,
+		"size": st.st_size if st is not None else None,
+	}
+
+
+def _scan_item(item, scan_kwargs: Dict[str, object]) -> Dict[str, object]:
+	if isinstance(item, str):
+		return scan_file(item, **scan_kwargs)
+	# A listed candidate: its stat is taken here, on the worker thread
+	return scan_file(item.path, st=item.stat, **scan_kwargs)
+
+
+def iter_inventory(files: Iterable, threads: int = DEFAULT_SCAN_THREADS, **scan_kwargs) -> Iterator[Dict[str, object]]:
+	"""Scan files on a thread pool, yielding records in input order.
+
+	files holds paths, or candidates with .path and .stat as listed by the
+	CLI. At most a few batches per thread are in flight, so memory stays flat
+	no matter how many files are listed.
+	"""
+	from concurrent.futures import ThreadPoolExecutor
+
+	threads = max(1, threads)
+	window = threads * 4
+	with ThreadPoolExecutor(max_workers=threads) as pool:
+		pending: collections.deque = collections.deque()
+		for path in files:
+			pending.append(pool.submit(_scan_item, path, scan_kwargs))
+			if len(pending) >= window:
+				yield pending.popleft().result()
+		while pending:
+			yield pending.popleft().result()
+
+
+def write_inventory(records: Iterable[Dict[str, object]], out: TextIO, fmt: str = "jsonl") -> Counter[str]:
+	"""Stream records to out and return a histogram of files per date."""
+	histogram: Counter[str] = collections.Counter()
+	writer: Optional[csv.DictWriter] = None
+	if fmt == "csv":
+		writer = csv.DictWriter(out, fieldnames=INVENTORY_FIELDS, lineterminator="\n")
+		writer.writeheader()
+	for record in records:
+		if writer is not None:
+			writer.writerow({k: "" if v is None else v for k, v in record.items()})
+		else:
+			out.write(json.dumps(record, ensure_ascii=False) + "\n")
+		histogram[record["date"] or NO_DATE] += 1
+	out.flush()
+	return histogram
+
+
+def format_histogram(histogram: Counter[str]) -> List[str]:
+	lines = [f"{date}\t{histogram[date]}" for date in sorted(k for k in histogram if k != NO_DATE)]
+	if histogram.get(NO_DATE):
+		lines.append(f"{NO_DATE}\t{histogram[NO_DATE]}")
+	lines.append(f"total\t{sum(histogram.values())}")
+	return lines
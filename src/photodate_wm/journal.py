@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import json
+import os
+from typing import Dict, Optional
+
+JOURNAL_NAME = ".photodate_wm_journal.jsonl"
+
+FAILED = "failed"
+
+
+class JournalMismatch(Exception):
+	"""The journal was written with different render settings than this run."""
+
+
+class Journal:
+	"""Append-only record of every input a batch has finished, one JSON object per line.
+
+	The first line holds the settings hash of the run. Each line is synced to
+	disk as soon as the input is done, so a killed run leaves at most one torn
+	line, which is ignored when the journal is read back for --resume.
+	"""
+
+	def __init__(self, root_output: str, settings: str, resume: bool = False):
+		os.makedirs(root_output, exist_ok=True)
+		self.path = os.path.join(root_output, JOURNAL_NAME)
+		# Last recorded status per input; failures are retried on resume
+		self.completed: Dict[str, str] = {}
+		if resume and os.path.exists(self.path):
+			self._load(settings)
+			self._fh = open(self.path, "a", encoding="utf-8")
+			if self._fh.tell() > 0 and not self._ends_with_newline():
+				# Terminate a line torn by the crash so the next entry starts cleanly
+				self._fh.write("\n")
+		else:
+			self._fh = open(self.path, "w", encoding="utf-8")
+			self._append({"settings": settings})
+
+	def __enter__(self) -> "Journal":
+		return self
+
+	def __exit__(self, *exc) -> None:
+		self.close()
+
+	def _load(self, settings: str) -> None:
+		with open(self.path, "r", encoding="utf-8") as fh:
+			for line in fh:
+				try:
+					entry = json.loads(line)
+				except ValueError:
+					continue
+				if "settings" in entry:
+					if entry["settings"] != settings:
+						raise JournalMismatch(f"{self.path} was written with different render settings")
+					continue
+				if entry.get("status") == FAILED:
+					self.completed.pop(entry["path"], None)
+				else:
+					self.completed[entry["path"]] = entry["status"]
+
+	def _ends_with_newline(self) -> bool:
+		with open(self.path, "rb") as fh:
+			fh.seek(-1, os.SEEK_END)
+			return fh.read(1) == b"\n"
+
+	def _append(self, entry: dict) -> None:
+		self._fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+		self._fh.flush()
+		os.fsync(self._fh.fileno())
+
+	def record(self, path: str, status: str, error: Optional[str] = None) -> None:
+		entry = {"path": path, "status": status}
+		if error is not None:
+			entry["error"] = error
+		self._append(entry)
+
+	def close(self) -> None:
+		if not self._fh.closed:
+			self._fh.close()
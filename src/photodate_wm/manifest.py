@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Optional
+
+MANIFEST_NAME = ".photodate_wm_manifest.sqlite3"
+
+_COMMIT_EVERY = 256
+_HASH_CHUNK = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outputs (
+	out_path TEXT PRIMARY KEY,
+	in_path TEXT NOT NULL,
+	size INTEGER NOT NULL,
+	mtime_ns INTEGER NOT NULL,
+	content_hash TEXT,
+	settings_hash TEXT NOT NULL
+)
+"""
+
+
+def settings_hash(settings: dict) -> str:
+	"""Stable digest of everything that influences the rendered output."""
+	blob = json.dumps(settings, sort_keys=True, default=str).encode("utf-8")
+	return hashlib.sha256(blob).hexdigest()
+
+
+def file_hash(path: str) -> str:
+	h = hashlib.sha256()
+	with open(path, "rb") as f:
+		for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+			h.update(chunk)
+	return h.hexdigest()
+
+
+class Manifest:
+	"""Per-output record of the input fingerprint and render settings it was made from.
+
+	Lives in the output root. With content hashing enabled, an input whose
+	size/mtime changed but whose bytes did not (touched, copied) still counts
+	as up to date. Safe to share between threads.
+	"""
+
+	def __init__(self, root_output: str, use_content_hash: bool = False):
+		os.makedirs(root_output, exist_ok=True)
+		self.root_output = root_output
+		self.use_content_hash = use_content_hash
+		self._conn = sqlite3.connect(os.path.join(root_output, MANIFEST_NAME), check_same_thread=False)
+		self._conn.execute(_SCHEMA)
+		self._conn.commit()
+		self._lock = threading.Lock()
+		self._pending = 0
+
+	def __enter__(self) -> "Manifest":
+		return self
+
+	def __exit__(self, *exc) -> None:
+		self.close()
+
+	def _key(self, out_path: str) -> str:
+		return os.path.relpath(out_path, self.root_output)
+
+	def is_recorded(self, out_path: str) -> bool:
+		with self._lock:
+			row = self._conn.execute("SELECT 1 FROM outputs WHERE out_path = ?", (self._key(out_path),)).fetchone()
+		return row is not None
+
+	def is_current(self, in_path: str, out_path: str, settings: str, st: Optional[os.stat_result] = None) -> bool:
+		"""True when out_path exists and was rendered from this input with these settings."""
+		with self._lock:
+			row = self._conn.execute(
+				"SELECT in_path, size, mtime_ns, content_hash, settings_hash FROM outputs WHERE out_path = ?",
+				(self._key(out_path),),
+			).fetchone()
+		if row is None or row[0] != in_path or row[4] != settings or not os.path.exists(out_path):
+			return False
+		if st is None:
+			try:
+				st = os.stat(in_path)
+			except OSError:
+				return False
+		if (st.st_size, st.st_mtime_ns) == (row[1], row[2]):
+			return True
+		if not (self.use_content_hash and row[3] and st.st_size == row[1]):
+			return False
+		if file_hash(in_path) != row[3]:
+			return False
+		# Same bytes under a new mtime: refresh the fingerprint so the next run is stat-only again
+		self._write(out_path, in_path, st.st_size, st.st_mtime_ns, row[3], settings)
+		return True
+
+	def record(self, in_path: str, out_path: str, settings: str) -> None:
+		try:
+			st = os.stat(in_path)
+			digest = file_hash(in_path) if self.use_content_hash else None
+		except OSError:
+			return
+		self._write(out_path, in_path, st.st_size, st.st_mtime_ns, digest, settings)
+
+	def _write(self, out_path: str, in_path: str, size: int, mtime_ns: int, digest: Optional[str], settings: str) -> None:
+		with self._lock:
+			self._conn.execute(
+				"INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?, ?)",
+				(self._key(out_path), in_path, size, mtime_ns, digest, settings),
+			)
+			self._pending += 1
+			if self._pending >= _COMMIT_EVERY:
+				self._conn.commit()
+				self._pending = 0
+
+	def close(self) -> None:
+		with self._lock:
+			self._conn.commit()
+			self._conn.close()
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import queue
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+
+DEFAULT_QUEUE_SIZE = 8
+
+_STOP = object()
+
+
+class Stage(NamedTuple):
+	name: str
+	fn: Callable[[object], object]
+	threads: int = 1
+
+
+class Finished(NamedTuple):
+	"""Returned by a stage to skip the remaining stages with this value."""
+
+	value: object
+
+
+class _Cancelled(Exception):
+	pass
+
+
+def run_pipeline(
+	items: Iterable[object],
+	stages: Sequence[Stage],
+	queue_size: int = DEFAULT_QUEUE_SIZE,
+) -> Iterator[Tuple[object, object, Optional[BaseException]]]:
+	"""Push items through thread-pool stages linked by bounded queues.
+
+	Each stage's function receives the previous stage's return value (the
+	item itself for the first stage). Yields (item, result, error) in input
+	order; an exception in any stage becomes that item's error and skips the
+	remaining stages. Full queues block the stage in front of them, and the
+	number of items in flight (including those waiting to be yielded in
+	order) is capped, so memory stays bounded however slow one stage is.
+	Closing the generator early cancels queued items and lets running ones
+	finish.
+	"""
+	queue_size = max(1, queue_size)
+	queues: List[queue.Queue] = [queue.Queue(maxsize=queue_size) for _ in stages]
+	results: queue.Queue = queue.Queue()
+	stop = threading.Event()
+	in_flight = threading.Semaphore(queue_size * len(stages) + sum(max(1, s.threads) for s in stages))
+	remaining = [max(1, s.threads) for s in stages]
+	remaining_lock = threading.Lock()
+	feed_error: List[BaseException] = []
+
+	def _worker(index: int) -> None:
+		stage = stages[index]
+		while True:
+			entry = queues[index].get()
+			if entry is _STOP:
+				break
+			seq, item, value = entry
+			try:
+				if stop.is_set():
+					raise _Cancelled()
+				value = stage.fn(value)
+			except BaseException as exc:
+				results.put((seq, item, None, exc))
+				continue
+			if isinstance(value, Finished) or index == len(stages) - 1:
+				results.put((seq, item, value.value if isinstance(value, Finished) else value, None))
+			else:
+				queues[index + 1].put((seq, item, value))
+		with remaining_lock:
+			remaining[index] -= 1
+			last = remaining[index] == 0
+		# The last worker of a stage closes the next one once everything upstream is drained
+		if last:
+			if index + 1 < len(stages):
+				for _ in range(remaining[index + 1]):
+					queues[index + 1].put(_STOP)
+			else:
+				results.put(_STOP)
+
+	def _feed() -> None:
+		try:
+			for seq, item in enumerate(items):
+				while not in_flight.acquire(timeout=0.1):
+					if stop.is_set():
+						return
+				if stop.is_set():
+					return
+				queues[0].put((seq, item, item))
+		except BaseException as exc:
+			feed_error.append(exc)
+		finally:
+			for _ in range(remaining[0]):
+				queues[0].put(_STOP)
+
+	threads = [threading.Thread(target=_feed, name="pipeline-feed", daemon=True)]
+	for index, stage in enumerate(stages):
+		for n in range(max(1, stage.threads)):
+			threads.append(threading.Thread(target=_worker, args=(index,), name=f"pipeline-{stage.name}-{n}", daemon=True))
+	for t in threads:
+		t.start()
+
+	pending: Dict[int, Tuple[object, object, Optional[BaseException]]] = {}
+	next_seq = 0
+	try:
+		while True:
+			entry = results.get()
+			if entry is _STOP:
+				break
+			seq, item, value, error = entry
+			pending[seq] = (item, value, error)
+			while next_seq in pending:
+				out = pending.pop(next_seq)
+				next_seq += 1
+				in_flight.release()
+				yield out
+		if feed_error:
+			raise feed_error[0]
+	finally:
+		stop.set()
+		# Unblock the feeder, then let workers drain (cancelled items skip their stage function)
+		for _ in range(len(pending) + 1):
+			in_flight.release()
+		for t in threads:
+			while t.is_alive():
+				t.join(timeout=0.1)
+				# Keep consuming so no worker stays blocked on a full queue
+				try:
+					while True:
+						results.get_nowait()
+				except queue.Empty:
+					pass
@@ -1,23 +1,59 @@
 from __future__ import annotations
 
+import functools
 import os
-from typing import Tuple, Optional
+import threading
+from collections import OrderedDict
+from typing import Hashable, List, Optional, Sequence, Tuple
 
 from PIL import Image, ImageColor, ImageDraw, ImageFont
 
 
-def _load_font(font_path: str | None, font_size: int) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
-	if font_path:
-		try:
-			return ImageFont.truetype(font_path, font_size)
-		except Exception:
-			pass
-	# Try common default
-	for candidate in ["arial.ttf", "Arial.ttf", "DejaVuSans.ttf"]:
+FONT_CACHE_SIZE = 64
+_DEFAULT_FONT_CANDIDATES = ("arial.ttf", "Arial.ttf", "DejaVuSans.ttf")
+
+
+@functools.lru_cache(maxsize=FONT_CACHE_SIZE)
+def _cached_truetype(font_path: str, font_size: int) -> ImageFont.FreeTypeFont | None:
+	# Failures are cached as None so a bad path does not re-walk the font dirs
+	try:
+		return ImageFont.truetype(font_path, font_size)
+	except Exception:
+		return None
+
+
+@functools.lru_cache(maxsize=None)
+def _default_font_path() -> str | None:
+	# Resolved once per process; Pillow reports the full path it found
+	for candidate in _DEFAULT_FONT_CANDIDATES:
 		try:
-			return ImageFont.truetype(candidate, font_size)
+			return ImageFont.truetype(candidate, 12).path
 		except Exception:
 			continue
+	return None
+
+
+def font_cache_info() -> functools._CacheInfo:
+	"""Return hit/miss counters of the process-level font cache."""
+	return _cached_truetype.cache_info()
+
+
+def clear_font_cache() -> None:
+	_cached_truetype.cache_clear()
+	_default_font_path.cache_clear()
+
+
+def _load_font(font_path: str | None, font_size: int) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
+	if font_path:
+		font = _cached_truetype(font_path, font_size)
+		if font is not None:
+			return font
+	# Try common default
+	default_path = _default_font_path()
+	if default_path:
+		font = _cached_truetype(default_path, font_size)
+		if font is not None:
+			return font
 	return ImageFont.load_default()
 
 
@@ -53,8 +89,301 @@ def _compute_anchor_xy(img_w: int, img_h: int, text_w: int, text_h: int, positio
 	return max(0, x), max(0, y)
 
 
-def draw_text_watermark(
+def _layer_box(img_w: int, img_h: int, layer: Image.Image, xy: Tuple[int, int]) -> Tuple[int, int, int, int] | None:
+	# Intersection of the placed layer with the image, or None when it misses entirely
+	x0, y0 = max(0, xy[0]), max(0, xy[1])
+	x1, y1 = min(img_w, xy[0] + layer.width), min(img_h, xy[1] + layer.height)
+	if x0 >= x1 or y0 >= y1:
+		return None
+	return x0, y0, x1, y1
+
+
+def _region_overlay(layer: Image.Image, xy: Tuple[int, int], box: Tuple[int, int, int, int]) -> Image.Image:
+	overlay = Image.new("RGBA", (box[2] - box[0], box[3] - box[1]), (0, 0, 0, 0))
+	overlay.paste(layer, (xy[0] - box[0], xy[1] - box[1]), layer)
+	return overlay
+
+
+# Modes that can be blended region-wise and written back without promotion
+NATIVE_MODES = ("RGB", "RGBA", "L", "LA", "CMYK", "P")
+
+
+def _output_mode(image: Image.Image, keep_mode: bool) -> str:
+	if keep_mode and image.mode in NATIVE_MODES:
+		return image.mode
+	return "RGBA" if image.mode == "RGBA" else "RGB"
+
+
+def _has_alpha(image: Image.Image) -> bool:
+	return image.mode in ("RGBA", "RGBa", "LA", "La", "PA") or "transparency" in image.info
+
+
+def _working_copy(image: Image.Image, keep_mode: bool) -> Tuple[Image.Image, str]:
+	"""(copy the layer is blended into, mode of the final output)."""
+	mode = _output_mode(image, keep_mode)
+	if mode == "RGB" and _has_alpha(image):
+		# Blend against the source alpha as a full-frame RGBA composite does; it is dropped afterwards
+		return image.convert("RGBA"), mode
+	return image.convert(mode), mode
+
+
+def _region_to_mode(region: Image.Image, out: Image.Image) -> Image.Image:
+	if out.mode == "P":
+		# Map blended pixels back onto the image's own palette
+		return region.convert("RGB").quantize(palette=out, dither=Image.Dither.NONE)
+	return region.convert(out.mode)
+
+
+# Layer alpha -> paste mask: any coverage takes the blended pixel, none keeps the source one
+_COVERED_LUT = [0] + [255] * 255
+
+
+def _paste_region(out: Image.Image, region: Image.Image, overlay: Image.Image, box: Tuple[int, int, int, int]) -> None:
+	"""Write a blended RGBA region back into out at box."""
+	converted = _region_to_mode(region, out)
+	if out.mode in ("RGB", "RGBA"):
+		out.paste(converted, box[:2])
+		return
+	# The trip through RGBA is lossy for CMYK and palettes, so only pixels the layer covers may change
+	out.paste(converted, box[:2], overlay.getchannel("A").point(_COVERED_LUT))
+
+
+def _composite_layer(
 	image: Image.Image,
+	layer: Image.Image,
+	xy: Tuple[int, int],
+	backend: str = "pillow",
+	keep_mode: bool = False,
+) -> Image.Image:
+	"""Alpha-composite an RGBA layer at xy, touching only the layer's bounding box.
+
+	Pixel-identical to compositing a full-frame overlay: the region is blended
+	in RGBA exactly as before and pasted back into a single output copy. With
+	keep_mode, L/LA/CMYK/P images stay in their own mode: the region is
+	blended in RGBA and only the pixels the layer covers are written back.
+	"""
+	if backend != "pillow":
+		return composite_layer_batch([image], layer, xy, backend=backend, keep_mode=keep_mode)[0]
+	out, mode = _working_copy(image, keep_mode)
+	box = _layer_box(out.width, out.height, layer, xy)
+	if box is not None:
+		overlay = _region_overlay(layer, xy, box)
+		region = Image.alpha_composite(out.crop(box).convert("RGBA"), overlay)
+		# Back to the working mode (RGB for formats like JPEG unless keep_mode)
+		_paste_region(out, region, overlay, box)
+	return out if out.mode == mode else out.convert(mode)
+
+
+COMPOSITE_BACKENDS = ("pillow", "numpy")
+
+
+def _require_numpy():
+	try:
+		import numpy
+	except ImportError as exc:
+		raise RuntimeError("The numpy compositing backend requires NumPy (pip install numpy)") from exc
+	return numpy
+
+
+def _blend_regions_numpy(regions, overlay):
+	"""Vectorized Image.alpha_composite of one overlay onto N same-size regions.
+
+	regions is (N, h, w, 4) uint8 and overlay (h, w, 4) uint8. The integer
+	arithmetic mirrors Pillow's AlphaComposite so results are bit-exact.
+	"""
+	np = _require_numpy()
+	dst = regions.astype(np.uint32)
+	src = overlay.astype(np.uint32)[np.newaxis]
+	src_a = src[..., 3:4]
+	outa255 = src_a * 255 + dst[..., 3:4] * (255 - src_a)
+	# 7 extra bits of precision, rounded divisions by 255 as in Pillow
+	coef1 = src_a * (255 * 255 << 7) // np.maximum(outa255, 1)
+	coef2 = (255 << 7) - coef1
+	tmp = src[..., :3] * coef1 + dst[..., :3] * coef2 + (0x80 << 7)
+	rgb = (((tmp >> 8) + tmp) >> 8) >> 7
+	alpha = outa255 + 0x80
+	alpha = ((alpha >> 8) + alpha) >> 8
+	blended = np.concatenate([rgb, alpha], axis=-1).astype(np.uint8)
+	# Fully transparent overlay pixels leave the destination untouched
+	return np.where(src_a == 0, regions, blended)
+
+
+def composite_layer_batch(
+	images: Sequence[Image.Image],
+	layer: Image.Image,
+	xy: Tuple[int, int],
+	backend: str = "numpy",
+	keep_mode: bool = False,
+) -> List[Image.Image]:
+	"""Composite one layer at the same position into a batch of same-size images.
+
+	The "numpy" backend blends every region in one vectorized pass; "pillow"
+	composites each image in turn. Both give identical pixels.
+	"""
+	if backend not in COMPOSITE_BACKENDS:
+		raise ValueError(f"Invalid compositing backend: {backend}")
+	if not images:
+		return []
+	size = images[0].size
+	if any(im.size != size for im in images):
+		raise ValueError("All images in a batch must have the same size")
+	if backend == "pillow":
+		return [_composite_layer(im, layer, xy, keep_mode=keep_mode) for im in images]
+
+	np = _require_numpy()
+	work = [_working_copy(im, keep_mode) for im in images]
+	outs = [out for out, _ in work]
+	box = _layer_box(size[0], size[1], layer, xy)
+	if box is not None:
+		overlay = _region_overlay(layer, xy, box)
+		regions = np.stack([np.asarray(out.crop(box).convert("RGBA")) for out in outs])
+		blended = _blend_regions_numpy(regions, np.asarray(overlay))
+		for out, region in zip(outs, blended):
+			_paste_region(out, Image.fromarray(region, "RGBA"), overlay, box)
+	return [out if out.mode == mode else out.convert(mode) for out, mode in work]
+
+
+STAMP_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+class StampCache:
+	"""LRU cache of pre-rendered watermark layers bounded by total pixel bytes.
+
+	Cached layers are shared between callers and must be treated as read-only.
+	"""
+
+	def __init__(self, max_bytes: int = STAMP_CACHE_MAX_BYTES):
+		self.max_bytes = max(0, int(max_bytes))
+		self.nbytes = 0
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self._items: OrderedDict[Hashable, Image.Image] = OrderedDict()
+		self._lock = threading.Lock()
+
+	def __len__(self) -> int:
+		return len(self._items)
+
+	def get(self, key: Hashable) -> Image.Image | None:
+		with self._lock:
+			layer = self._items.get(key)
+			if layer is None:
+				self.misses += 1
+				return None
+			self._items.move_to_end(key)
+			self.hits += 1
+			return layer
+
+	def put(self, key: Hashable, layer: Image.Image) -> None:
+		size = _layer_nbytes(layer)
+		with self._lock:
+			if size > self.max_bytes:
+				return
+			old = self._items.pop(key, None)
+			if old is not None:
+				self.nbytes -= _layer_nbytes(old)
+			self._items[key] = layer
+			self.nbytes += size
+			while self.nbytes > self.max_bytes:
+				_, evicted = self._items.popitem(last=False)
+				self.nbytes -= _layer_nbytes(evicted)
+				self.evictions += 1
+
+	def clear(self) -> None:
+		with self._lock:
+			self._items.clear()
+			self.nbytes = 0
+			self.hits = self.misses = self.evictions = 0
+
+	def info(self) -> dict:
+		with self._lock:
+			return {
+				"hits": self.hits,
+				"misses": self.misses,
+				"evictions": self.evictions,
+				"entries": len(self._items),
+				"nbytes": self.nbytes,
+				"max_bytes": self.max_bytes,
+			}
+
+
+def _layer_nbytes(layer: Image.Image) -> int:
+	return layer.width * layer.height * len(layer.getbands())
+
+
+_stamp_cache = StampCache()
+
+
+def stamp_cache_info() -> dict:
+	"""Return hit/miss/eviction counters and memory use of the stamp cache."""
+	return _stamp_cache.info()
+
+
+def clear_stamp_cache() -> None:
+	_stamp_cache.clear()
+
+
+def _render_text_stamp(
+	text: str,
+	font_path: str | None,
+	font_size: int,
+	fill: Tuple[int, int, int, int],
+	stroke_width: int,
+	stroke_fill: Tuple[int, int, int, int],
+	shadow_offset: Tuple[int, int],
+	shadow_fill: Tuple[int, int, int, int],
+	rotation_deg: int,
+	glyph_atlas: bool = False,
+) -> Image.Image:
+	font = _load_font(font_path, font_size)
+	atlas = None
+	if glyph_atlas and isinstance(font, ImageFont.FreeTypeFont):
+		from .glyph_atlas import get_glyph_atlas
+
+		atlas = get_glyph_atlas(font, stroke_width)
+		if not atlas.supports(text):
+			atlas = None
+
+	# Render text to its own layer so rotation is applied cleanly
+	if atlas is not None:
+		bbox = atlas.textbbox(text)
+	else:
+		measure_img = Image.new("RGBA", (1, 1))
+		measure_draw = ImageDraw.Draw(measure_img)
+		bbox = measure_draw.textbbox((0, 0), text, font=font, stroke_width=stroke_width)
+	text_w, text_h = bbox[2] - bbox[0], bbox[3] - bbox[1]
+	text_layer = Image.new("RGBA", (max(1, text_w + abs(shadow_offset[0]) + stroke_width * 2), max(1, text_h + abs(shadow_offset[1]) + stroke_width * 2)), (0, 0, 0, 0))
+	txt_draw = ImageDraw.Draw(text_layer)
+	if atlas is not None:
+		if shadow_offset != (0, 0):
+			atlas.draw(txt_draw, (max(0, shadow_offset[0]), max(0, shadow_offset[1])), text, shadow_fill, shadow_fill)
+		atlas.draw(txt_draw, (0, 0), text, fill, stroke_fill)
+	else:
+		# optional shadow on its own offset
+		if shadow_offset != (0, 0):
+			txt_draw.text((max(0, shadow_offset[0]), max(0, shadow_offset[1])), text, font=font, fill=shadow_fill, stroke_width=stroke_width, stroke_fill=shadow_fill)
+		# main text with optional stroke
+		if stroke_width > 0:
+			txt_draw.text((0, 0), text, font=font, fill=fill, stroke_width=stroke_width, stroke_fill=stroke_fill)
+		else:
+			txt_draw.text((0, 0), text, font=font, fill=fill)
+
+	if rotation_deg % 360 != 0:
+		text_layer = text_layer.rotate(rotation_deg, expand=True, resample=Image.BICUBIC)
+	return text_layer
+
+
+def _get_text_stamp(*style) -> Image.Image:
+	# style is the full argument tuple of _render_text_stamp and doubles as the key
+	layer = _stamp_cache.get(style)
+	if layer is None:
+		layer = _render_text_stamp(*style)
+		_stamp_cache.put(style, layer)
+	return layer
+
+
+def _place_text_stamp(
+	img_size: Tuple[int, int],
 	text: str,
 	font_size: int = 32,
 	color: str = "#FFFFFF",
@@ -63,7 +392,6 @@ def draw_text_watermark(
 	margin_x: int = 24,
 	margin_y: int = 24,
 	font_path: str | None = None,
-	# Optional styles
 	stroke_width: int = 0,
 	stroke_color: str = "#000000",
 	shadow_offset: Tuple[int, int] = (0, 0),
@@ -71,68 +399,98 @@ def draw_text_watermark(
 	shadow_opacity: float = 0.5,
 	rotation_deg: int = 0,
 	override_xy: Optional[Tuple[int, int]] = None,
-) -> Image.Image:
-	base_mode = image.mode
-	img_rgba = image.convert("RGBA")
-	overlay = Image.new("RGBA", img_rgba.size, (0, 0, 0, 0))
-	font = _load_font(font_path, font_size)
-
-	# Render text to its own layer so rotation is applied cleanly
-	measure_img = Image.new("RGBA", (1, 1))
-	measure_draw = ImageDraw.Draw(measure_img)
-	bbox = measure_draw.textbbox((0, 0), text, font=font, stroke_width=stroke_width)
-	text_w, text_h = bbox[2] - bbox[0], bbox[3] - bbox[1]
-	text_layer = Image.new("RGBA", (max(1, text_w + abs(shadow_offset[0]) + stroke_width * 2), max(1, text_h + abs(shadow_offset[1]) + stroke_width * 2)), (0, 0, 0, 0))
-	txt_draw = ImageDraw.Draw(text_layer)
-	r, g, b, a = _parse_rgba(color, opacity)
-	# optional shadow on its own offset
-	if shadow_offset != (0, 0):
-		sr, sg, sb, sa = _parse_rgba(shadow_color, shadow_opacity)
-		txt_draw.text((max(0, shadow_offset[0]), max(0, shadow_offset[1])), text, font=font, fill=(sr, sg, sb, sa), stroke_width=stroke_width, stroke_fill=(sr, sg, sb, sa))
-	# main text with optional stroke
-	if stroke_width > 0:
-		sr, sg, sb, sa2 = _parse_rgba(stroke_color, 1.0)
-		txt_draw.text((0, 0), text, font=font, fill=(r, g, b, a), stroke_width=stroke_width, stroke_fill=(sr, sg, sb, sa2))
-	else:
-		txt_draw.text((0, 0), text, font=font, fill=(r, g, b, a))
-
-	if rotation_deg % 360 != 0:
-		text_layer = text_layer.rotate(rotation_deg, expand=True, resample=Image.BICUBIC)
+	glyph_atlas: bool = False,
+) -> Tuple[Image.Image, Tuple[int, int]]:
+	text_layer = _get_text_stamp(
+		text,
+		font_path,
+		font_size,
+		_parse_rgba(color, opacity),
+		stroke_width,
+		_parse_rgba(stroke_color, 1.0),
+		(int(shadow_offset[0]), int(shadow_offset[1])),
+		_parse_rgba(shadow_color, shadow_opacity),
+		int(rotation_deg) % 360,
+		glyph_atlas,
+	)
 
 	Lw, Lh = text_layer.width, text_layer.height
 	if override_xy is not None:
 		x, y = override_xy
 	else:
-		x, y = _compute_anchor_xy(img_rgba.width, img_rgba.height, Lw, Lh, position, margin_x, margin_y)
-
-	overlay.paste(text_layer, (x, y), text_layer)
+		x, y = _compute_anchor_xy(img_size[0], img_size[1], Lw, Lh, position, margin_x, margin_y)
+	return text_layer, (x, y)
 
-	composited = Image.alpha_composite(img_rgba, overlay)
-	if base_mode == "RGBA":
-		return composited
-	# For formats like JPEG, convert back to RGB
-	return composited.convert("RGB")
 
-
-def draw_image_watermark(
+def draw_text_watermark(
 	image: Image.Image,
-	watermark: Image.Image,
-	scale_percent: int = 20,
+	text: str,
+	font_size: int = 32,
+	color: str = "#FFFFFF",
 	opacity: float = 1.0,
 	position: str = "br",
 	margin_x: int = 24,
 	margin_y: int = 24,
+	font_path: str | None = None,
+	# Optional styles
+	stroke_width: int = 0,
+	stroke_color: str = "#000000",
+	shadow_offset: Tuple[int, int] = (0, 0),
+	shadow_color: str = "#000000",
+	shadow_opacity: float = 0.5,
 	rotation_deg: int = 0,
 	override_xy: Optional[Tuple[int, int]] = None,
+	backend: str = "pillow",
+	glyph_atlas: bool = False,
+	keep_mode: bool = False,
 ) -> Image.Image:
-	base_mode = image.mode
-	img_rgba = image.convert("RGBA")
-	overlay = Image.new("RGBA", img_rgba.size, (0, 0, 0, 0))
+	text_layer, xy = _place_text_stamp(
+		image.size,
+		text,
+		font_size=font_size,
+		color=color,
+		opacity=opacity,
+		position=position,
+		margin_x=margin_x,
+		margin_y=margin_y,
+		font_path=font_path,
+		stroke_width=stroke_width,
+		stroke_color=stroke_color,
+		shadow_offset=shadow_offset,
+		shadow_color=shadow_color,
+		shadow_opacity=shadow_opacity,
+		rotation_deg=rotation_deg,
+		override_xy=override_xy,
+		glyph_atlas=glyph_atlas,
+	)
+	return _composite_layer(image, text_layer, xy, backend, keep_mode)
 
-	wm = watermark.convert("RGBA")
-	# scale
-	scale_percent = max(1, min(1000, int(scale_percent)))
-	new_w = max(1, int(img_rgba.width * (scale_percent / 100.0)))
+
+def draw_text_watermark_batch(
+	images: Sequence[Image.Image],
+	text: str,
+	backend: str = "numpy",
+	keep_mode: bool = False,
+	**style,
+) -> List[Image.Image]:
+	"""Draw the same text watermark onto a batch of same-size images.
+
+	Accepts the style keywords of draw_text_watermark; the stamp and anchor are
+	resolved once and the blend runs through composite_layer_batch.
+	"""
+	if not images:
+		return []
+	text_layer, xy = _place_text_stamp(images[0].size, text, **style)
+	return composite_layer_batch(images, text_layer, xy, backend=backend, keep_mode=keep_mode)
+
+
+@functools.lru_cache(maxsize=32)
+def _opacity_lut(opacity: float) -> Tuple[int, ...]:
+	o = max(0.0, min(1.0, opacity))
+	return tuple(int(p * o) for p in range(256))
+
+
+def _prepare_image_watermark(wm: Image.Image, new_w: int, opacity: float, rotation_deg: int) -> Image.Image:
 	# maintain aspect ratio relative to original watermark
 	ratio = wm.height / wm.width
 	new_h = max(1, int(new_w * ratio))
@@ -140,23 +498,65 @@ def draw_image_watermark(
 
 	# apply opacity by scaling alpha channel
 	if opacity < 1.0:
-		alpha = wm.split()[3]
-		alpha = alpha.point(lambda p: int(p * max(0.0, min(1.0, opacity))))
+		alpha = wm.getchannel("A").point(_opacity_lut(opacity))
 		wm.putalpha(alpha)
 
 	if rotation_deg % 360 != 0:
 		wm = wm.rotate(rotation_deg, expand=True, resample=Image.BICUBIC)
+	return wm
+
+
+class PreparedWatermark:
+	"""A watermark image decoded once, with scaled variants cached for reuse.
+
+	Variants are keyed by (target width, opacity, rotation), so a batch of
+	same-size photos resizes and fades the logo only once.
+	"""
+
+	def __init__(self, watermark: Image.Image, max_bytes: int = STAMP_CACHE_MAX_BYTES):
+		self.source = watermark.convert("RGBA")
+		self.variants = StampCache(max_bytes)
+
+	@classmethod
+	def open(cls, path: str, max_bytes: int = STAMP_CACHE_MAX_BYTES) -> "PreparedWatermark":
+		with Image.open(path) as wm:
+			return cls(wm, max_bytes)
+
+	def variant(self, width: int, opacity: float, rotation_deg: int) -> Image.Image:
+		key = (width, opacity, rotation_deg % 360)
+		wm = self.variants.get(key)
+		if wm is None:
+			wm = _prepare_image_watermark(self.source, width, opacity, rotation_deg)
+			self.variants.put(key, wm)
+		return wm
+
+
+def draw_image_watermark(
+	image: Image.Image,
+	watermark: Image.Image | PreparedWatermark,
+	scale_percent: int = 20,
+	opacity: float = 1.0,
+	position: str = "br",
+	margin_x: int = 24,
+	margin_y: int = 24,
+	rotation_deg: int = 0,
+	override_xy: Optional[Tuple[int, int]] = None,
+	backend: str = "pillow",
+	keep_mode: bool = False,
+) -> Image.Image:
+	# scale
+	scale_percent = max(1, min(1000, int(scale_percent)))
+	new_w = max(1, int(image.width * (scale_percent / 100.0)))
+	if isinstance(watermark, PreparedWatermark):
+		wm = watermark.variant(new_w, opacity, rotation_deg)
+	else:
+		wm = _prepare_image_watermark(watermark.convert("RGBA"), new_w, opacity, rotation_deg)
 
 	if override_xy is not None:
 		x, y = override_xy
 	else:
-		x, y = _compute_anchor_xy(img_rgba.width, img_rgba.height, wm.width, wm.height, position, margin_x, margin_y)
-	overlay.paste(wm, (x, y), wm)
-
-	composited = Image.alpha_composite(img_rgba, overlay)
-	if base_mode == "RGBA":
-		return composited
-	return composited.convert("RGB")
+		x, y = _compute_anchor_xy(image.width, image.height, wm.width, wm.height, position, margin_x, margin_y)
+	return _composite_layer(image, wm, (x, y), backend, keep_mode)
 
 
 
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import os
+import threading
+from typing import Optional
+
+
+class MemoryBudget:
+	"""Admission gate counting the estimated bytes of work in flight.
+
+	acquire blocks while the new item would push the total past the limit. An
+	item larger than the whole budget is admitted only when nothing else is in
+	flight, so very large files run one at a time instead of never, while
+	small ones run at full parallelism.
+	"""
+
+	def __init__(self, limit: int):
+		self.limit = limit
+		self.in_use = 0
+		self.peak = 0
+		self.closed = False
+		self._cond = threading.Condition()
+
+	def acquire(self, nbytes: int) -> int:
+		with self._cond:
+			while self.in_use > 0 and self.in_use + nbytes > self.limit and not self.closed:
+				self._cond.wait()
+			self.in_use += nbytes
+			self.peak = max(self.peak, self.in_use)
+		return nbytes
+
+	def release(self, nbytes: int) -> None:
+		with self._cond:
+			self.in_use -= nbytes
+			self._cond.notify_all()
+
+	def close(self) -> None:
+		"""Stop gating: wakes every waiter, e.g. while a run is being cancelled."""
+		with self._cond:
+			self.closed = True
+			self._cond.notify_all()
+
+
+def estimate_decoded_bytes(path: str, st: Optional[os.stat_result] = None, cap: Optional[int] = None) -> int:
+	"""Peak memory estimate for watermarking one file, from its header only.
+
+	Counts the decoded source, the composited output copy (at most 4 bands)
+	and the encoded input held in memory. cap bounds the result for paths
+	with their own ceiling (strip/tile-wise TIFFs). Unreadable headers count
+	as 0: those files fail fast without decoding anything.
+	"""
+	from PIL import Image
+
+	try:
+		# Image.open reads the header only; size and mode come without decoding
+		with Image.open(path) as im:
+			pixels = im.width * im.height
+			bands = len(im.getbands())
+	except Exception:
+		return 0
+	size = st.st_size if st is not None else os.path.getsize(path)
+	estimate = pixels * (bands + 4) + size
+	return min(estimate, cap) if cap is not None else estimate
@@ -0,0 +1,390 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import collections
+import json
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from typing import Callable, Deque, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from PIL import Image
+
+from .api import WatermarkSettings, _watermark
+from .cli import _derive_output_root, _map_output_path, _process_file, _style_from_args
+from .date_cache import open_date_cache
+
+DEFAULT_PORT = 8765
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_QUEUE = 64
+MAX_BODY = 64 * 1024 * 1024
+
+_LATENCY_WINDOW = 1024
+
+
+def _flag(value) -> bool:
+	if isinstance(value, bool):
+		return value
+	return str(value).strip().lower() in {"1", "true", "yes", "on"}
+
+
+# Render settings a request may override, with the parser for each value. Where
+# outputs go, whether they replace files and which font file is read stay as
+# chosen when the server was started.
+OVERRIDES: Dict[str, Callable[[object], object]] = {
+	"font_size": int,
+	"color": str,
+	"opacity": float,
+	"position": str,
+	"margin_x": int,
+	"margin_y": int,
+	"glyph_atlas": _flag,
+	"keep_mode": _flag,
+	"fallback_mtime": _flag,
+	"exif_only": _flag,
+}
+
+
+class RequestError(Exception):
+	"""Answers the request with an HTTP error status and a JSON {"error": message} body."""
+
+	def __init__(self, status: int, message: str):
+		super().__init__(message)
+		self.status = status
+		self.message = message
+
+
+def job_args(base: argparse.Namespace, overrides: Dict[str, object]) -> argparse.Namespace:
+	"""Copy of the server's settings with one request's overrides applied."""
+	args = argparse.Namespace(**vars(base))
+	for key, value in overrides.items():
+		parse = OVERRIDES.get(key)
+		if parse is None:
+			raise RequestError(400, f"unknown setting {key!r}")
+		try:
+			setattr(args, key, parse(value))
+		except (TypeError, ValueError):
+			raise RequestError(400, f"bad value for {key}: {value!r}") from None
+	return args
+
+
+# Per-process state of pool workers
+_worker: Dict[str, object] = {}
+
+
+def _init_worker(cache_path: Optional[str]) -> None:
+	# Shutdown is driven by the server process
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+	_worker["cache"] = open_date_cache(cache_path, commit_every=1) if cache_path else None
+
+
+def _warm(args: argparse.Namespace) -> None:
+	# Load the font and build the stamp before the first request pays for it
+	WatermarkSettings.from_args(args).prepare()
+
+
+def _path_job(args: argparse.Namespace, path: str) -> Tuple[str, str]:
+	"""Watermark a file on disk next to it, as `--path <file>` would: (status, output path)."""
+	args.path = path
+	root_output = _derive_output_root(path, args.output_dir_name)
+	status = _process_file(path, args, root_output, _style_from_args(args), _worker.get("cache"))
+	return status, _map_output_path(path, path, root_output, args.suffix)
+
+
+def _bytes_job(settings: WatermarkSettings, data: bytes, date_str: Optional[str]) -> Tuple[bytes, str]:
+	"""Watermark uploaded image bytes: (encoded output, MIME type)."""
+	out, fmt = _watermark(data, settings, date_str)
+	return out, Image.MIME.get(fmt, "application/octet-stream")
+
+
+def _percentile(ordered, q: float) -> Optional[float]:
+	if not ordered:
+		return None
+	return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _json(payload: dict) -> bytes:
+	return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+async def _read_request(reader: asyncio.StreamReader):
+	"""(method, target, version, headers, body length), or None when the client closed the connection.
+
+	The body itself is left unread so the caller can refuse it first.
+	"""
+	try:
+		head = await reader.readuntil(b"\r\n\r\n")
+	except asyncio.IncompleteReadError as exc:
+		if not exc.partial.strip():
+			return None
+		raise RequestError(400, "truncated request") from None
+	except asyncio.LimitOverrunError:
+		raise RequestError(431, "request headers too large") from None
+	lines = head.decode("latin-1").split("\r\n")
+	try:
+		method, target, version = lines[0].split(" ", 2)
+	except ValueError:
+		raise RequestError(400, "malformed request line") from None
+	headers: Dict[str, str] = {}
+	for line in lines[1:]:
+		name, _, value = line.partition(":")
+		if name:
+			headers[name.strip().lower()] = value.strip()
+	if "chunked" in headers.get("transfer-encoding", "").lower():
+		raise RequestError(411, "chunked bodies are not supported; send Content-Length")
+	try:
+		length = int(headers.get("content-length", "0"))
+	except ValueError:
+		raise RequestError(400, "bad Content-Length") from None
+	if length < 0:
+		raise RequestError(400, "bad Content-Length")
+	if length > MAX_BODY:
+		raise RequestError(413, f"body larger than {MAX_BODY} bytes")
+	return method.upper(), target, version, headers, length
+
+
+def _response(status: int, content_type: str, payload: bytes, keep_alive: bool) -> bytes:
+	head = (
+		f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+		f"Content-Type: {content_type}\r\n"
+		f"Content-Length: {len(payload)}\r\n"
+		f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+	)
+	return head.encode("latin-1") + payload
+
+
+class JobServer:
+	"""Asyncio HTTP front end that hands watermark jobs to a warm process pool.
+
+	At most `workers` jobs run at once and at most `max_queue` more wait for
+	a worker; beyond that requests are refused with 503. Each job must finish
+	within `timeout` seconds (waiting included) or the request gets a 504.
+	A body is only read once the request has a place in the queue, so at most
+	`workers + max_queue` bodies of up to MAX_BODY bytes are held at a time.
+	"""
+
+	def __init__(self, args: argparse.Namespace, workers: int, timeout: float = DEFAULT_TIMEOUT, max_queue: int = DEFAULT_QUEUE):
+		self.args = args
+		self.workers = max(1, workers)
+		self.timeout = timeout
+		self.max_queue = max(0, max_queue)
+		self.pool: Optional[ProcessPoolExecutor] = None
+		self.waiting = 0
+		self.running = 0
+		# Requests whose body is still being read; they count as queued jobs
+		self.receiving = 0
+		self.completed = 0
+		self.failed = 0
+		self.rejected = 0
+		self.timeouts = 0
+		self.started = time.monotonic()
+		self._latencies: Deque[float] = collections.deque(maxlen=_LATENCY_WINDOW)
+		self._slots: Optional[asyncio.Semaphore] = None
+		# Open connections -> whether a request is being answered on it
+		self._connections: Dict[asyncio.StreamWriter, bool] = {}
+
+	def status(self) -> dict:
+		ordered = sorted(self._latencies)
+		return {
+			"workers": self.workers,
+			"queued": self.waiting,
+			"receiving": self.receiving,
+			"running": self.running,
+			"completed": self.completed,
+			"failed": self.failed,
+			"rejected": self.rejected,
+			"timeouts": self.timeouts,
+			"uptime_s": round(time.monotonic() - self.started, 3),
+			"latency_ms": {
+				name: None if value is None else round(value * 1000, 3)
+				for name, value in (("p50", _percentile(ordered, 0.5)), ("p90", _percentile(ordered, 0.9)), ("p99", _percentile(ordered, 0.99)))
+			},
+		}
+
+	async def _dispatch(self, fn, *fn_args):
+		self.waiting += 1
+		try:
+			await self._slots.acquire()
+		finally:
+			self.waiting -= 1
+		loop = asyncio.get_running_loop()
+		try:
+			future = self.pool.submit(fn, *fn_args)
+		except BaseException:
+			self._slots.release()
+			raise
+		self.running += 1
+
+		def _finished(_future) -> None:
+			# The slot is held until the worker is really free, even if the request timed out
+			try:
+				loop.call_soon_threadsafe(self._release)
+			except RuntimeError:
+				pass
+
+		future.add_done_callback(_finished)
+		return await asyncio.wrap_future(future)
+
+	def _release(self) -> None:
+		self.running -= 1
+		self._slots.release()
+
+	def _admit(self) -> None:
+		if self.waiting + self.running + self.receiving >= self.workers + self.max_queue:
+			self.rejected += 1
+			raise RequestError(503, "too many queued jobs")
+
+	async def submit(self, fn, *fn_args):
+		"""Run fn in the pool under the concurrency, queue and time limits."""
+		self._admit()
+		start = time.monotonic()
+		try:
+			result = await asyncio.wait_for(self._dispatch(fn, *fn_args), self.timeout)
+		except asyncio.TimeoutError:
+			self.timeouts += 1
+			raise RequestError(504, f"job did not finish within {self.timeout:g}s") from None
+		except Exception as exc:
+			self.failed += 1
+			raise RequestError(422, str(exc)) from None
+		finally:
+			self._latencies.append(time.monotonic() - start)
+		self.completed += 1
+		return result
+
+	async def _watermark(self, query: str, headers: Dict[str, str], body: bytes) -> Tuple[int, str, bytes]:
+		params = dict(parse_qsl(query))
+		if headers.get("content-type", "").split(";")[0].strip().lower() == "application/json":
+			try:
+				job = json.loads(body or b"{}")
+			except ValueError:
+				raise RequestError(400, "body is not valid JSON") from None
+			if not isinstance(job, dict):
+				job = {}
+			settings = job.get("settings") or {}
+			if not isinstance(job.get("path"), str) or not isinstance(settings, dict):
+				raise RequestError(400, 'expected {"path": "...", "settings": {...}}')
+			path = os.path.abspath(job["path"])
+			if not os.path.isfile(path):
+				raise RequestError(404, f"no such file: {path}")
+			status, out_path = await self.submit(_path_job, job_args(self.args, settings), path)
+			return 200, "application/json", _json({"status": status, "output": out_path})
+		if not body:
+			raise RequestError(400, "send image bytes, or JSON with a path")
+		date_str = params.pop("date", None)
+		settings = WatermarkSettings.from_args(job_args(self.args, params))
+		data, content_type = await self.submit(_bytes_job, settings, body, date_str)
+		return 200, content_type, data
+
+	async def _route(self, method: str, target: str, headers: Dict[str, str], body: bytes) -> Tuple[int, str, bytes]:
+		url = urlsplit(target)
+		try:
+			if url.path == "/status":
+				if method != "GET":
+					raise RequestError(405, "use GET /status")
+				return 200, "application/json", _json(self.status())
+			if url.path == "/watermark":
+				if method != "POST":
+					raise RequestError(405, "use POST /watermark")
+				return await self._watermark(url.query, headers, body)
+			raise RequestError(404, f"no such endpoint: {url.path}")
+		except RequestError as exc:
+			return exc.status, "application/json", _json({"error": exc.message})
+
+	async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+		self._connections[writer] = False
+		try:
+			while True:
+				try:
+					request = await _read_request(reader)
+				except RequestError as exc:
+					writer.write(_response(exc.status, "application/json", _json({"error": exc.message}), False))
+					await writer.drain()
+					break
+				if request is None:
+					break
+				method, target, version, headers, length = request
+				self._connections[writer] = True
+				body = b""
+				if length:
+					try:
+						# Refuse before buffering the body when the queue is already full
+						self._admit()
+					except RequestError as exc:
+						writer.write(_response(exc.status, "application/json", _json({"error": exc.message}), False))
+						await writer.drain()
+						break
+					self.receiving += 1
+					try:
+						body = await reader.readexactly(length)
+					finally:
+						self.receiving -= 1
+				status, content_type, payload = await self._route(method, target, headers, body)
+				connection = headers.get("connection", "").lower()
+				keep_alive = connection == "keep-alive" or (version == "HTTP/1.1" and connection != "close")
+				writer.write(_response(status, content_type, payload, keep_alive))
+				await writer.drain()
+				self._connections[writer] = False
+				if not keep_alive:
+					break
+		except (ConnectionError, asyncio.IncompleteReadError):
+			pass
+		finally:
+			self._connections.pop(writer, None)
+			writer.close()
+
+	async def run(self, socket_path: Optional[str] = None, port: int = DEFAULT_PORT, ready: Optional[Callable[[str], None]] = None) -> int:
+		"""Serve until SIGINT/SIGTERM; requests being answered are allowed to finish."""
+		loop = asyncio.get_running_loop()
+		self._slots = asyncio.Semaphore(self.workers)
+		cache_path = self.args.date_cache_path if self.args.date_cache else None
+		self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(cache_path,))
+		stop = asyncio.Event()
+		for sig in (signal.SIGINT, signal.SIGTERM):
+			try:
+				loop.add_signal_handler(sig, stop.set)
+			except (NotImplementedError, RuntimeError):
+				pass
+		try:
+			# Start every worker up front so no request pays for a process start or font load
+			await asyncio.gather(*(loop.run_in_executor(self.pool, _warm, self.args) for _ in range(self.workers)))
+			if socket_path:
+				server = await asyncio.start_unix_server(self.handle, path=socket_path)
+				where = f"unix:{socket_path}"
+			else:
+				server = await asyncio.start_server(self.handle, host="127.0.0.1", port=port)
+				where = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+			message = f"Serving on {where} with {self.workers} worker(s); press Ctrl-C to stop"
+			if ready is not None:
+				ready(message)
+			else:
+				print(message, flush=True)
+			await stop.wait()
+			server.close()
+			deadline = time.monotonic() + self.timeout
+			while any(self._connections.values()) and time.monotonic() < deadline:
+				await asyncio.sleep(0.05)
+			for writer in list(self._connections):
+				writer.close()
+			await server.wait_closed()
+		finally:
+			for sig in (signal.SIGINT, signal.SIGTERM):
+				try:
+					loop.remove_signal_handler(sig)
+				except (NotImplementedError, RuntimeError):
+					pass
+			self.pool.shutdown(wait=True, cancel_futures=True)
+			if socket_path and os.path.exists(socket_path):
+				os.unlink(socket_path)
+		return 0
+
+
+def serve(args: argparse.Namespace) -> int:
+	server = JobServer(args, args.jobs or os.cpu_count() or 1, args.serve_timeout, args.serve_queue)
+	try:
+		return asyncio.run(server.run(args.serve_socket, args.serve_port))
+	except KeyboardInterrupt:
+		return 130
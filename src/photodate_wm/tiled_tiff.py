@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import math
+import shutil
+import struct
+import tempfile
+import zlib
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from .render import _composite_layer, _layer_box, _output_mode, _place_text_stamp
+
+
+DEFAULT_TILED_MEMORY = 256 * 1024 * 1024
+
+# TIFF tags used to locate and interpret the image chunks
+_IMAGE_WIDTH = 256
+_IMAGE_LENGTH = 257
+_BITS_PER_SAMPLE = 258
+_COMPRESSION = 259
+_PHOTOMETRIC = 262
+_FILL_ORDER = 266
+_STRIP_OFFSETS = 273
+_SAMPLES_PER_PIXEL = 277
+_ROWS_PER_STRIP = 278
+_STRIP_BYTE_COUNTS = 279
+_PLANAR_CONFIGURATION = 284
+_PREDICTOR = 317
+_TILE_WIDTH = 322
+_TILE_LENGTH = 323
+_TILE_OFFSETS = 324
+_TILE_BYTE_COUNTS = 325
+_INK_SET = 332
+_EXTRA_SAMPLES = 338
+
+_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 6: 1, 7: 1, 8: 2, 9: 4, 16: 8}
+_TYPE_FORMATS = {1: "B", 3: "H", 4: "I", 6: "b", 7: "B", 8: "h", 9: "i", 16: "Q"}
+
+# Compressed bytes read, and most inflated bytes produced, per streaming step
+_STREAM_CHUNK = 64 * 1024
+
+_COMPRESSION_NONE = 1
+_COMPRESSION_DEFLATE = (8, 32946)
+
+
+class TiledUnsupported(Exception):
+	"""The TIFF layout cannot be patched chunk-wise; use the regular path."""
+
+
+class TiledMemoryExceeded(Exception):
+	"""One row of the image does not fit in the tiled memory ceiling."""
+
+
+@dataclass
+class _Entry:
+	type: int
+	count: int
+	values: Tuple[int, ...]
+	# File position of the first value (inline in the IFD entry or out of line)
+	value_pos: int
+
+
+@dataclass
+class TiffLayout:
+	byte_order: str
+	width: int
+	height: int
+	mode: str
+	compression: int
+	tiled: bool
+	chunk_width: int
+	chunk_height: int
+	offsets: List[int]
+	byte_counts: List[int]
+	offsets_entry: _Entry
+	counts_entry: _Entry
+
+	@property
+	def bytes_per_pixel(self) -> int:
+		return len(self.mode)
+
+	def chunk_rect(self, index: int) -> Tuple[int, int, int, int]:
+		"""Return (x, y, stored width, valid rows) of a strip or tile."""
+		if self.tiled:
+			across = math.ceil(self.width / self.chunk_width)
+			x = (index % across) * self.chunk_width
+			y = (index // across) * self.chunk_height
+			return x, y, self.chunk_width, self.chunk_height
+		y = index * self.chunk_height
+		return 0, y, self.width, min(self.chunk_height, self.height - y)
+
+
+def _read_ifd(f: BinaryIO, byte_order: str, ifd_offset: int) -> Dict[int, _Entry]:
+	f.seek(ifd_offset)
+	(count,) = struct.unpack(byte_order + "H", f.read(2))
+	raw = f.read(12 * count)
+	entries: Dict[int, _Entry] = {}
+	for i in range(count):
+		entry_pos = ifd_offset + 2 + 12 * i
+		tag, typ, n = struct.unpack(byte_order + "HHI", raw[12 * i:12 * i + 8])
+		size = _TYPE_SIZES.get(typ)
+		fmt = _TYPE_FORMATS.get(typ)
+		if size is None or fmt is None:
+			continue
+		if size * n <= 4:
+			value_pos = entry_pos + 8
+			data = raw[12 * i + 8:12 * i + 8 + size * n]
+		else:
+			(value_pos,) = struct.unpack(byte_order + "I", raw[12 * i + 8:12 * i + 12])
+			here = f.tell()
+			f.seek(value_pos)
+			data = f.read(size * n)
+			f.seek(here)
+		if len(data) != size * n:
+			raise TiledUnsupported(f"Truncated TIFF tag {tag}")
+		entries[tag] = _Entry(typ, n, struct.unpack(byte_order + fmt * n, data), value_pos)
+	return entries
+
+
+def _first_ifd(f: BinaryIO) -> Tuple[str, Dict[int, _Entry]]:
+	header = f.read(8)
+	if header[:4] == b"II*\x00":
+		byte_order = "<"
+	elif header[:4] == b"MM\x00*":
+		byte_order = ">"
+	else:
+		# BigTIFF (43) and anything else are not handled here
+		raise TiledUnsupported("Not a classic TIFF file")
+	(ifd_offset,) = struct.unpack(byte_order + "I", header[4:8])
+	return byte_order, _read_ifd(f, byte_order, ifd_offset)
+
+
+def _value(entries: Dict[int, _Entry], tag: int, default: Optional[int] = None) -> Optional[int]:
+	entry = entries.get(tag)
+	return entry.values[0] if entry is not None else default
+
+
+def _detect_mode(entries: Dict[int, _Entry]) -> str:
+	samples = _value(entries, _SAMPLES_PER_PIXEL, 1)
+	photometric = _value(entries, _PHOTOMETRIC)
+	bits = entries.get(_BITS_PER_SAMPLE)
+	if bits is None or any(b != 8 for b in bits.values):
+		raise TiledUnsupported("Only 8-bit samples are supported")
+	extra = entries[_EXTRA_SAMPLES].values if _EXTRA_SAMPLES in entries else ()
+	if photometric == 1 and samples == 1:
+		return "L"
+	if photometric == 2 and samples == 3:
+		return "RGB"
+	if photometric == 2 and samples == 4 and extra == (2,):
+		return "RGBA"
+	if photometric == 5 and samples == 4 and _value(entries, _INK_SET, 1) == 1:
+		return "CMYK"
+	raise TiledUnsupported(f"Unsupported photometric/sample layout: {photometric}/{samples}")
+
+
+def read_tiff_layout(path: str) -> TiffLayout:
+	with open(path, "rb") as f:
+		byte_order, entries = _first_ifd(f)
+	width = _value(entries, _IMAGE_WIDTH)
+	height = _value(entries, _IMAGE_LENGTH)
+	if not width or not height:
+		raise TiledUnsupported("Missing image dimensions")
+	mode = _detect_mode(entries)
+	compression = _value(entries, _COMPRESSION, _COMPRESSION_NONE)
+	if compression != _COMPRESSION_NONE and compression not in _COMPRESSION_DEFLATE:
+		raise TiledUnsupported(f"Unsupported compression: {compression}")
+	if _value(entries, _PREDICTOR, 1) != 1:
+		raise TiledUnsupported("Predictors are not supported")
+	if _value(entries, _PLANAR_CONFIGURATION, 1) != 1 or _value(entries, _FILL_ORDER, 1) != 1:
+		raise TiledUnsupported("Only contiguous, MSB-first sample layout is supported")
+
+	if _TILE_OFFSETS in entries:
+		tiled = True
+		chunk_w = _value(entries, _TILE_WIDTH)
+		chunk_h = _value(entries, _TILE_LENGTH)
+		offsets_entry, counts_entry = entries[_TILE_OFFSETS], entries.get(_TILE_BYTE_COUNTS)
+	else:
+		tiled = False
+		chunk_w = width
+		chunk_h = min(_value(entries, _ROWS_PER_STRIP, height), height)
+		offsets_entry, counts_entry = entries.get(_STRIP_OFFSETS), entries.get(_STRIP_BYTE_COUNTS)
+	if not chunk_w or not chunk_h or offsets_entry is None or counts_entry is None:
+		raise TiledUnsupported("Missing strip/tile layout")
+	if offsets_entry.count != counts_entry.count:
+		raise TiledUnsupported("Inconsistent strip/tile tables")
+	return TiffLayout(
+		byte_order=byte_order,
+		width=width,
+		height=height,
+		mode=mode,
+		compression=compression,
+		tiled=tiled,
+		chunk_width=chunk_w,
+		chunk_height=chunk_h,
+		offsets=list(offsets_entry.values),
+		byte_counts=list(counts_entry.values),
+		offsets_entry=offsets_entry,
+		counts_entry=counts_entry,
+	)
+
+
+def tiff_pixel_count(path: str) -> Optional[int]:
+	"""Width * height from the first IFD, without decoding (or None if unreadable)."""
+	try:
+		with open(path, "rb") as f:
+			_, entries = _first_ifd(f)
+		return (_value(entries, _IMAGE_WIDTH) or 0) * (_value(entries, _IMAGE_LENGTH) or 0)
+	except (OSError, TiledUnsupported, struct.error):
+		return None
+
+
+def _patch_entry(f: BinaryIO, layout: TiffLayout, entry: _Entry, index: int, value: int) -> None:
+	if entry.type == 3 and value > 0xFFFF:
+		raise TiledUnsupported("Strip/tile table too narrow for relocated data")
+	f.seek(entry.value_pos + index * _TYPE_SIZES[entry.type])
+	f.write(struct.pack(layout.byte_order + _TYPE_FORMATS[entry.type], value))
+
+
+def _row_memory(layout: TiffLayout) -> int:
+	"""Bytes held while patching: a stored row, its composited copy and one stream step."""
+	row_bytes = layout.chunk_width * layout.bytes_per_pixel
+	return 2 * row_bytes + _STREAM_CHUNK
+
+
+def _patch_row(row: bytes, layout: TiffLayout, cx: int, y: int, layer: Image.Image, xy: Tuple[int, int]) -> bytes:
+	"""Composite the layer into one stored row at image row y (the chunk starts at column cx)."""
+	im = Image.frombytes(layout.mode, (len(row) // layout.bytes_per_pixel, 1), row)
+	return _composite_layer(im, layer, (xy[0] - cx, xy[1] - y), keep_mode=True).tobytes()
+
+
+def _watermark_chunk_rows(
+	f: BinaryIO,
+	layout: TiffLayout,
+	index: int,
+	layer: Image.Image,
+	xy: Tuple[int, int],
+	box: Tuple[int, int, int, int],
+) -> None:
+	cx, cy, cw, ch = layout.chunk_rect(index)
+	row_bytes = cw * layout.bytes_per_pixel
+	offset = layout.offsets[index]
+	# Chunk-local rows under the watermark
+	r0, r1 = max(box[1], cy) - cy, min(box[3], cy + ch) - cy
+
+	if layout.compression == _COMPRESSION_NONE:
+		# Uncompressed rows are addressable: read and rewrite only those under the watermark
+		for r in range(r0, r1):
+			f.seek(offset + r * row_bytes)
+			row = _patch_row(f.read(row_bytes), layout, cx, cy + r, layer, xy)
+			f.seek(offset + r * row_bytes)
+			f.write(row)
+		return
+
+	# Deflate: stream the chunk through a decompressor and a compressor; rows
+	# outside the watermark pass straight through and only one row is held
+	start, end = r0 * row_bytes, r1 * row_bytes
+	inflate, deflate = zlib.decompressobj(), zlib.compressobj()
+	pending = bytearray()
+	done = 0
+	with tempfile.TemporaryFile() as encoded:
+
+		def _feed(data: bytes) -> None:
+			nonlocal done
+			pending.extend(data)
+			while pending:
+				if start <= done < end:
+					if len(pending) < row_bytes:
+						return
+					row = _patch_row(bytes(pending[:row_bytes]), layout, cx, cy + done // row_bytes, layer, xy)
+					n = row_bytes
+				else:
+					n = min(len(pending), start - done) if done < start else len(pending)
+					row = bytes(pending[:n])
+				encoded.write(deflate.compress(row))
+				del pending[:n]
+				done += n
+
+		f.seek(offset)
+		remaining = layout.byte_counts[index]
+		while remaining:
+			data = f.read(min(_STREAM_CHUNK, remaining))
+			if not data:
+				raise TiledUnsupported("Truncated strip/tile data")
+			remaining -= len(data)
+			# max_length bounds the inflated output of highly compressible data
+			_feed(inflate.decompress(data, _STREAM_CHUNK))
+			while inflate.unconsumed_tail:
+				_feed(inflate.decompress(inflate.unconsumed_tail, _STREAM_CHUNK))
+		_feed(inflate.flush())
+		# A short last strip may end mid-row
+		encoded.write(deflate.compress(bytes(pending)))
+		encoded.write(deflate.flush())
+		size = encoded.tell()
+
+		if size > layout.byte_counts[index]:
+			# Does not fit in place: append at the (word-aligned) end of the file
+			f.seek(0, 2)
+			offset = f.tell() + (f.tell() & 1)
+			if offset + size > 0xFFFFFFFF:
+				raise TiledUnsupported("Relocated data would exceed the 4 GB classic TIFF limit")
+			_patch_entry(f, layout, layout.offsets_entry, index, offset)
+		f.seek(offset)
+		encoded.seek(0)
+		shutil.copyfileobj(encoded, f, _STREAM_CHUNK)
+	_patch_entry(f, layout, layout.counts_entry, index, size)
+
+
+def draw_text_watermark_tiled(
+	in_path: str,
+	out_path: str,
+	text: str,
+	memory_limit: int = DEFAULT_TILED_MEMORY,
+	keep_mode: bool = False,
+	**style,
+) -> None:
+	"""Watermark a large TIFF by patching only the strips/tiles under the stamp.
+
+	The input is stream-copied to out_path and the intersecting chunks are
+	streamed row by row through the compositor and written back, so
+	untouched tiles are never decoded and peak memory is about one row,
+	however large a strip is. Raises TiledMemoryExceeded when even that does
+	not fit in memory_limit. Accepts the style
+	keywords of draw_text_watermark. Raises TiledUnsupported for layouts that
+	need the regular full-decode path (BigTIFF, LZW/JPEG, 16-bit, planar...),
+	and for L/CMYK images without keep_mode, whose output is converted to RGB.
+	"""
+	layout = read_tiff_layout(in_path)
+	if _output_mode(Image.new(layout.mode, (1, 1)), keep_mode) != layout.mode:
+		# Patching in place cannot change the mode the regular path would write
+		raise TiledUnsupported(f"{layout.mode} output is converted to RGB without keep_mode")
+	layer, xy = _place_text_stamp((layout.width, layout.height), text, **style)
+	box = _layer_box(layout.width, layout.height, layer, xy)
+	if _row_memory(layout) > memory_limit:
+		raise TiledMemoryExceeded(f"Patching needs {_row_memory(layout)} bytes, over the tiled memory ceiling of {memory_limit}")
+	chunks = []
+	if box is not None:
+		for index in range(len(layout.offsets)):
+			cx, cy, cw, ch = layout.chunk_rect(index)
+			if cx < box[2] and box[0] < cx + cw and cy < box[3] and box[1] < cy + ch:
+				chunks.append(index)
+	shutil.copyfile(in_path, out_path)
+	if not chunks:
+		return
+	with open(out_path, "r+b") as f:
+		for index in chunks:
+			_watermark_chunk_rows(f, layout, index, layer, xy, box)
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# inotify(7) event bits
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+FileStat = Tuple[str, os.stat_result]
+# Lists (path, stat) for every candidate under a directory (used for rescans)
+Scanner = Callable[[str], Iterable[FileStat]]
+
+
+class WatchUnavailable(Exception):
+	"""inotify cannot be used here; fall back to polling."""
+
+
+def _wanted(path: str, include_ext: Set[str]) -> bool:
+	name = os.path.basename(path)
+	# Uploaders (rsync, browsers) write to hidden or temporary names and rename when done
+	if name.startswith("."):
+		return False
+	return not include_ext or os.path.splitext(name)[1].lower() in include_ext
+
+
+class PollingWatcher:
+	"""Reports new or changed files by rescanning the tree with os.scandir."""
+
+	backend = "polling"
+
+	def __init__(self, root: str, include_ext: Set[str], scan: Scanner):
+		self.root = root
+		self.include_ext = include_ext
+		self._scan = scan
+		self._seen: Dict[str, Tuple[int, int]] = {path: (st.st_size, st.st_mtime_ns) for path, st in scan(root)}
+
+	def changes(self, timeout: float) -> List[str]:
+		time.sleep(timeout)
+		changed = []
+		current: Dict[str, Tuple[int, int]] = {}
+		for path, st in self._scan(self.root):
+			sig = (st.st_size, st.st_mtime_ns)
+			current[path] = sig
+			if self._seen.get(path) != sig and _wanted(path, self.include_ext):
+				changed.append(path)
+		self._seen = current
+		return changed
+
+	def close(self) -> None:
+		pass
+
+
+class InotifyWatcher:
+	"""Reports created, written and moved-in files through Linux inotify (via ctypes)."""
+
+	backend = "inotify"
+
+	def __init__(self, root: str, recursive: bool, include_ext: Set[str], scan: Scanner, exclude_dirs: Iterable[str] = ()):
+		if not sys.platform.startswith("linux"):
+			raise WatchUnavailable("inotify is Linux-only")
+		libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+		if not hasattr(libc, "inotify_init1"):
+			raise WatchUnavailable("libc has no inotify")
+		self._libc = libc
+		self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+		if self._fd < 0:
+			raise WatchUnavailable(os.strerror(ctypes.get_errno()))
+		self.root = root
+		self.recursive = recursive
+		self.include_ext = include_ext
+		self._scan = scan
+		self._excluded = {os.path.normcase(os.path.abspath(d)) for d in exclude_dirs}
+		self._dirs: Dict[int, str] = {}
+		self._add_tree(root)
+
+	def _add_watch(self, directory: str) -> None:
+		wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+		if wd < 0:
+			err = ctypes.get_errno()
+			if not self._dirs:
+				raise WatchUnavailable(os.strerror(err))
+			# Vanished meanwhile or out of watches (fs.inotify.max_user_watches): skip this directory
+			return
+		self._dirs[wd] = directory
+
+	def _add_tree(self, top: str) -> None:
+		stack = [top]
+		while stack:
+			directory = stack.pop()
+			self._add_watch(directory)
+			if not self.recursive:
+				continue
+			try:
+				with os.scandir(directory) as it:
+					for entry in it:
+						if entry.is_dir(follow_symlinks=False) and os.path.normcase(entry.path) not in self._excluded:
+							stack.append(entry.path)
+			except OSError:
+				continue
+
+	def changes(self, timeout: float) -> List[str]:
+		readable, _, _ = select.select([self._fd], [], [], timeout)
+		if not readable:
+			return []
+		changed: List[str] = []
+		while True:
+			try:
+				data = os.read(self._fd, _READ_SIZE)
+			except BlockingIOError:
+				break
+			offset = 0
+			while offset + _EVENT_HEADER.size <= len(data):
+				wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+				name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b"\0")
+				offset += _EVENT_HEADER.size + length
+				if mask & _IN_Q_OVERFLOW:
+					# Events were dropped by the kernel: fall back to a full rescan once
+					changed.extend(path for path, _ in self._scan(self.root))
+					continue
+				if mask & _IN_IGNORED:
+					self._dirs.pop(wd, None)
+					continue
+				directory = self._dirs.get(wd)
+				if directory is None or not name:
+					continue
+				path = os.path.join(directory, os.fsdecode(name))
+				if mask & _IN_ISDIR:
+					if self.recursive and mask & (_IN_CREATE | _IN_MOVED_TO) and os.path.normcase(path) not in self._excluded:
+						self._add_tree(path)
+						# Files may have landed before the new watch was in place
+						changed.extend(p for p, _ in self._scan(path))
+					continue
+				if _wanted(path, self.include_ext):
+					changed.append(path)
+		return changed
+
+	def close(self) -> None:
+		if self._fd >= 0:
+			os.close(self._fd)
+			self._fd = -1
+
+
+def open_watcher(
+	root: str,
+	recursive: bool,
+	include_ext: Set[str],
+	scan: Scanner,
+	exclude_dirs: Iterable[str] = (),
+	polling: bool = False,
+):
+	"""inotify where the platform provides it, otherwise scandir polling."""
+	if not polling:
+		try:
+			return InotifyWatcher(root, recursive, include_ext, scan, exclude_dirs)
+		except (WatchUnavailable, OSError, AttributeError):
+			pass
+	return PollingWatcher(root, include_ext, scan)
+
+
+class Debouncer:
+	"""Holds changed paths back until their size and mtime have been stable for settle seconds.
+
+	Cameras and upload tools write files in pieces; only a file that stopped
+	changing is handed out for processing.
+	"""
+
+	def __init__(self, settle: float, clock: Callable[[], float] = time.monotonic):
+		self.settle = settle
+		self._clock = clock
+		# path -> (last seen size/mtime, time it was last seen changing)
+		self._pending: Dict[str, Tuple[Optional[Tuple[int, int]], float]] = {}
+
+	def __len__(self) -> int:
+		return len(self._pending)
+
+	def touch(self, paths: Iterable[str]) -> None:
+		now = self._clock()
+		for path in paths:
+			sig = self._pending.get(path, (None, now))[0]
+			self._pending[path] = (sig, now)
+
+	def ready(self) -> Iterator[FileStat]:
+		now = self._clock()
+		for path in sorted(self._pending):
+			sig, changed_at = self._pending[path]
+			try:
+				st = os.stat(path)
+			except OSError:
+				del self._pending[path]
+				continue
+			current = (st.st_size, st.st_mtime_ns)
+			if current != sig:
+				self._pending[path] = (current, now)
+				continue
+			if now - changed_at >= self.settle:
+				del self._pending[path]
+				yield path, st
@@ -1,6 +1,8 @@
 import os
 import sys
 
+import pytest
+
 
 def pytest_sessionstart(session):
 	project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -9,4 +11,14 @@ def pytest_sessionstart(session):
 		sys.path.insert(0, src_path)
 
 
-
+@pytest.fixture(autouse=True)
+def _isolated_home(tmp_path_factory, monkeypatch):
+	"""Keep the default date cache (~/.photodate_wm) out of the developer's real home."""
+	home = str(tmp_path_factory.mktemp("home"))
+	# Inherited by the CLI subprocesses that tests start
+	monkeypatch.setenv("HOME", home)
+	monkeypatch.setenv("USERPROFILE", home)
+	# In-process runs: the default path was resolved when the modules were imported
+	cache_path = os.path.join(home, ".photodate_wm", "date_cache.sqlite3")
+	monkeypatch.setattr("photodate_wm.date_cache.DEFAULT_CACHE_PATH", cache_path)
+	monkeypatch.setattr("photodate_wm.cli.DEFAULT_CACHE_PATH", cache_path)
@@ -0,0 +1,69 @@
+import builtins
+import io
+
+import piexif
+import pytest
+from PIL import Image
+
+from photodate_wm import NoDateError, WatermarkSettings, watermark_bytes, watermark_many
+from photodate_wm.exif_utils import find_exif_segment
+
+
+def _jpeg_with_date(dt_str="2021:07:08 09:10:11", color=(0, 0, 0)):
+	buf = io.BytesIO()
+	Image.new("RGB", (120, 80), color).save(buf, format="JPEG", quality=95)
+	exif = {"0th": {}, "Exif": {piexif.ExifIFD.DateTimeOriginal: dt_str.encode()}, "GPS": {}, "1st": {}, "thumbnail": None}
+	out = io.BytesIO()
+	piexif.insert(piexif.dump(exif), buf.getvalue(), out)
+	return out.getvalue()
+
+
+def _markers(jpeg):
+	pos, found = 2, []
+	while jpeg[pos + 1] != 0xDA:
+		found.append(jpeg[pos + 1])
+		pos += 2 + int.from_bytes(jpeg[pos + 2:pos + 4], "big")
+	return found
+
+
+def _png():
+	buf = io.BytesIO()
+	Image.new("RGB", (120, 80)).save(buf, format="PNG")
+	return buf.getvalue()
+
+
+def test_watermark_bytes_keeps_exif_without_touching_files(monkeypatch):
+	data = _jpeg_with_date()
+	settings = WatermarkSettings(font_size=16).prepare()
+
+	def _no_files(*args, **kwargs):
+		raise AssertionError("filesystem access")
+
+	monkeypatch.setattr(builtins, "open", _no_files)
+	out = watermark_bytes(io.BytesIO(data), settings)
+	monkeypatch.undo()
+
+	assert find_exif_segment(out) == find_exif_segment(data)
+	# JFIF APP0 stays first, as JFIF readers expect
+	assert _markers(out)[:2] == [0xE0, 0xE1]
+	with Image.open(io.BytesIO(out)) as im:
+		assert im.format == "JPEG"
+		assert im.size == (120, 80)
+		assert im.convert("L").getextrema()[1] > 100
+
+
+def test_date_is_required_without_exif():
+	with pytest.raises(NoDateError):
+		watermark_bytes(_png())
+	out = watermark_bytes(_png(), WatermarkSettings(format="JPEG"), date="2020-01-02")
+	with Image.open(io.BytesIO(out)) as im:
+		assert im.format == "JPEG"
+
+
+def test_watermark_many_keeps_order_and_reports_errors():
+	items = [_jpeg_with_date(color=(i * 40, 0, 0)) for i in range(5)]
+	items.insert(2, b"not an image")
+	results = list(watermark_many(items, WatermarkSettings(font_size=12), threads=3))
+	assert [r.error is None for r in results] == [True, True, False, True, True, True]
+	expected = [watermark_bytes(d, WatermarkSettings(font_size=12)) for d in items[:2]]
+	assert [r.data for r in results[:2]] == expected
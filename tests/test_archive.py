@@ -0,0 +1,101 @@
+import io
+import os
+import sys
+import subprocess
+import tarfile
+import zipfile
+
+import piexif
+from PIL import Image
+
+from photodate_wm.archive import ArchiveWriter, iter_members
+
+
+def _jpeg_with_date(dt_str="2021:07:08 09:10:11"):
+	buf = io.BytesIO()
+	Image.new("RGB", (120, 80)).save(buf, format="JPEG", quality=95)
+	exif = {"0th": {}, "Exif": {piexif.ExifIFD.DateTimeOriginal: dt_str.encode()}, "GPS": {}, "1st": {}, "thumbnail": None}
+	out = io.BytesIO()
+	piexif.insert(piexif.dump(exif), buf.getvalue(), out)
+	return out.getvalue()
+
+
+def run_module(args, cwd):
+	env = os.environ.copy()
+	env["PYTHONPATH"] = os.path.join(cwd, "src") + os.pathsep + env.get("PYTHONPATH", "")
+	cmd = [sys.executable, "-m", "photodate_wm"] + args
+	return subprocess.run(cmd, cwd=cwd, env=env, capture_output=True, text=True)
+
+
+def test_members_round_trip_and_skip_resource_forks(tmp_path):
+	path = tmp_path / "in.zip"
+	with zipfile.ZipFile(path, "w") as zf:
+		zf.writestr("a/IMG_1.jpg", b"one")
+		zf.writestr("__MACOSX/a/._IMG_1.jpg", b"fork")
+		zf.writestr("notes.txt", b"text")
+	passed = []
+	assert [m.name for m in iter_members(str(path), {".jpg"}, passed.append)] == ["a/IMG_1.jpg"]
+	assert passed == ["__MACOSX/a/._IMG_1.jpg", "notes.txt"]
+
+	out = tmp_path / "out.tar.gz"
+	with open(out, "wb") as fh, ArchiveWriter(fh, str(out)) as writer:
+		writer.add("a/IMG_1.jpg", b"one", 1_600_000_000)
+	members = list(iter_members(str(out), {".jpg"}))
+	assert [(m.name, m.data, m.mtime) for m in members] == [("a/IMG_1.jpg", b"one", 1_600_000_000.0)]
+
+
+def test_cli_watermarks_tar_members_into_output_archive(tmp_path):
+	data = _jpeg_with_date()
+	src = tmp_path / "photos" / "trip.tar.gz"
+	src.parent.mkdir()
+	with tarfile.open(src, "w:gz") as tf:
+		for name, payload in (("day1/a.jpg", data), ("readme.txt", b"hi")):
+			info = tarfile.TarInfo(name)
+			info.size = len(payload)
+			tf.addfile(info, io.BytesIO(payload))
+
+	for flags in (["--pipeline"], ["--dedupe"], ["--max-memory", "64"]):
+		refused = run_module(["--path", str(src)] + flags, cwd=os.getcwd())
+		assert refused.returncode == 2 and "not supported with an archive --path" in refused.stderr
+
+	result = run_module(["--path", str(src), "--suffix", "wm", "--font-size", "12", "--jobs", "2", "--verbose"], cwd=os.getcwd())
+	assert result.returncode == 0, result.stderr
+	assert f"Skip {src}:readme.txt: not an included image" in result.stdout
+
+	out_root = tmp_path / "photos" / "photos_watermark"
+	# Only the output archive is written; nothing is extracted next to it
+	assert os.listdir(out_root) == ["trip.tar.gz"]
+	with tarfile.open(out_root / "trip.tar.gz", "r:gz") as tf:
+		assert tf.getnames() == ["day1/a_wm.jpg"]
+		out = tf.extractfile("day1/a_wm.jpg").read()
+	assert out != data
+	with Image.open(io.BytesIO(out)) as im:
+		assert im.format == "JPEG"
+		assert im.getexif()
+
+
+def test_cli_reports_corrupt_archive_and_leaves_no_output(tmp_path):
+	data = _jpeg_with_date()
+	src = tmp_path / "photos"
+	src.mkdir()
+	good = io.BytesIO()
+	with zipfile.ZipFile(good, "w") as zf:
+		zf.writestr("a.jpg", data)
+		zf.writestr("b.jpg", data)
+	# Cut off inside the second member and the central directory
+	(src / "cut.zip").write_bytes(good.getvalue()[: len(good.getvalue()) // 2])
+	with tarfile.open(src / "cut.tar.gz", "w:gz") as tf:
+		for name in ("a.jpg", "b.jpg"):
+			info = tarfile.TarInfo(name)
+			info.size = len(data)
+			tf.addfile(info, io.BytesIO(data))
+	gz = (src / "cut.tar.gz").read_bytes()
+	(src / "cut.tar.gz").write_bytes(gz[: len(gz) * 3 // 4])
+
+	for name in ("cut.zip", "cut.tar.gz"):
+		result = run_module(["--path", str(src / name), "--font-size", "12"], cwd=os.getcwd())
+		assert result.returncode == 1
+		assert f"Error processing {src / name}:" in result.stderr
+		assert "Traceback" not in result.stderr
+	out_root = src / "photos_watermark"
+	assert not out_root.exists() or os.listdir(out_root) == []
@@ -19,6 +19,17 @@ def test_help_shows_usage(tmp_path):
 	assert "usage:" in result.stdout.lower()
 
 
+def test_module_exit_status_is_mains_return_value(tmp_path):
+	from photodate_wm.cli import main
+
+	missing = str(tmp_path / "missing")
+	expected = main(["--path", missing])
+	assert expected not in (0, None)
+	result = run_module(["--path", missing], cwd=os.getcwd())
+	assert result.returncode == expected
+	assert "Traceback" not in result.stderr
+
+
 def test_dry_run_enumerates_files(tmp_path):
 	project_root = os.getcwd()
 	images_dir = tmp_path / "images"
@@ -30,9 +41,79 @@ def test_dry_run_enumerates_files(tmp_path):
 	result = run_module(["--path", str(images_dir), "--dry-run"], cwd=project_root)
 	assert result.returncode == 0
 	out = result.stdout
-	assert "DRY RUN:" in out
+	assert out.splitlines()[0] == "DRY RUN: 2 file(s) would be processed"
 	# Should include .jpg and .png (case-insensitive), exclude .txt
 	assert str(img1) in out
 	assert str(img2) in out or str(img2).lower() in out.lower()
 	assert str(img3) not in out
 
+
+def test_skipped_inputs_leave_no_output_dirs(tmp_path):
+	import piexif
+	from PIL import Image
+
+	from photodate_wm.cli import main
+
+	(tmp_path / "dated").mkdir()
+	(tmp_path / "undated").mkdir()
+	Image.new("RGB", (64, 48)).save(tmp_path / "undated" / "a.png")
+	Image.new("RGB", (64, 48)).save(tmp_path / "dated" / "b.jpg")
+	exif = piexif.dump({"0th": {}, "Exif": {piexif.ExifIFD.DateTimeOriginal: b"2022:03:04 05:06:07"}, "GPS": {}, "1st": {}, "thumbnail": None})
+	piexif.insert(exif, str(tmp_path / "dated" / "b.jpg"))
+
+	# The undated input is skipped, which the exit status reports
+	assert main(["--path", str(tmp_path), "--recursive", "--exif-only", "--no-date-cache"]) == 1
+	out_root = tmp_path / f"{tmp_path.name}_watermark"
+	assert (out_root / "dated" / "b.jpg").is_file()
+	assert not (out_root / "undated").exists()
+
+
+def test_iter_candidate_files_streams_sorted_entries_with_stat(tmp_path):
+	from photodate_wm.cli import iter_candidate_files
+
+	(tmp_path / "b").mkdir()
+	(tmp_path / "a").mkdir()
+	(tmp_path / "out").mkdir()
+	for rel in ("z.jpg", "c.jpg", "b/y.jpg", "a/x.png", "a/notes.txt", "out/old.jpg"):
+		(tmp_path / rel).write_bytes(b"data")
+
+	found = list(iter_candidate_files(str(tmp_path), True, [".jpg", ".png"], sort=True, exclude_dirs=[str(tmp_path / "out")]))
+	rels = [os.path.relpath(c.path, tmp_path) for c in found]
+	assert rels == ["c.jpg", "z.jpg", os.path.join("a", "x.png"), os.path.join("b", "y.jpg")]
+	assert all(c.stat.st_size == 4 for c in found)
+
+	flat = iter_candidate_files(str(tmp_path), False, [".jpg"], sort=True)
+	assert [os.path.basename(c.path) for c in flat] == ["c.jpg", "z.jpg"]
+
+
+def test_stdin_stdout_filter(tmp_path):
+	import io
+
+	import piexif
+	from PIL import Image
+
+	from photodate_wm import watermark_bytes
+	from photodate_wm.exif_utils import find_exif_segment
+
+	buf = io.BytesIO()
+	Image.new("RGB", (96, 64)).save(buf, format="JPEG")
+	exif = piexif.dump({"0th": {}, "Exif": {piexif.ExifIFD.DateTimeOriginal: b"2022:03:04 05:06:07"}, "GPS": {}, "1st": {}, "thumbnail": None})
+	data = io.BytesIO()
+	piexif.insert(exif, buf.getvalue(), data)
+	data = data.getvalue()
+
+	env = os.environ.copy()
+	env["PYTHONPATH"] = os.path.join(os.getcwd(), "src") + os.pathsep + env.get("PYTHONPATH", "")
+	cmd = [sys.executable, "-m", "photodate_wm", "--stdin", "--stdout"]
+	result = subprocess.run(cmd, input=data, env=env, capture_output=True, cwd=tmp_path)
+	assert result.returncode == 0, result.stderr
+	assert result.stdout == watermark_bytes(data)
+	assert find_exif_segment(result.stdout) == find_exif_segment(data)
+	assert list(tmp_path.iterdir()) == []
+
+	png = io.BytesIO()
+	Image.new("RGB", (8, 8)).save(png, format="PNG")
+	result = subprocess.run(cmd, input=png.getvalue(), env=env, capture_output=True)
+	assert result.returncode == 1
+	assert result.stdout == b""
+	assert b"no EXIF shooting date" in result.stderr
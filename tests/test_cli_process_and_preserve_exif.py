@@ -5,6 +5,8 @@ import subprocess
 import piexif
 from PIL import Image
 
+from photodate_wm.exif_utils import find_exif_segment
+
 
 def run_module(args, cwd):
 	env = os.environ.copy()
@@ -52,5 +54,53 @@ def test_cli_writes_output_and_preserves_exif(tmp_path):
 		assert val.decode("utf-8").startswith("2021:")
 
 
+def test_cli_copies_original_exif_segment_verbatim(tmp_path):
+	project_root = os.getcwd()
+	inp_dir = tmp_path / "raw"
+	inp_dir.mkdir(parents=True)
+	src = inp_dir / "y.jpg"
+	_create_jpeg_with_exif(str(src), "2020:02:29 10:00:00")
+
+	result = run_module(["--path", str(inp_dir)], cwd=project_root)
+	assert result.returncode == 0, result.stderr
+
+	out_file = inp_dir / f"{inp_dir.name}_watermark" / "y.jpg"
+	original = find_exif_segment(src.read_bytes())
+	assert original is not None
+	assert find_exif_segment(out_file.read_bytes()) == original
+	with Image.open(out_file) as im:
+		assert im.size == (50, 50)
 
 
+def test_jobs_matches_serial_run(tmp_path):
+	project_root = os.getcwd()
+	outputs = {}
+	for jobs in ("1", "3"):
+		inp_dir = tmp_path / f"jobs{jobs}"
+		inp_dir.mkdir()
+		for i in range(5):
+			_create_jpeg_with_exif(str(inp_dir / f"{i}.jpg"), f"2021:0{i + 1}:01 00:00:00")
+		(inp_dir / "broken.jpg").write_bytes(b"not a jpeg")
+		result = run_module(["--path", str(inp_dir), "--jobs", jobs, "--no-date-cache", "--verbose"], cwd=project_root)
+		out_dir = inp_dir / f"{inp_dir.name}_watermark"
+		files = {p.name: p.read_bytes() for p in sorted(out_dir.iterdir()) if not p.name.startswith(".")}
+		outputs[jobs] = (result.returncode, result.stdout.replace(str(inp_dir), "<in>"), result.stderr.replace(str(inp_dir), "<in>"), files)
+	assert outputs["1"] == outputs["3"]
+	assert "Error processing <in>/broken.jpg" in outputs["3"][2]
+
+
+def test_pipeline_matches_serial_run(tmp_path):
+	project_root = os.getcwd()
+	outputs = {}
+	for mode in (["--jobs", "1"], ["--pipeline", "--render-threads", "3", "--queue-size", "2"]):
+		inp_dir = tmp_path / mode[0].strip("-")
+		inp_dir.mkdir()
+		for i in range(6):
+			_create_jpeg_with_exif(str(inp_dir / f"{i}.jpg"), f"2021:0{i + 1}:01 00:00:00")
+		(inp_dir / "broken.jpg").write_bytes(b"not a jpeg")
+		result = run_module(["--path", str(inp_dir), "--no-date-cache", "--verbose", *mode], cwd=project_root)
+		out_dir = inp_dir / f"{inp_dir.name}_watermark"
+		files = {p.name: p.read_bytes() for p in sorted(out_dir.iterdir()) if not p.name.startswith(".")}
+		outputs[mode[0]] = (result.stdout.replace(str(inp_dir), "<in>"), result.stderr.replace(str(inp_dir), "<in>"), files)
+	assert outputs["--jobs"] == outputs["--pipeline"]
+	assert "Error processing <in>/broken.jpg" in outputs["--pipeline"][1]
@@ -0,0 +1,87 @@
+import os
+
+import piexif
+from PIL import Image
+
+from photodate_wm import exif_utils
+from photodate_wm.cli import main
+from photodate_wm.date_cache import DateCache
+from photodate_wm.exif_utils import extract_photo_date_string
+
+
+def _jpeg_with_date(path, dt_str):
+	Image.new("RGB", (16, 16), (10, 20, 30)).save(path, format="JPEG")
+	exif_dict = {"0th": {}, "Exif": {piexif.ExifIFD.DateTimeOriginal: dt_str.encode()}, "GPS": {}, "1st": {}, "thumbnail": None}
+	piexif.insert(piexif.dump(exif_dict), str(path))
+
+
+def test_unchanged_file_is_answered_from_cache(tmp_path, monkeypatch):
+	img = tmp_path / "a.jpg"
+	_jpeg_with_date(img, "2018:05:06 07:08:09")
+	with DateCache(str(tmp_path / "cache.sqlite3")) as cache:
+		assert cache.resolve(str(img)) == ("2018-05-06", "DateTimeOriginal")
+
+		def _fail(*_args, **_kwargs):
+			raise AssertionError("file was reopened")
+		monkeypatch.setattr(exif_utils, "_read_exif_datetime_bytes", _fail)
+		assert extract_photo_date_string(str(img), cache=cache) == "2018-05-06"
+		assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_counters_are_exact_across_threads(tmp_path):
+	from concurrent.futures import ThreadPoolExecutor
+
+	img = tmp_path / "a.jpg"
+	_jpeg_with_date(img, "2018:05:06 07:08:09")
+	with DateCache(str(tmp_path / "cache.sqlite3")) as cache:
+		# Entries are committed without an fsync each
+		assert cache._conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+		cache.resolve(str(img))
+		with ThreadPoolExecutor(8) as pool:
+			list(pool.map(lambda _: cache.resolve(str(img)), range(400)))
+		assert (cache.hits, cache.misses) == (400, 1)
+
+
+def test_modified_file_is_resolved_again(tmp_path):
+	img = tmp_path / "a.jpg"
+	_jpeg_with_date(img, "2018:05:06 07:08:09")
+	with DateCache(str(tmp_path / "cache.sqlite3")) as cache:
+		cache.resolve(str(img))
+		_jpeg_with_date(img, "2020:01:02 03:04:05")
+		os.utime(img, ns=(1, 1))
+		assert cache.resolve(str(img)) == ("2020-01-02", "DateTimeOriginal")
+		assert cache.misses == 2
+
+
+def test_policy_applies_to_cached_mtime_dates(tmp_path):
+	img = tmp_path / "plain.png"
+	Image.new("RGB", (8, 8)).save(img)
+	with DateCache(str(tmp_path / "cache.sqlite3")) as cache:
+		assert extract_photo_date_string(str(img), cache=cache) is not None
+		assert extract_photo_date_string(str(img), exif_only=True, cache=cache) is None
+		assert cache.stats()["by_source"] == {"mtime": 1}
+
+
+def test_prune_and_clear(tmp_path):
+	keep, gone = tmp_path / "keep.jpg", tmp_path / "gone.jpg"
+	_jpeg_with_date(keep, "2018:05:06 07:08:09")
+	_jpeg_with_date(gone, "2018:05:06 07:08:09")
+	with DateCache(str(tmp_path / "cache.sqlite3")) as cache:
+		cache.resolve(str(keep))
+		cache.resolve(str(gone))
+		gone.unlink()
+		assert cache.prune() == 1
+		assert cache.stats()["entries"] == 1
+		assert cache.clear() == 1
+		assert cache.stats()["entries"] == 0
+
+
+def test_cli_cache_commands(tmp_path, capsys):
+	img = tmp_path / "a.jpg"
+	_jpeg_with_date(img, "2018:05:06 07:08:09")
+	cache_path = str(tmp_path / "cache.sqlite3")
+	assert main(["--path", str(img), "--dry-run", "--date-cache-path", cache_path]) == 0
+	assert main(["--cache-stats", "--date-cache-path", cache_path]) == 0
+	out = capsys.readouterr().out
+	assert "Entries: 1" in out
+	assert "DateTimeOriginal: 1" in out
@@ -0,0 +1,78 @@
+import io
+import os
+import sys
+import subprocess
+
+from PIL import Image
+
+from photodate_wm.dedupe import Deduper
+
+
+def run_module(args, cwd):
+	env = os.environ.copy()
+	env["PYTHONPATH"] = os.path.join(cwd, "src") + os.pathsep + env.get("PYTHONPATH", "")
+	cmd = [sys.executable, "-m", "photodate_wm"] + args
+	return subprocess.run(cmd, cwd=cwd, env=env, capture_output=True, text=True)
+
+
+def test_deduper_hashes_only_repeated_sizes(tmp_path):
+	paths = {}
+	for name, data in (("a", b"same"), ("b", b"diff"), ("c", b"same"), ("d", b"longer")):
+		paths[name] = str(tmp_path / name)
+		(tmp_path / name).write_bytes(data)
+	d = Deduper()
+	assert d.original(paths["a"], 4) is None
+	assert d.original(paths["d"], 6) is None
+	assert d.hashed == 0
+	assert d.original(paths["b"], 4) is None
+	assert d.original(paths["c"], 4) == paths["a"]
+	assert d.hashed == 3
+
+
+def test_deduper_reads_large_files_in_full_only_when_prefixes_match(tmp_path, monkeypatch):
+	from photodate_wm import dedupe
+
+	size = dedupe.PREFIX_BYTES * 3
+	head, tail = b"h" * dedupe.PREFIX_BYTES, b"t" * (size - dedupe.PREFIX_BYTES)
+	contents = {"a": head + tail, "b": b"x" + head[1:] + tail, "c": head + tail[:-1] + b"y", "d": head + tail}
+	paths = {}
+	for name, data in contents.items():
+		paths[name] = str(tmp_path / name)
+		(tmp_path / name).write_bytes(data)
+	reads = []
+	real = dedupe._blake2b
+
+	def spy(path, limit=None):
+		reads.append((os.path.basename(path), limit))
+		return real(path, limit)
+
+	monkeypatch.setattr(dedupe, "_blake2b", spy)
+
+	d = Deduper()
+	assert d.original(paths["a"], size) is None
+	assert d.original(paths["b"], size) is None
+	# Different first bytes: neither file is read past the prefix
+	assert all(limit == dedupe.PREFIX_BYTES for _, limit in reads)
+	assert d.original(paths["c"], size) is None
+	assert d.original(paths["d"], size) == paths["a"]
+	assert sorted(name for name, limit in reads if limit is None) == ["a", "c", "d"]
+
+
+def test_cli_dedupe_links_identical_inputs(tmp_path):
+	buf = io.BytesIO()
+	Image.new("RGB", (80, 60)).save(buf, format="JPEG")
+	src = tmp_path / "albums"
+	for rel, mtime in (("a/1.jpg", 1_600_000_000), ("b/1.jpg", 1_600_000_000), ("c/1.jpg", 1_500_000_000)):
+		(src / rel).parent.mkdir(parents=True, exist_ok=True)
+		(src / rel).write_bytes(buf.getvalue())
+		os.utime(src / rel, (mtime, mtime))
+
+	result = run_module(["--path", str(src), "--recursive", "--sort", "--dedupe", "--verbose", "--font-size", "12"], cwd=os.getcwd())
+	assert result.returncode == 0, result.stderr
+	assert "1 render(s) saved by --dedupe" in result.stdout
+
+	out = src / "albums_watermark"
+	assert os.path.samefile(out / "a" / "1.jpg", out / "b" / "1.jpg")
+	# Same bytes but no EXIF: the mtime date differs, so this copy is rendered on its own
+	assert not os.path.samefile(out / "a" / "1.jpg", out / "c" / "1.jpg")
+	assert (out / "a" / "1.jpg").read_bytes() != (out / "c" / "1.jpg").read_bytes()
@@ -1,10 +1,11 @@
+import io
 import os
 from datetime import datetime
 
 import piexif
 from PIL import Image
 
-from photodate_wm.exif_utils import extract_photo_date_string
+from photodate_wm.exif_utils import _read_exif_datetime_header, extract_photo_date_string, find_exif_segment, splice_exif_segment
 
 
 def _create_temp_jpeg_with_exif(path: str, dt_str: str) -> None:
@@ -38,5 +39,45 @@ def test_returns_none_when_exif_only_and_no_exif(tmp_path):
 	assert extract_photo_date_string(str(file_path), fallback_mtime=True, exif_only=True) is None
 
 
+class _CountingStream(io.BytesIO):
+	def __init__(self, data: bytes):
+		super().__init__(data)
+		self.bytes_read = 0
 
+	def read(self, size=-1):
+		data = super().read(size)
+		self.bytes_read += len(data)
+		return data
 
+
+def test_header_reader_stops_after_a_few_kb(tmp_path):
+	file_path = tmp_path / "big.jpg"
+	Image.effect_noise((800, 600), 64).convert("RGB").save(file_path, format="JPEG")
+	exif_dict = {"0th": {piexif.ImageIFD.DateTime: b"2001:01:01 00:00:00"}, "Exif": {}, "GPS": {}, "1st": {}, "thumbnail": None}
+	exif_dict["Exif"][piexif.ExifIFD.DateTimeDigitized] = b"2019:07:08 09:10:11"
+	piexif.insert(piexif.dump(exif_dict), str(file_path))
+	stream = _CountingStream(file_path.read_bytes())
+	assert _read_exif_datetime_header(stream) == ("2019:07:08 09:10:11", "DateTimeDigitized")
+	assert stream.bytes_read < 4096
+	assert extract_photo_date_string(str(file_path), fallback_mtime=False, exif_only=True) == "2019-07-08"
+
+
+def test_extracts_date_from_tiff_header(tmp_path):
+	file_path = tmp_path / "scan.tif"
+	Image.new("RGB", (10, 10)).save(file_path, tiffinfo={piexif.ImageIFD.DateTime: "2020:05:06 07:08:09"})
+	assert extract_photo_date_string(str(file_path), fallback_mtime=False, exif_only=True) == "2020-05-06"
+
+
+def test_splice_keeps_jfif_app0_first():
+	buf = io.BytesIO()
+	Image.new("RGB", (10, 10)).save(buf, format="JPEG")
+	plain = buf.getvalue()
+	assert plain[2:4] == b"\xff\xe0"
+	app0_end = 4 + int.from_bytes(plain[4:6], "big")
+	segment = b"\xff\xe1" + (8 + 2).to_bytes(2, "big") + b"Exif\x00\x00" + b"II"
+	spliced = splice_exif_segment(plain, segment)
+	assert spliced[:app0_end] == plain[:app0_end]
+	assert spliced[app0_end:app0_end + len(segment)] == segment
+	# Splicing again replaces the segment instead of adding a second one
+	assert splice_exif_segment(spliced, segment) == spliced
+	assert find_exif_segment(spliced) == segment
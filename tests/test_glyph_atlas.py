@@ -0,0 +1,35 @@
+import pytest
+from PIL import Image, ImageChops
+
+from photodate_wm.glyph_atlas import GlyphAtlas
+from photodate_wm.render import _load_font, _render_text_stamp
+
+
+DATES = ["2024-01-02", "1999-12-31", "2000-11-07", "1987-04-19"]
+WHITE = (255, 255, 255, 255)
+BLACK = (0, 0, 0, 255)
+SHADOW = (0, 0, 0, 128)
+
+
+def _max_diff(a: Image.Image, b: Image.Image) -> int:
+	assert a.size == b.size
+	return max(hi for _, hi in ImageChops.difference(a, b).getextrema())
+
+
+@pytest.mark.parametrize("font_size", [9, 14, 20, 32, 57])
+@pytest.mark.parametrize("stroke_width,shadow_offset", [(0, (0, 0)), (2, (0, 0)), (1, (3, 2))])
+def test_atlas_stamp_matches_freetype(font_size, stroke_width, shadow_offset):
+	font = _load_font(None, font_size)
+	if not GlyphAtlas(font, stroke_width).supports("2024-01-02"):
+		pytest.skip("default font has sub-pixel metrics")
+	for text in DATES:
+		style = (text, None, font_size, WHITE, stroke_width, BLACK, shadow_offset, SHADOW, 0)
+		expected = _render_text_stamp(*style, glyph_atlas=False)
+		actual = _render_text_stamp(*style, glyph_atlas=True)
+		assert _max_diff(expected, actual) <= 2
+
+
+def test_atlas_rejects_non_date_text():
+	atlas = GlyphAtlas(_load_font(None, 20))
+	assert not atlas.supports("2024/01/02")
+	assert not atlas.supports("")
@@ -0,0 +1,75 @@
+import csv
+import io
+import json
+
+import piexif
+from PIL import Image
+
+from photodate_wm.cli import main
+from photodate_wm.inventory import format_histogram, iter_inventory, write_inventory
+
+
+def _jpeg_with_date(path, dt_str, size=(40, 30)):
+	Image.new("RGB", size, (10, 20, 30)).save(path, format="JPEG")
+	exif_dict = {"0th": {}, "Exif": {piexif.ExifIFD.DateTimeOriginal: dt_str.encode()}, "GPS": {}, "1st": {}, "thumbnail": None}
+	piexif.insert(piexif.dump(exif_dict), str(path))
+
+
+def test_inventory_keeps_input_order_and_reads_dimensions(tmp_path):
+	files = []
+	for i in range(20):
+		path = tmp_path / f"{i:02d}.jpg"
+		_jpeg_with_date(path, f"2020:01:{i % 3 + 1:02d} 00:00:00", size=(40 + i, 30))
+		files.append(str(path))
+	records = list(iter_inventory(files, threads=4))
+	assert [r["path"] for r in records] == files
+	assert records[5]["width"] == 45 and records[5]["height"] == 30
+	assert records[5]["date"] == "2020-01-03"
+	assert records[5]["date_source"] == "DateTimeOriginal"
+
+
+def test_scan_opens_each_file_once(tmp_path, monkeypatch):
+	import builtins
+
+	from photodate_wm.cli import iter_candidate_files
+
+	_jpeg_with_date(tmp_path / "a.jpg", "2019:02:03 04:05:06")
+	Image.new("RGB", (8, 6)).save(tmp_path / "b.png")
+	files = list(iter_candidate_files(str(tmp_path), False, [".jpg", ".png"], sort=True))
+	for c in files:
+		assert c.stat is not None
+	opened = []
+	real_open = builtins.open
+
+	def counting_open(file, *args, **kwargs):
+		if isinstance(file, str):
+			opened.append(file)
+		return real_open(file, *args, **kwargs)
+
+	monkeypatch.setattr(builtins, "open", counting_open)
+	records = list(iter_inventory(files, threads=2))
+	assert sorted(opened) == sorted(c.path for c in files)
+	assert [(r["width"], r["height"]) for r in records] == [(40, 30), (8, 6)]
+	assert [r["size"] for r in records] == [c.stat.st_size for c in files]
+	assert records[0]["date"] == "2019-02-03"
+
+
+def test_write_inventory_csv_and_histogram(tmp_path):
+	a, b = tmp_path / "a.jpg", tmp_path / "b.png"
+	_jpeg_with_date(a, "2019:02:03 04:05:06")
+	Image.new("RGB", (8, 8)).save(b)
+	out = io.StringIO()
+	histogram = write_inventory(iter_inventory([str(a), str(b)], exif_only=True), out, "csv")
+	rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+	assert rows[0]["date"] == "2019-02-03"
+	assert rows[1]["date"] == "" and rows[1]["width"] == "8"
+	assert format_histogram(histogram) == ["2019-02-03\t1", "no date\t1", "total\t2"]
+
+
+def test_cli_scan_writes_jsonl(tmp_path, capsys):
+	_jpeg_with_date(tmp_path / "a.jpg", "2019:02:03 04:05:06")
+	assert main(["--path", str(tmp_path), "--scan", "--no-date-cache"]) == 0
+	captured = capsys.readouterr()
+	record = json.loads(captured.out.splitlines()[0])
+	assert record["date"] == "2019-02-03"
+	assert "total\t1" in captured.err
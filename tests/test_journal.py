@@ -0,0 +1,90 @@
+import json
+import os
+
+import pytest
+from PIL import Image
+
+from photodate_wm.cli import _atomic_path, main
+from photodate_wm.journal import JOURNAL_NAME, Journal, JournalMismatch
+
+
+def test_resume_skips_done_and_retries_failed(tmp_path):
+	journal_dir = tmp_path / "out"
+	with Journal(str(journal_dir), "s1") as journal:
+		journal.record("/a.jpg", "written")
+		journal.record("/b.jpg", "failed", "boom")
+		journal.record("/c.jpg", "skipped")
+	# Simulate a crash in the middle of a line
+	with open(journal_dir / JOURNAL_NAME, "a", encoding="utf-8") as fh:
+		fh.write('{"path": "/d.j')
+
+	with Journal(str(journal_dir), "s1", resume=True) as journal:
+		assert journal.completed == {"/a.jpg": "written", "/c.jpg": "skipped"}
+		journal.record("/b.jpg", "written")
+	lines = (journal_dir / JOURNAL_NAME).read_text(encoding="utf-8").splitlines()
+	assert json.loads(lines[-1]) == {"path": "/b.jpg", "status": "written"}
+
+	with pytest.raises(JournalMismatch):
+		Journal(str(journal_dir), "s2", resume=True)
+
+
+def test_atomic_path_leaves_nothing_on_failure(tmp_path):
+	out = tmp_path / "x.png"
+	with pytest.raises(RuntimeError):
+		with _atomic_path(str(out)) as tmp:
+			Image.new("RGB", (4, 4)).save(tmp)
+			raise RuntimeError("killed mid-write")
+	assert list(tmp_path.iterdir()) == []
+
+	with _atomic_path(str(out)) as tmp:
+		Image.new("RGB", (4, 4)).save(tmp)
+	assert [p.name for p in tmp_path.iterdir()] == ["x.png"]
+
+
+def test_cli_resume_does_not_revisit_finished_inputs(tmp_path, capsys):
+	inp = tmp_path / "inp"
+	inp.mkdir()
+	for name in ("a.png", "b.png"):
+		Image.new("RGB", (32, 32)).save(inp / name)
+	(inp / "c.png").write_bytes(b"broken")
+	out_dir = inp / "inp_watermark"
+	args = ["--path", str(inp), "--jobs", "1", "--no-date-cache", "--verbose"]
+
+	# Runs without --resume keep no journal
+	assert main(args) == 1
+	assert not (out_dir / JOURNAL_NAME).exists()
+	assert main(args + ["--resume"]) == 1
+	# Outputs removed after the run are not noticed: finished work is not even stat-checked
+	(out_dir / "a.png").unlink()
+	Image.new("RGB", (32, 32)).save(inp / "c.png")
+	capsys.readouterr()
+	assert main(args + ["--resume"]) == 0
+	out = capsys.readouterr().out
+	assert f"Already done: {inp / 'a.png'}" in out
+	assert not (out_dir / "a.png").exists()
+	assert (out_dir / "c.png").exists()
+
+	assert main(args + ["--resume", "--color", "#000000"]) == 2
+
+
+def test_plan_does_not_stat_journaled_inputs(tmp_path):
+	from photodate_wm.cli import CandidateFile, _plan_tasks, build_arg_parser
+
+	class Entry:
+		def __init__(self, path):
+			self.path = path
+			self.stats = 0
+
+		def stat(self):
+			self.stats += 1
+			return os.stat(self.path)
+
+	for name in ("done.jpg", "new.jpg"):
+		(tmp_path / name).write_bytes(b"data")
+	entries = {name: Entry(str(tmp_path / name)) for name in ("done.jpg", "new.jpg")}
+	files = [CandidateFile(e.path, entry=e) for e in entries.values()]
+	args = build_arg_parser().parse_args(["--path", str(tmp_path)])
+	tasks = list(_plan_tasks(files, args, str(tmp_path / "out"), None, "s", {entries["done.jpg"].path: "written"}))
+	assert [t.done is not None for t in tasks] == [True, False]
+	assert entries["done.jpg"].stats == 0
+	assert entries["new.jpg"].stats == 1
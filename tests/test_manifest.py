@@ -0,0 +1,52 @@
+import os
+
+import piexif
+from PIL import Image
+
+from photodate_wm.cli import main
+
+
+def _jpeg_with_date(path, dt_str):
+	Image.new("RGB", (40, 30), (90, 90, 90)).save(path, format="JPEG")
+	exif_dict = {"0th": {}, "Exif": {piexif.ExifIFD.DateTimeOriginal: dt_str.encode()}, "GPS": {}, "1st": {}, "thumbnail": None}
+	piexif.insert(piexif.dump(exif_dict), str(path))
+
+
+def _run(inp_dir, *extra):
+	return main(["--path", str(inp_dir), "--jobs", "1", "--no-date-cache", "--incremental", "--verbose", *extra])
+
+
+def test_incremental_skips_unchanged_and_rerenders_on_new_settings(tmp_path, capsys):
+	inp_dir = tmp_path / "inp"
+	inp_dir.mkdir()
+	_jpeg_with_date(inp_dir / "a.jpg", "2020:03:04 05:06:07")
+	out_file = inp_dir / "inp_watermark" / "a.jpg"
+
+	assert _run(inp_dir) == 0
+	first = out_file.read_bytes()
+	capsys.readouterr()
+
+	assert _run(inp_dir) == 0
+	assert "Up to date" in capsys.readouterr().out
+
+	# Changed settings replace the output even without --overwrite
+	assert _run(inp_dir, "--color", "#FF0000") == 0
+	assert "Up to date" not in capsys.readouterr().out
+	assert out_file.read_bytes() != first
+
+
+def test_manifest_hash_ignores_touched_inputs(tmp_path, capsys):
+	inp_dir = tmp_path / "inp"
+	inp_dir.mkdir()
+	src = inp_dir / "a.jpg"
+	_jpeg_with_date(src, "2020:03:04 05:06:07")
+	assert _run(inp_dir, "--manifest-hash") == 0
+	capsys.readouterr()
+
+	os.utime(src, ns=(10**18, 10**18))
+	assert _run(inp_dir, "--manifest-hash") == 0
+	assert "Up to date" in capsys.readouterr().out
+	# Without hashing a new mtime alone makes the input stale
+	os.utime(src, ns=(2 * 10**18, 2 * 10**18))
+	assert _run(inp_dir) == 0
+	assert "Up to date" not in capsys.readouterr().out
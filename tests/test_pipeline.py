@@ -0,0 +1,73 @@
+import threading
+import time
+
+import pytest
+
+from photodate_wm.pipeline import Finished, Stage, run_pipeline
+
+
+def test_results_keep_input_order_across_stages():
+	def slow_first(x):
+		# Early items finish last in the first stage
+		time.sleep(0.01 * (5 - x % 5))
+		return x
+
+	stages = [Stage("a", slow_first, 4), Stage("b", lambda x: x * 10, 3)]
+	out = list(run_pipeline(range(20), stages, queue_size=2))
+	assert [item for item, _, _ in out] == list(range(20))
+	assert [value for _, value, _ in out] == [x * 10 for x in range(20)]
+
+
+def test_errors_and_finished_skip_later_stages():
+	seen = []
+
+	def first(x):
+		if x == 1:
+			raise ValueError("bad input")
+		if x == 2:
+			return Finished("early")
+		return x
+
+	def second(x):
+		seen.append(x)
+		return x + 100
+
+	out = list(run_pipeline(range(4), [Stage("a", first, 2), Stage("b", second, 2)]))
+	assert out[1][1] is None and isinstance(out[1][2], ValueError)
+	assert out[2] == (2, "early", None)
+	assert out[3] == (3, 103, None)
+	assert sorted(seen) == [0, 3]
+
+
+def test_in_flight_items_are_bounded():
+	active = []
+	peak = [0]
+	lock = threading.Lock()
+
+	def track(x):
+		with lock:
+			active.append(x)
+			peak[0] = max(peak[0], len(active))
+		return x
+
+	def gate(x):
+		time.sleep(0.002)
+		return x
+
+	consumed = 0
+	for item, _, _ in run_pipeline(range(200), [Stage("track", track, 1), Stage("gate", gate, 1)], queue_size=2):
+		with lock:
+			active.remove(item)
+		consumed += 1
+	assert consumed == 200
+	# queue_size per stage plus one item per worker thread
+	assert peak[0] <= 2 * 2 + 2
+
+
+def test_feeder_errors_are_raised():
+	def items():
+		yield 1
+		raise OSError("scan failed")
+
+	with pytest.raises(OSError):
+		list(run_pipeline(items(), [Stage("a", lambda x: x)]))
@@ -1,6 +1,20 @@
+import pytest
 from PIL import Image
 
-from photodate_wm.render import draw_text_watermark
+from photodate_wm.render import (
+	PreparedWatermark,
+	StampCache,
+	_composite_layer,
+	_load_font,
+	clear_font_cache,
+	clear_stamp_cache,
+	composite_layer_batch,
+	draw_image_watermark,
+	draw_text_watermark,
+	draw_text_watermark_batch,
+	font_cache_info,
+	stamp_cache_info,
+)
 
 
 def test_draw_text_positions(tmp_path):
@@ -12,5 +26,128 @@ def test_draw_text_positions(tmp_path):
 		assert out.mode in ("RGB", "RGBA")
 
 
+def test_font_cache_reuses_loaded_font():
+	clear_font_cache()
+	f1 = _load_font(None, 21)
+	f2 = _load_font(None, 21)
+	assert f1 is f2
+	info = font_cache_info()
+	assert info.hits >= 1
+	assert info.misses >= 1
+	assert info.currsize <= info.maxsize
 
 
+def test_stamp_cache_reuses_rendered_text():
+	clear_stamp_cache()
+	img = Image.new("RGB", (200, 100), color=(10, 10, 10))
+	first = draw_text_watermark(img, "2024-01-02", font_size=20)
+	second = draw_text_watermark(img, "2024-01-02", font_size=20)
+	assert first.tobytes() == second.tobytes()
+	info = stamp_cache_info()
+	assert info["misses"] == 1
+	assert info["hits"] == 1
+
+
+def test_stamp_cache_evicts_least_recently_used():
+	cache = StampCache(max_bytes=2 * 10 * 10 * 4)
+	for key in ("a", "b", "c"):
+		cache.put(key, Image.new("RGBA", (10, 10)))
+	assert cache.get("a") is None
+	assert cache.get("c") is not None
+	assert len(cache) == 2
+	assert cache.info()["evictions"] == 1
+	assert cache.nbytes <= cache.max_bytes
+
+
+def _legacy_full_frame_composite(image, layer, xy):
+	img_rgba = image.convert("RGBA")
+	overlay = Image.new("RGBA", img_rgba.size, (0, 0, 0, 0))
+	overlay.paste(layer, xy, layer)
+	composited = Image.alpha_composite(img_rgba, overlay)
+	return composited if image.mode == "RGBA" else composited.convert("RGB")
+
+
+def test_region_composite_matches_full_frame():
+	base = Image.linear_gradient("L").resize((120, 90))
+	images = [
+		Image.merge("RGB", (base, base.rotate(90), base.rotate(180))),
+		Image.merge("RGBA", (base, base.rotate(90), base.rotate(180), base.rotate(270))),
+		base,
+		base.convert("P"),
+		base.convert("CMYK"),
+		base.convert("LA"),
+		# Real transparency: the blend must see the source alpha
+		Image.merge("LA", (base, base.rotate(90))),
+		Image.merge("RGBA", (base, base, base, base.rotate(180))).convert("PA"),
+	]
+	transparent_key = base.convert("P")
+	transparent_key.info["transparency"] = 0
+	images.append(transparent_key)
+	layer = Image.new("RGBA", (40, 20), (0, 0, 0, 0))
+	layer.paste((255, 200, 0, 128), (5, 5, 35, 15))
+	for img in images:
+		for xy in [(10, 10), (100, 80), (-15, -5), (300, 300)]:
+			expected = _legacy_full_frame_composite(img, layer, xy)
+			actual = _composite_layer(img, layer, xy)
+			assert actual.mode == expected.mode
+			assert actual.tobytes() == expected.tobytes(), (img.mode, xy)
+
+
+def test_prepared_watermark_matches_plain_and_caches_variants():
+	img = Image.new("RGB", (200, 100), color=(10, 10, 10))
+	logo = Image.new("RGBA", (40, 20), (255, 0, 0, 200))
+	prepared = PreparedWatermark(logo)
+	for _ in range(3):
+		expected = draw_image_watermark(img, logo, scale_percent=25, opacity=0.4, rotation_deg=30)
+		actual = draw_image_watermark(img, prepared, scale_percent=25, opacity=0.4, rotation_deg=30)
+		assert actual.tobytes() == expected.tobytes()
+	info = prepared.variants.info()
+	assert info["misses"] == 1
+	assert info["hits"] == 2
+
+
+def test_numpy_batch_matches_pillow_composite():
+	np = pytest.importorskip("numpy")
+	rng = np.random.default_rng(0)
+	images = [Image.fromarray(rng.integers(0, 256, (60, 80, 4), dtype=np.uint8), "RGBA") for _ in range(3)]
+	images.append(images[0].convert("RGB"))
+	layer = Image.fromarray(rng.integers(0, 256, (25, 30, 4), dtype=np.uint8), "RGBA")
+	for xy in [(5, 5), (60, 45), (-10, -3)]:
+		for mode in ("RGBA", "RGB"):
+			batch = [im for im in images if im.mode == mode]
+			expected = composite_layer_batch(batch, layer, xy, backend="pillow")
+			actual = composite_layer_batch(batch, layer, xy, backend="numpy")
+			for e, a in zip(expected, actual):
+				assert a.mode == e.mode
+				assert a.tobytes() == e.tobytes()
+
+
+def test_numpy_backend_text_watermark_matches_pillow():
+	pytest.importorskip("numpy")
+	imgs = [Image.new("RGB", (200, 100), color=(10 * i, 20, 30)) for i in range(4)]
+	expected = [draw_text_watermark(im, "2024-01-02", font_size=20, opacity=0.6) for im in imgs]
+	actual = draw_text_watermark_batch(imgs, "2024-01-02", font_size=20, opacity=0.6)
+	assert [im.tobytes() for im in actual] == [im.tobytes() for im in expected]
+	single = draw_text_watermark(imgs[0], "2024-01-02", font_size=20, opacity=0.6, backend="numpy")
+	assert single.tobytes() == expected[0].tobytes()
+
+
+def test_keep_mode_preserves_source_mode():
+	base = Image.linear_gradient("L").resize((120, 90))
+	layer = Image.new("RGBA", (40, 20), (255, 255, 255, 255))
+	# Transparent inside the box: (70..110, 60..70) is covered, (70..110, 70..80) is not
+	layer.paste((0, 0, 0, 0), (0, 10, 40, 20))
+	cmyk = Image.merge("CMYK", (base, base.rotate(90), base.rotate(180), Image.new("L", base.size, 128)))
+	for img in [base, base.convert("LA"), base.convert("CMYK"), cmyk, base.convert("P")]:
+		out = _composite_layer(img, layer, (70, 60), keep_mode=True)
+		assert out.mode == img.mode
+		assert out.size == img.size
+		# Pixels outside the watermark box are untouched
+		assert out.crop((0, 0, 60, 50)).tobytes() == img.crop((0, 0, 60, 50)).tobytes()
+		# So are pixels inside the box that the layer does not cover
+		assert out.crop((70, 70, 110, 80)).tobytes() == img.crop((70, 70, 110, 80)).tobytes(), img.mode
+		assert out.crop((70, 60, 110, 70)).tobytes() != img.crop((70, 60, 110, 70)).tobytes()
+	gray = _composite_layer(base, layer, (70, 60), keep_mode=True)
+	assert gray.tobytes() == _composite_layer(base, layer, (70, 60)).convert("L").tobytes()
+	text_out = draw_text_watermark(base.convert("CMYK"), "2024-01-02", font_size=12, keep_mode=True)
+	assert text_out.mode == "CMYK"
@@ -0,0 +1,64 @@
+import threading
+import time
+
+from PIL import Image
+
+from photodate_wm.cli import main
+from photodate_wm.scheduler import MemoryBudget, estimate_decoded_bytes
+
+
+def test_estimate_reads_header_only(tmp_path):
+	path = tmp_path / "big.png"
+	Image.new("RGB", (300, 200)).save(path)
+	size = path.stat().st_size
+	assert estimate_decoded_bytes(str(path)) == 300 * 200 * (3 + 4) + size
+	assert estimate_decoded_bytes(str(path), cap=1000) == 1000
+	(tmp_path / "junk.png").write_bytes(b"nope")
+	assert estimate_decoded_bytes(str(tmp_path / "junk.png")) == 0
+
+
+def test_budget_serializes_oversized_and_overlaps_small():
+	budget = MemoryBudget(100)
+	running = []
+	peak_small = [0]
+	lock = threading.Lock()
+
+	def work(nbytes, tag):
+		budget.acquire(nbytes)
+		with lock:
+			running.append(tag)
+			if tag == "big":
+				assert running == ["big"]
+			peak_small[0] = max(peak_small[0], len(running))
+		time.sleep(0.02)
+		with lock:
+			running.remove(tag)
+		budget.release(nbytes)
+
+	threads = [threading.Thread(target=work, args=(30, f"s{i}")) for i in range(3)]
+	threads.insert(1, threading.Thread(target=work, args=(500, "big")))
+	for t in threads:
+		t.start()
+		time.sleep(0.001)
+	for t in threads:
+		t.join()
+	assert budget.in_use == 0
+	assert budget.peak >= 500
+	assert peak_small[0] >= 2
+
+
+def test_closed_budget_stops_blocking():
+	budget = MemoryBudget(10)
+	budget.acquire(10)
+	waiter = threading.Thread(target=budget.acquire, args=(10,))
+	waiter.start()
+	budget.close()
+	waiter.join(timeout=1)
+	assert not waiter.is_alive()
+
+
+def test_pipeline_run_under_a_tiny_budget(tmp_path):
+	for i in range(4):
+		Image.new("RGB", (64, 48), (i * 40, 0, 0)).save(tmp_path / f"{i}.png")
+	assert main(["--path", str(tmp_path), "--pipeline", "--max-memory", "1", "--no-date-cache"]) == 0
+	assert len(list((tmp_path / f"{tmp_path.name}_watermark").glob("*.png"))) == 4
@@ -0,0 +1,150 @@
+import argparse
+import asyncio
+import http.client
+import io
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+
+from photodate_wm.cli import build_arg_parser
+from photodate_wm.server import JobServer, RequestError, job_args
+
+
+def test_job_args_parses_overrides_and_rejects_unknown():
+	base = build_arg_parser().parse_args([])
+	args = job_args(base, {"font_size": "40", "keep_mode": "true", "position": "tl"})
+	assert (args.font_size, args.keep_mode, args.position) == (40, True, "tl")
+	assert base.font_size == 32
+	with pytest.raises(RequestError) as exc:
+		job_args(base, {"path": "/etc"})
+	assert exc.value.status == 400
+	with pytest.raises(RequestError):
+		job_args(base, {"font_size": "big"})
+	for key, value in (("output_dir_name", "/tmp"), ("suffix", "../x"), ("overwrite", "true"), ("font_path", "/etc/passwd")):
+		with pytest.raises(RequestError) as exc:
+			job_args(base, {key: value})
+		assert exc.value.status == 400
+
+
+class _Writer:
+	def __init__(self):
+		self.data = b""
+		self.closed = False
+
+	def write(self, data):
+		self.data += data
+
+	async def drain(self):
+		pass
+
+	def close(self):
+		self.closed = True
+
+
+def test_full_queue_refuses_a_body_before_reading_it():
+	async def scenario():
+		server = JobServer(argparse.Namespace(), workers=1, max_queue=0)
+		server.running = 1
+		reader = asyncio.StreamReader()
+		# Only the head arrives: reading the announced body would block forever
+		reader.feed_data(b"POST /watermark HTTP/1.1\r\nContent-Length: 1000000\r\n\r\n")
+		writer = _Writer()
+		await asyncio.wait_for(server.handle(reader, writer), 2)
+		return server, writer
+
+	server, writer = asyncio.run(scenario())
+	assert writer.data.startswith(b"HTTP/1.1 503 ") and writer.closed
+	assert (server.rejected, server.receiving) == (1, 0)
+
+
+def test_limits_reject_and_time_out():
+	release = threading.Event()
+
+	async def scenario():
+		server = JobServer(argparse.Namespace(), workers=1, timeout=0.2, max_queue=0)
+		server._slots = asyncio.Semaphore(1)
+		server.pool = ThreadPoolExecutor(1)
+		try:
+			slow = asyncio.ensure_future(server.submit(release.wait))
+			await asyncio.sleep(0.05)
+			with pytest.raises(RequestError) as full:
+				await server.submit(int)
+			assert full.value.status == 503
+			with pytest.raises(RequestError) as late:
+				await slow
+			assert late.value.status == 504
+			release.set()
+			# The worker slot frees up once the timed-out job really ends
+			await asyncio.sleep(0.05)
+			assert await server.submit(int, "7") == 7
+			return server.status()
+		finally:
+			release.set()
+			server.pool.shutdown()
+
+	status = asyncio.run(scenario())
+	assert (status["rejected"], status["timeouts"], status["completed"]) == (1, 1, 1)
+	assert status["latency_ms"]["p50"] is not None
+
+
+@pytest.fixture
+def server_url():
+	env = dict(os.environ)
+	env["PYTHONPATH"] = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src") + os.pathsep + env.get("PYTHONPATH", "")
+	cmd = [sys.executable, "-u", "-m", "photodate_wm.cli", "--serve", "--serve-port", "0", "--jobs", "1", "--no-date-cache"]
+	proc = subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+	try:
+		line = proc.stdout.readline()
+		assert line.startswith("Serving on http://"), line + proc.stderr.read()
+		yield line.split()[2][len("http://"):]
+		proc.send_signal(signal.SIGTERM)
+		proc.communicate(timeout=10)
+		assert proc.returncode == 0
+	finally:
+		if proc.poll() is None:
+			proc.kill()
+
+
+def _request(address, method, target, body=None, headers=None):
+	host, port = address.split(":")
+	conn = http.client.HTTPConnection(host, int(port), timeout=10)
+	conn.request(method, target, body=body, headers=headers or {})
+	resp = conn.getresponse()
+	return resp.status, resp.getheader("Content-Type"), resp.read()
+
+
+def test_server_watermarks_bytes_and_paths(server_url, tmp_path):
+	buf = io.BytesIO()
+	Image.new("RGB", (80, 60), (0, 0, 0)).save(buf, format="PNG")
+	status, content_type, data = _request(server_url, "POST", "/watermark?date=2024-05-06&font_size=12", buf.getvalue())
+	assert (status, content_type) == (200, "image/png")
+	with Image.open(io.BytesIO(data)) as out:
+		assert out.size == (80, 60)
+		assert out.getextrema() != ((0, 0), (0, 0), (0, 0))
+
+	status, _, data = _request(server_url, "POST", "/watermark", buf.getvalue())
+	assert status == 422 and b"no EXIF shooting date" in data
+
+	src = tmp_path / "a.jpg"
+	Image.new("RGB", (80, 60)).save(src)
+	job = json.dumps({"path": str(src), "settings": {"font_size": 12}})
+	status, _, data = _request(server_url, "POST", "/watermark", job, {"Content-Type": "application/json"})
+	assert status == 200
+	reply = json.loads(data)
+	assert reply["status"] == "written"
+	assert os.path.exists(reply["output"]) and reply["output"].endswith(os.path.join("_watermark", "a.jpg"))
+
+	assert _request(server_url, "GET", "/nope")[0] == 404
+	status, _, data = _request(server_url, "GET", "/status")
+	report = json.loads(data)
+	assert status == 200
+	assert (report["completed"], report["failed"], report["queued"]) == (2, 1, 0)
+	assert set(report["latency_ms"]) == {"p50", "p90", "p99"}
@@ -0,0 +1,59 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from PIL import Image
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src")
+
+# Modules that only the rendering, server, watch and GUI paths may pull in
+HEAVY = ("PIL", "piexif", "numpy", "asyncio", "concurrent.futures.process", "ctypes", "tarfile", "zipfile", "photodate_wm.render", "photodate_wm.gui_app")
+
+_PROBE = """
+import json, sys
+{setup}
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def _env():
+	env = dict(os.environ)
+	env["PYTHONPATH"] = SRC + os.pathsep + env.get("PYTHONPATH", "")
+	return env
+
+
+def _modules_after(setup):
+	proc = subprocess.run([sys.executable, "-c", _PROBE.format(setup=setup)], env=_env(), capture_output=True, text=True)
+	assert proc.returncode == 0, proc.stderr
+	return set(json.loads(proc.stdout.splitlines()[-1]))
+
+
+def _cli(argv):
+	return f"""
+import contextlib, io
+from photodate_wm.cli import main
+with contextlib.redirect_stdout(io.StringIO()):
+	try:
+		main({argv!r})
+	except SystemExit:
+		pass
+"""
+
+
+def test_help_imports_no_heavy_modules():
+	loaded = _modules_after(_cli(["-h"]))
+	assert not [m for m in HEAVY if m in loaded]
+
+
+def test_dry_run_imports_no_heavy_modules(tmp_path):
+	Image.new("RGB", (8, 8)).save(tmp_path / "a.jpg")
+	loaded = _modules_after(_cli(["--dry-run", "--no-date-cache", "--path", str(tmp_path)]))
+	assert not [m for m in HEAVY if m in loaded]
+
+
+def test_gui_window_needs_no_pillow():
+	pytest.importorskip("tkinter")
+	loaded = _modules_after("import photodate_wm.gui_app")
+	assert not [m for m in HEAVY + ("photodate_wm.cli", "tkinterdnd2") if m in loaded and m != "photodate_wm.gui_app"]
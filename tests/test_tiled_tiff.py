@@ -0,0 +1,168 @@
+import os
+import struct
+import zlib
+
+import pytest
+from PIL import Image
+
+from photodate_wm.render import draw_text_watermark
+from photodate_wm.tiled_tiff import TiledMemoryExceeded, TiledUnsupported, draw_text_watermark_tiled, read_tiff_layout, tiff_pixel_count
+
+
+def _gradient(mode: str, size=(150, 100)) -> Image.Image:
+	base = Image.linear_gradient("L").resize(size)
+	if mode == "L":
+		return base
+	bands = [base, base.rotate(90).resize(size), base.transpose(Image.Transpose.FLIP_LEFT_RIGHT), base.rotate(180)]
+	return Image.merge(mode, bands[: len(mode)])
+
+
+def _write_tiled_tiff(path, im: Image.Image, tile=32, deflate=False) -> None:
+	# Minimal little-endian tiled TIFF writer (Pillow only writes strips)
+	spp = len(im.mode)
+	photometric = {"L": 1, "RGB": 2, "RGBA": 2, "CMYK": 5}[im.mode]
+	across, down = -(-im.width // tile), -(-im.height // tile)
+	chunks = []
+	for ty in range(down):
+		for tx in range(across):
+			t = Image.new(im.mode, (tile, tile))
+			t.paste(im.crop((tx * tile, ty * tile, tx * tile + tile, ty * tile + tile)))
+			data = t.tobytes()
+			chunks.append(zlib.compress(data) if deflate else data)
+	entries = [
+		(256, 4, [im.width]),
+		(257, 4, [im.height]),
+		(258, 3, [8] * spp),
+		(259, 3, [8 if deflate else 1]),
+		(262, 3, [photometric]),
+		(277, 3, [spp]),
+		(284, 3, [1]),
+		(322, 3, [tile]),
+		(323, 3, [tile]),
+		(324, 4, None),
+		(325, 4, [len(c) for c in chunks]),
+	]
+	if im.mode == "RGBA":
+		entries.append((338, 3, [2]))
+	ifd_size = 2 + 12 * len(entries) + 4
+	pos = 8 + ifd_size
+	extra = b""
+	packed = []
+	data_start = pos + sum(len(v) * (2 if t == 3 else 4) for _, t, v in entries if v and len(v) * (2 if t == 3 else 4) > 4) + 4 * len(chunks)
+	offsets = []
+	p = data_start
+	for c in chunks:
+		offsets.append(p)
+		p += len(c)
+	for tag, typ, values in entries:
+		values = offsets if values is None else values
+		fmt = "H" if typ == 3 else "I"
+		raw = struct.pack("<" + fmt * len(values), *values)
+		if len(raw) <= 4:
+			packed.append(struct.pack("<HHI", tag, typ, len(values)) + raw.ljust(4, b"\0"))
+		else:
+			packed.append(struct.pack("<HHII", tag, typ, len(values), pos + len(extra)))
+			extra += raw
+	with open(path, "wb") as f:
+		f.write(b"II*\x00" + struct.pack("<I", 8))
+		f.write(struct.pack("<H", len(entries)) + b"".join(packed) + b"\0\0\0\0")
+		f.write(extra)
+		assert f.tell() == data_start
+		for c in chunks:
+			f.write(c)
+
+
+STYLE = dict(font_size=18, color="#FF8800", opacity=0.8, position="br", margin_x=7, margin_y=5)
+
+
+@pytest.mark.parametrize("mode", ["L", "RGB", "RGBA", "CMYK"])
+@pytest.mark.parametrize("deflate", [False, True])
+def test_tiled_matches_full_decode(tmp_path, mode, deflate):
+	im = _gradient(mode)
+	src = tmp_path / "in.tif"
+	out = tmp_path / "out.tif"
+	_write_tiled_tiff(src, im, deflate=deflate)
+	layout = read_tiff_layout(str(src))
+	assert layout.tiled and layout.mode == mode
+	draw_text_watermark_tiled(str(src), str(out), "2024-01-02", keep_mode=True, **STYLE)
+	expected = draw_text_watermark(im, "2024-01-02", keep_mode=True, **STYLE)
+	with Image.open(out) as result:
+		assert result.mode == mode
+		assert result.tobytes() == expected.tobytes()
+
+
+@pytest.mark.parametrize("compression", [None, "tiff_adobe_deflate"])
+def test_striped_tiff_matches_full_decode(tmp_path, compression):
+	im = _gradient("RGB")
+	src = tmp_path / "in.tif"
+	out = tmp_path / "out.tif"
+	im.save(src, compression=compression)
+	draw_text_watermark_tiled(str(src), str(out), "2024-01-02", keep_mode=True, **STYLE)
+	expected = draw_text_watermark(im, "2024-01-02", keep_mode=True, **STYLE)
+	with Image.open(out) as result:
+		assert result.tobytes() == expected.tobytes()
+	assert tiff_pixel_count(str(src)) == 150 * 100
+
+
+@pytest.mark.parametrize("threshold", ["0", "0.001"])
+def test_cli_output_mode_does_not_depend_on_tiling(tmp_path, threshold):
+	from photodate_wm.cli import main
+
+	src = tmp_path / "in"
+	src.mkdir()
+	_gradient("L").save(src / "gray.tif", compression="tiff_adobe_deflate")
+	assert main(["--path", str(src), "--tiled-threshold-mp", threshold, "--no-date-cache", "--font-size", "12"]) == 0
+	with Image.open(src / "in_watermark" / "gray.tif") as out:
+		assert out.mode == "RGB"
+	assert main(["--path", str(src), "--tiled-threshold-mp", threshold, "--no-date-cache", "--font-size", "12", "--keep-mode", "--overwrite"]) == 0
+	with Image.open(src / "in_watermark" / "gray.tif") as out:
+		assert out.mode == "L"
+
+
+def test_tiled_rejects_unsupported_compression(tmp_path):
+	src = tmp_path / "lzw.tif"
+	_gradient("RGB").save(src, compression="tiff_lzw")
+	with pytest.raises(TiledUnsupported):
+		draw_text_watermark_tiled(str(src), str(tmp_path / "out.tif"), "2024-01-02")
+
+
+def test_tiled_enforces_memory_ceiling(tmp_path):
+	src = tmp_path / "in.tif"
+	_write_tiled_tiff(src, _gradient("RGB"), deflate=True)
+	with pytest.raises(TiledMemoryExceeded):
+		draw_text_watermark_tiled(str(src), str(tmp_path / "out.tif"), "2024-01-02", memory_limit=1024, **STYLE)
+	assert not (tmp_path / "out.tif").exists()
+
+
+def test_cli_streams_a_strip_larger_than_the_memory_ceiling(tmp_path, monkeypatch):
+	from photodate_wm import cli
+
+	src = tmp_path / "in"
+	src.mkdir()
+	im = _gradient("RGB", size=(1000, 400))
+	# Two 768x768 deflate tiles of 1.7 MB decoded each, over the 1 MB ceiling
+	_write_tiled_tiff(src / "big.tif", im, tile=768, deflate=True)
+	# Dated by mtime: midday 2024-01-02 UTC
+	os.utime(src / "big.tif", (1704196800, 1704196800))
+
+	def _no_full_decode(*args, **kwargs):
+		raise AssertionError("fell back to a full decode")
+
+	monkeypatch.setattr(cli, "_render_output", _no_full_decode)
+	args = ["--path", str(src), "--tiled-threshold-mp", "0.001", "--tiled-memory-mb", "1", "--no-date-cache", "--verbose"]
+	assert cli.main(args + [f"--{k.replace('_', '-')}={v}" for k, v in STYLE.items()]) == 0
+	expected = draw_text_watermark(im, "2024-01-02", keep_mode=True, **STYLE)
+	with Image.open(src / "in_watermark" / "big.tif") as out:
+		assert out.tobytes() == expected.tobytes()
+
+
+def test_cli_reports_a_row_over_the_memory_ceiling(tmp_path, capsys):
+	from photodate_wm.cli import main
+
+	src = tmp_path / "in"
+	src.mkdir()
+	_write_tiled_tiff(src / "big.tif", _gradient("RGB"), deflate=True)
+	args = ["--path", str(src), "--tiled-threshold-mp", "0.001", "--tiled-memory-mb", "0", "--no-date-cache"]
+	assert main(args) == 1
+	assert "tiled memory ceiling" in capsys.readouterr().err
+	assert not (src / "in_watermark" / "big.tif").exists()
@@ -0,0 +1,119 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+from PIL import Image
+
+from photodate_wm import cli
+from photodate_wm.journal import Journal
+from photodate_wm.scheduler import MemoryBudget
+from photodate_wm.watch import Debouncer, InotifyWatcher, PollingWatcher, WatchUnavailable
+
+
+def _scan(top):
+	for name in sorted(os.listdir(top)):
+		path = os.path.join(top, name)
+		if os.path.isfile(path):
+			yield path, os.stat(path)
+
+
+def test_debouncer_waits_for_stable_size(tmp_path):
+	now = [0.0]
+	debouncer = Debouncer(1.0, clock=lambda: now[0])
+	path = tmp_path / "a.jpg"
+	path.write_bytes(b"x")
+	debouncer.touch([str(path)])
+	assert list(debouncer.ready()) == []
+
+	now[0] = 0.6
+	path.write_bytes(b"xx")  # still being written
+	assert list(debouncer.ready()) == []
+	now[0] = 1.2
+	assert list(debouncer.ready()) == []
+	now[0] = 1.7
+	ready = list(debouncer.ready())
+	assert [p for p, _ in ready] == [str(path)]
+	assert ready[0][1].st_size == 2
+	assert len(debouncer) == 0
+
+
+def test_polling_watcher_reports_new_files(tmp_path):
+	(tmp_path / "old.jpg").write_bytes(b"x")
+	watcher = PollingWatcher(str(tmp_path), {".jpg"}, _scan)
+	assert watcher.changes(0) == []
+	(tmp_path / "new.jpg").write_bytes(b"x")
+	(tmp_path / ".new.jpg.part").write_bytes(b"x")
+	assert watcher.changes(0) == [str(tmp_path / "new.jpg")]
+
+
+def test_inotify_watcher_reports_new_files(tmp_path):
+	try:
+		watcher = InotifyWatcher(str(tmp_path), True, {".jpg"}, _scan)
+	except (WatchUnavailable, OSError):
+		pytest.skip("inotify unavailable")
+	try:
+		(tmp_path / "sub").mkdir()
+		(tmp_path / "sub" / "a.jpg").write_bytes(b"x")
+		(tmp_path / "b.txt").write_bytes(b"x")
+		seen = set()
+		deadline = time.monotonic() + 5
+		while str(tmp_path / "sub" / "a.jpg") not in seen and time.monotonic() < deadline:
+			seen.update(watcher.changes(0.1))
+		assert seen == {str(tmp_path / "sub" / "a.jpg")}
+	finally:
+		watcher.close()
+
+
+@pytest.mark.parametrize("extra", [[], ["--watch-poll"]])
+def test_watch_processes_new_arrivals_and_stops_on_sigint(tmp_path, extra):
+	src = tmp_path / "in"
+	src.mkdir()
+	Image.new("RGB", (64, 48), (10, 20, 30)).save(src / "first.jpg")
+	env = dict(os.environ)
+	env["PYTHONPATH"] = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src") + os.pathsep + env.get("PYTHONPATH", "")
+	cmd = [sys.executable, "-u", "-m", "photodate_wm.cli", "--path", str(src), "--watch", "--watch-latency", "0.2", "--watch-settle", "0.2", "--verbose"] + extra
+	proc = subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+	try:
+		for line in proc.stdout:
+			if line.startswith("Watching"):
+				break
+		out_dir = src / "in_watermark"
+		assert (out_dir / "first.jpg").exists()
+		Image.new("RGB", (64, 48), (30, 20, 10)).save(src / "second.jpg")
+		deadline = time.monotonic() + 10
+		while not (out_dir / "second.jpg").exists() and time.monotonic() < deadline:
+			time.sleep(0.05)
+		assert (out_dir / "second.jpg").exists()
+		proc.send_signal(signal.SIGINT)
+		rest, _ = proc.communicate(timeout=10)
+	finally:
+		if proc.poll() is None:
+			proc.kill()
+	assert proc.returncode == 0
+	assert "Processed 2 file(s): 2 ok" in rest
+
+
+def test_memory_budget_gates_every_watch_batch(tmp_path, monkeypatch):
+	src = tmp_path / "in"
+	src.mkdir()
+	acquired_closed = []
+
+	class SpyBudget(MemoryBudget):
+		def acquire(self, nbytes):
+			acquired_closed.append(self.closed)
+			return super().acquire(nbytes)
+
+	monkeypatch.setattr(cli, "MemoryBudget", SpyBudget)
+	args = cli.build_arg_parser().parse_args(["--path", str(src), "--pipeline", "--max-memory", "1", "--no-date-cache"])
+	root_output = str(tmp_path / "out")
+	with Journal(root_output, "settings") as journal:
+		runner = cli._BatchRunner(args, root_output, cli._style_from_args(args), None, None, journal, "settings")
+		# Two batches through one runner, as --watch does for successive arrivals
+		for name in ("a.jpg", "b.jpg"):
+			Image.new("RGB", (64, 48)).save(src / name)
+			runner.run(cli.iter_candidate_files(str(src / name), False, [".jpg"]))
+	assert runner.ok == 2
+	assert acquired_closed == [False, False]